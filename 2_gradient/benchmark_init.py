@@ -0,0 +1,121 @@
+"""Compare random and MDS initial positions for the city placement problem:
+number of iterations of BFGS, L-BFGS-B and L-BFGS (descent.py) until the
+criterion is within a relative tolerance of the best minimum found.
+
+The instances are the 36 cities of distances.npy, and random cities on a
+sphere (great circle distances, which are not exactly Euclidean).
+
+Usage: python benchmark_init.py [--sizes 200 500] [--seeds 3] [--rtol 1e-3]
+"""
+
+import argparse
+import time
+
+import numpy as np
+import scipy.optimize
+
+from city import CityPlacement, classical_mds, landmark_mds
+from descent import lbfgs
+
+
+def sphere(n, seed=0):
+    """Great circle distances between n random cities on a region of the
+    size of Europe."""
+
+    rng = np.random.default_rng(seed)
+    lon = np.radians(rng.uniform(-10, 40, n))
+    lat = np.radians(rng.uniform(35, 70, n))
+    x = np.stack(
+        [np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)]
+    )
+    return np.arccos(np.clip(x.T @ x, -1, 1))
+
+
+def random_init(distances, seed):
+    """The initial position of the notebook."""
+
+    x0 = np.random.default_rng(seed).normal(size=(len(distances), 2))
+    d = np.linalg.norm(x0[:, None] - x0[None, :], axis=-1)
+    return x0 / np.linalg.norm(d)
+
+
+# the criterion is small (normalised distances): the ftol of L-BFGS-B is
+# relative to max(|f|, 1), it would stop at once
+options = {
+    "BFGS": dict(maxiter=20_000, gtol=1e-12),
+    "L-BFGS-B": dict(maxiter=20_000, gtol=1e-12, ftol=0),
+}
+
+
+def run(problem, x0, method):
+    """Return the values of the criterion at each iteration, and the time."""
+
+    values = [problem(np.ravel(x0))]
+    start = time.perf_counter()
+    if method == "l-bfgs":
+        lbfgs(
+            problem,
+            problem.gradient,
+            np.ravel(x0),
+            callback=lambda xk: values.append(problem(xk)),
+            tol=0,
+            max_iter=20_000,
+            last=1,
+        )
+        return np.array(values), time.perf_counter() - start
+    scipy.optimize.minimize(
+        problem,
+        np.ravel(x0),
+        jac=problem.gradient,
+        method=method,
+        # the value at xk is in the cache of the problem
+        callback=lambda xk: values.append(problem(xk)),
+        options=options[method],
+    )
+    return np.array(values), time.perf_counter() - start
+
+
+def main(sizes, seeds, rtol, k):
+    instances = [("cities", np.load("distances.npy"))]
+    instances += [(f"sphere{n}", sphere(n)) for n in sizes]
+
+    print(
+        f"{'instance':>10} {'method':>9} {'init':>9} "
+        f"{'nit':>6} {'to rtol':>8} {'f':>10} {'time (s)':>9}"
+    )
+    for name, distances in instances:
+        distances = distances / np.linalg.norm(distances)
+        problem = CityPlacement(distances)
+        inits = [
+            ("classical", lambda s: classical_mds(distances)),
+            ("landmark", lambda s: landmark_mds(distances, k, seed=s)),
+            ("random", lambda s: random_init(distances, s)),
+        ]
+        for method in ["BFGS", "L-BFGS-B", "l-bfgs"]:
+            runs = []
+            for init, x0 in inits:
+                for seed in range(seeds):
+                    start = time.perf_counter()
+                    x = x0(seed)
+                    values, elapsed = run(problem, x, method)
+                    elapsed += time.perf_counter() - start
+                    runs.append((init, values, elapsed))
+
+            best = min(values.min() for _, values, _ in runs)
+            for init, values, elapsed in runs:
+                reached = np.flatnonzero(values <= best * (1 + rtol))
+                nit = f"{reached[0]}" if reached.size else "-"
+                print(
+                    f"{name:>10} {method:>9} {init:>9} {len(values) - 1:>6} "
+                    f"{nit:>8} {values[-1]:>10.3e} {elapsed:>9.3f}"
+                )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[200, 500])
+    parser.add_argument("--seeds", type=int, default=3)
+    parser.add_argument("--rtol", type=float, default=1e-3)
+    parser.add_argument("--landmarks", type=int, default=50)
+    args = parser.parse_args()
+    main(args.sizes, args.seeds, args.rtol, args.landmarks)
@@ -0,0 +1,162 @@
+"""Compare minibatch (pair sampling) and full batch Adam on the city
+placement problem: convergence of the full criterion against the number of
+pairs processed and against time, and throughput in pairs per second.
+
+The distances of random cities on a sphere are stored in condensed form,
+memory-mapped in float32, as for large instances.
+
+Usage: python benchmark_pairs.py [--n 2000] [--batches 4096 32768]
+                                 [--epochs 20] [--lr 0.1] [--plot curves.png]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmark_init import random_init, sphere
+from city import CityPlacement, CondensedDistances
+from pairs import Adam, PairSampler, Prefetcher, value_and_gradient
+
+
+def full_batch(problem, criterion, x0, lr, epochs, points):
+    """Adam on the full criterion: one epoch is one step. The curve is
+    evaluated (outside of the timings) with another CityPlacement object,
+    so that its cache does not save the gradient computations."""
+
+    x = x0.copy()
+    optimizer = Adam(x, lr=lr)
+    curve, elapsed = [(0, 0.0, criterion(x))], 0.0
+    for step in range(1, epochs + 1):
+        start = time.perf_counter()
+        optimizer.step(problem.gradient(x))
+        elapsed += time.perf_counter() - start
+        if step in points:
+            curve.append((step, elapsed, criterion(x)))
+    return np.array(curve)
+
+
+def minibatch(problem, sampler, x0, lr, epochs, points, prefetch=True):
+    """Adam on estimates from batches of pairs, the full criterion is
+    evaluated (outside of the timings) after each epoch in points."""
+
+    x = x0.copy()
+    optimizer = Adam(x, lr=lr)
+    steps = int(np.ceil(epochs * sampler.total / sampler.batch))
+    per_epoch = sampler.total / sampler.batch
+    curve, elapsed = [(0, 0.0, problem(x))], 0.0
+    batches = Prefetcher(sampler) if prefetch else iter(sampler.sample, None)
+    start = time.perf_counter()
+    for step in range(1, steps + 1):
+        optimizer.step(value_and_gradient(x, next(batches))[1])
+        epoch = int(step / per_epoch)
+        if epoch in points and int((step - 1) / per_epoch) < epoch:
+            elapsed += time.perf_counter() - start
+            curve.append((step / per_epoch, elapsed, problem(x)))
+            start = time.perf_counter()
+    elapsed += time.perf_counter() - start
+    if prefetch:
+        batches.close()
+    return np.array(curve), steps * sampler.batch / elapsed
+
+
+def throughput(distances, batch, strata, prefetch, seconds=2.0):
+    """Pairs per second delivered by the sampler alone."""
+
+    sampler = PairSampler(distances, batch, strata, seed=0)
+    batches = Prefetcher(sampler) if prefetch else iter(sampler.sample, None)
+    pairs, start = 0, time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        pairs += len(next(batches).i)
+    elapsed = time.perf_counter() - start
+    if prefetch:
+        batches.close()
+    return pairs / elapsed
+
+
+def main(n, batches, epochs, lr, plot):
+    distances = sphere(n)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "distances.npy")
+        CondensedDistances.from_square(distances, np.float32, path)
+        del distances
+        condensed = CondensedDistances.load(path)
+        condensed.normalise()
+        problem = CityPlacement(condensed)
+        x0 = random_init(condensed.square(), seed=0)
+        # the learning rate is relative to the RMS distance
+        lr = lr * condensed.norm() / n
+        points = set(np.unique(np.geomspace(1, epochs, 20).astype(int)))
+
+        print(f"{'sampling':>10} {'batch':>7} {'prefetch':>8} {'pairs/s':>10}")
+        for batch in batches:
+            for strata in [None, 8]:
+                for prefetch in [False, True]:
+                    rate = throughput(condensed, batch, strata, prefetch)
+                    name = "uniform" if strata is None else "stratified"
+                    print(
+                        f"{name:>10} {batch:>7} {str(prefetch):>8} "
+                        f"{rate:>10.3g}"
+                    )
+
+        print(
+            f"\n{'run':>18} {'epochs':>7} {'f':>10} "
+            f"{'time (s)':>9} {'pairs/s':>10}"
+        )
+        curves = {}
+        curve = full_batch(
+            CityPlacement(condensed), problem, x0, lr, epochs, points
+        )
+        rate = epochs * condensed.data.size / curve[-1, 1]
+        curves["full batch"] = curve
+        print(
+            f"{'full batch':>18} {epochs:>7} {curve[-1, 2]:>10.3e} "
+            f"{curve[-1, 1]:>9.3f} {rate:>10.3g}"
+        )
+        for batch in batches:
+            for strata in [None, 8]:
+                sampler = PairSampler(condensed, batch, strata, seed=0)
+                # smaller batches take more steps per epoch, with noisier
+                # gradients: the step size decreases as the square root
+                scale = np.sqrt(batch / condensed.data.size)
+                curve, rate = minibatch(
+                    problem, sampler, x0, lr * scale, epochs, points
+                )
+                name = "uniform" if strata is None else "stratified"
+                curves[f"{name} {batch}"] = curve
+                print(
+                    f"{name + ' ' + str(batch):>18} {epochs:>7} "
+                    f"{curve[-1, 2]:>10.3e} {curve[-1, 1]:>9.3f} "
+                    f"{rate:>10.3g}"
+                )
+        del problem, condensed
+
+    if plot is not None:
+        import matplotlib.pyplot as plt
+
+        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 5), sharey=True)
+        for label, curve in curves.items():
+            ax1.loglog(curve[1:, 0], curve[1:, 2], label=label)
+            ax2.loglog(curve[1:, 1], curve[1:, 2], label=label)
+        ax1.set_xlabel("epochs (pairs processed / number of pairs)")
+        ax2.set_xlabel("time (s)")
+        ax1.set_ylabel("criterion")
+        ax1.legend()
+        fig.savefig(plot)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n", type=int, default=2000)
+    parser.add_argument(
+        "--batches", type=int, nargs="+", default=[4096, 32768]
+    )
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument(
+        "--lr", type=float, default=0.1, help="relative to the RMS distance"
+    )
+    parser.add_argument("--plot", default=None)
+    args = parser.parse_args()
+    main(args.n, args.batches, args.epochs, args.lr, args.plot)
@@ -0,0 +1,337 @@
+"""The map reconstruction criterion of the city placement problem, and its
+gradient, computed with NumPy.
+
+    f(x) = sum_{i < j} ((x_i - x_j)^2 + (y_i - y_j)^2 - d_ij^2)^2
+
+The loops of city_problem.ipynb are replaced by broadcasted operations over
+tiles of rows of the upper triangle of the distance matrix: the value and
+the gradient are computed in the same pass and share the delta term. Small
+instances fit in one tile; above that size, memory stays O(n x rows) and
+the distance matrix may be memory-mapped (np.load(..., mmap_mode="r")).
+
+    problem = CityPlacement(distances)
+    solution = sopt.fmin_bfgs(problem, np.ravel(x0), fprime=problem.gradient)
+
+Large distance matrices are better stored in condensed form: only the
+n (n - 1) / 2 distances of the upper triangle (the order of
+scipy.spatial.distance.squareform and torch.pdist), optionally in float32,
+memory-mapped, with the normalisation factor kept as metadata in a JSON
+file next to the .npy file:
+
+    condensed = CondensedDistances.from_square(distances, np.float32)
+    condensed.save("distances_condensed.npy")
+    distances = CondensedDistances.load("distances_condensed.npy")
+    distances.normalise()  # instead of distances /= la.norm(distances)
+    problem = CityPlacement(distances)
+
+Instead of a random initial position, classical_mds (landmark_mds for
+large n) computes positions whose distances match the distance matrix,
+close to the minimum of the criterion (exactly at the minimum for Euclidean
+distances), and at the right scale:
+
+    x0 = classical_mds(distances)
+    solution = sopt.fmin_bfgs(problem, np.ravel(x0), fprime=problem.gradient)
+
+This file is identical in 2_gradient and 3_pytorch.
+"""
+
+import json
+import os
+from typing import Optional, Union
+
+import numpy as np
+from numpy.typing import NDArray
+from scipy.linalg import eigh
+
+__all__ = [
+    "CityPlacement",
+    "CondensedDistances",
+    "classical_mds",
+    "landmark_mds",
+    "torch_criterion",
+]
+
+
+class CondensedDistances:
+    def __init__(self, data: NDArray, scale: float = 1.0) -> None:
+        """Create a new CondensedDistances object.
+
+        Keyword Arguments:
+        data  -- the n (n - 1) / 2 distances d_ij, i < j, row by row
+        scale -- the factor applied to all distances when they are read
+        """
+
+        self.data = data
+        self.scale = float(scale)
+        self.n = int(round((1 + np.sqrt(1 + 8 * len(data))) / 2))
+        if self.n * (self.n - 1) // 2 != len(data):
+            raise ValueError("not a condensed distance matrix")
+
+    @property
+    def shape(self) -> tuple:
+        return (self.n, self.n)
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self.data.dtype
+
+    def offset(self, i: int) -> int:
+        """The index in data of the first distance of row i."""
+
+        return i * (2 * self.n - i - 1) // 2
+
+    @classmethod
+    def from_square(
+        cls,
+        distances: NDArray,
+        dtype: np.dtype = np.float64,
+        path: Optional[str] = None,
+    ) -> "CondensedDistances":
+        """Convert a square matrix, row by row (it may be memory-mapped),
+        into memory or into a new .npy file if path is given."""
+
+        n = distances.shape[0]
+        size = n * (n - 1) // 2
+        if path is None:
+            data = np.empty(size, dtype=dtype)
+        else:
+            data = np.lib.format.open_memmap(path, "w+", dtype, (size,))
+        condensed = cls(data)
+        for i in range(n - 1):
+            start = condensed.offset(i)
+            data[start : start + n - i - 1] = distances[i, i + 1 :]
+        if path is not None:
+            condensed.save(path)
+        return condensed
+
+    @classmethod
+    def load(
+        cls, path: str, mmap_mode: Optional[str] = "r"
+    ) -> "CondensedDistances":
+        """Open a .npy file (memory-mapped by default) and its metadata."""
+
+        scale = 1.0
+        metadata = os.path.splitext(path)[0] + ".json"
+        if os.path.exists(metadata):
+            with open(metadata) as fh:
+                scale = json.load(fh)["scale"]
+        return cls(np.load(path, mmap_mode=mmap_mode), scale)
+
+    def save(self, path: str) -> None:
+        """Write the data (unless it is already memory-mapped from path) and
+        the metadata."""
+
+        filename = getattr(self.data, "filename", None)
+        if filename and os.path.abspath(filename) == os.path.abspath(path):
+            self.data.flush()
+        else:
+            np.save(path, self.data)
+        metadata = dict(n=self.n, scale=self.scale, dtype=str(self.dtype))
+        with open(os.path.splitext(path)[0] + ".json", "w") as fh:
+            json.dump(metadata, fh)
+
+    def norm(self, chunk: int = 2 ** 22) -> float:
+        """The Frobenius norm of the (scaled) square matrix."""
+
+        total = 0.0
+        for start in range(0, len(self.data), chunk):
+            block = np.asarray(self.data[start : start + chunk], dtype=float)
+            total += np.einsum("i,i->", block, block)
+        return self.scale * np.sqrt(2 * total)
+
+    def normalise(self) -> None:
+        """Scale distances so that the norm of the matrix is 1."""
+
+        self.scale /= self.norm()
+
+    def upper(self, start: int, stop: int) -> NDArray:
+        """The tile distances[start:stop, start:] in float64, with zeros on
+        and below the diagonal."""
+
+        rows, columns = stop - start, self.n - start
+        tile = np.zeros((rows, columns))
+        segment = self.data[self.offset(start) : self.offset(stop)]
+        tile[np.triu(np.ones((rows, columns), dtype=bool), 1)] = segment
+        tile *= self.scale
+        return tile
+
+    def row(self, i: int) -> NDArray:
+        """The distances from i to all points, in float64."""
+
+        j = np.arange(i)
+        row = np.zeros(self.n)
+        row[:i] = self.data[self.offset(j) + i - j - 1]
+        row[i + 1 :] = self.data[self.offset(i) : self.offset(i + 1)]
+        row *= self.scale
+        return row
+
+    def square(self) -> NDArray:
+        """The full square matrix (in memory)."""
+
+        tile = self.upper(0, self.n)
+        return tile + tile.T
+
+    def torch(self, dtype=None, device=None):
+        """The condensed distances as a torch tensor (in memory)."""
+
+        import torch
+
+        tensor = torch.as_tensor(np.array(self.data), device=device)
+        return tensor.to(dtype or tensor.dtype) * self.scale
+
+
+def torch_criterion(x, distances):
+    """The criterion on a torch tensor x of shape (n, 2), with condensed
+    distances (a tensor, see CondensedDistances.torch)."""
+
+    import torch
+
+    return ((torch.pdist(x) ** 2 - distances ** 2) ** 2).sum()
+
+
+def classical_mds(
+    distances: Union[NDArray, CondensedDistances], dim: int = 2
+) -> NDArray:
+    """Positions of shape (n, dim) whose pairwise distances are the closest
+    to the distances (exact if they are Euclidean): the top eigenvectors of
+    the double-centred Gram matrix B = -1/2 J D^2 J. The (n, n) matrix is
+    computed in memory, use landmark_mds for large n."""
+
+    if isinstance(distances, CondensedDistances):
+        distances = distances.square()
+    B = np.asarray(distances, dtype=float) ** 2
+    B -= B.mean(axis=0)
+    B -= B.mean(axis=1)[:, None]
+    B *= -0.5
+    n = len(B)
+    values, vectors = eigh(B, subset_by_index=[n - dim, n - 1])
+    # non-Euclidean distances may leave negative eigenvalues
+    return vectors[:, ::-1] * np.sqrt(np.maximum(values[::-1], 0))
+
+
+def landmark_mds(
+    distances: Union[NDArray, CondensedDistances],
+    k: int = 50,
+    dim: int = 2,
+    seed: Optional[int] = None,
+) -> NDArray:
+    """Positions of shape (n, dim), computed from the distances to k
+    landmarks only, in O(n k) time and memory (de Silva and Tenenbaum):
+    classical MDS on the landmarks, then each point is placed from its
+    distances to the landmarks.
+
+    Keyword Arguments:
+    distances -- the (n, n) distance matrix, or condensed distances
+    k         -- the number of landmarks (at least dim + 1)
+    dim       -- the dimension of the positions
+    seed      -- the seed for the first landmark, the next ones are chosen
+                 as far as possible from the previous ones (maxmin)
+    """
+
+    if isinstance(distances, CondensedDistances):
+        row = distances.row
+    else:
+
+        def row(i: int) -> NDArray:
+            return np.asarray(distances[i], dtype=float)
+
+    n = distances.shape[0]
+    k = min(k, n)
+    rng = np.random.default_rng(seed)
+    landmarks = [int(rng.integers(n))]
+    rows = np.empty((k, n))
+    nearest = np.full(n, np.inf)
+    for i in range(k):
+        rows[i] = row(landmarks[i])
+        np.minimum(nearest, rows[i], out=nearest)
+        if i + 1 < k:
+            landmarks.append(int(np.argmax(nearest)))
+
+    rows **= 2
+    Delta = rows[:, landmarks]
+    B = Delta - Delta.mean(axis=0)
+    B -= B.mean(axis=1)[:, None]
+    B *= -0.5
+    values, vectors = eigh(B, subset_by_index=[k - dim, k - 1])
+    values, vectors = values[::-1], vectors[:, ::-1]
+    # pseudo-inverse of the landmark positions
+    inverse = np.sqrt(np.where(values > 0, 1 / np.abs(values), 0))
+    return -0.5 * (rows - Delta.mean(axis=1)[:, None]).T @ (vectors * inverse)
+
+
+class CityPlacement:
+    def __init__(
+        self,
+        distances: Union[NDArray, CondensedDistances],
+        chunk: int = 2 ** 20,
+    ) -> None:
+        """Create a new CityPlacement object.
+
+        Keyword Arguments:
+        distances -- the (n, n) distance matrix, or condensed distances
+        chunk     -- the maximum number of pairs computed at once (a tile of
+                     chunk // n rows)
+        """
+
+        self.distances = distances
+        self.n = distances.shape[0]
+        self.chunk = chunk
+        self.cache: Optional[tuple] = None
+
+    def tiles(self):
+        """Iterate over tiles (start, stop) of rows."""
+
+        rows = max(1, self.chunk // self.n)
+        for start in range(0, self.n, rows):
+            yield start, min(start + rows, self.n)
+
+    def upper(self, start: int, stop: int) -> NDArray:
+        """The tile distances[start:stop, start:] (only the part above the
+        diagonal is used)."""
+
+        if isinstance(self.distances, CondensedDistances):
+            return self.distances.upper(start, stop)
+        return np.asarray(self.distances[start:stop, start:], dtype=float)
+
+    def value_and_gradient(self, x: NDArray) -> tuple:
+        """The criterion and its gradient (same shape as x)."""
+
+        P = np.asarray(x, dtype=float).reshape(self.n, 2)
+        value = 0.0
+        grad = np.zeros_like(P)
+        for start, stop in self.tiles():
+            # pairs (i, j) with start <= i < stop and i < j
+            dx = P[start:stop, None, 0] - P[None, start:, 0]
+            dy = P[start:stop, None, 1] - P[None, start:, 1]
+            delta = dx ** 2 + dy ** 2
+            delta -= self.upper(start, stop) ** 2
+            rows = stop - start
+            np.multiply(
+                delta[:, :rows],
+                np.triu(np.ones((rows, rows), dtype=bool), 1),
+                out=delta[:, :rows],
+            )
+            value += np.einsum("ij,ij->", delta, delta)
+            # d/dx_i = 4 sum_j delta_ij (x_i - x_j), opposite for x_j
+            delta *= 4
+            dx *= delta
+            dy *= delta
+            grad[start:stop, 0] += dx.sum(axis=1)
+            grad[start:stop, 1] += dy.sum(axis=1)
+            grad[start:, 0] -= dx.sum(axis=0)
+            grad[start:, 1] -= dy.sum(axis=0)
+        return value, grad.reshape(np.shape(x))
+
+    def evaluate(self, x: NDArray) -> tuple:
+        # the value and the gradient at the last point are kept, so that
+        # optimisers calling fun(x) then jac(x) only compute them once
+        if self.cache is None or not np.array_equal(self.cache[0], x):
+            value, grad = self.value_and_gradient(x)
+            self.cache = (np.array(x, dtype=float), value, grad)
+        return self.cache[1], self.cache[2]
+
+    def __call__(self, x: NDArray) -> float:
+        return self.evaluate(x)[0]
+
+    def gradient(self, x: NDArray) -> NDArray:
+        return self.evaluate(x)[1].copy()
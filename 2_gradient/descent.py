@@ -0,0 +1,635 @@
+"""A gradient descent engine, with the step size rules of the notebook
+(solutions/code1.py to code4.py) and two inexact line searches.
+
+- "fixed": x <- x - alpha g
+- "normalised": x <- x - alpha g / |g|
+- "exact": minimise f along the direction (Brent's method)
+- "armijo": backtracking until f decreases enough (sufficient decrease),
+  with a quadratic interpolation of the function along the direction
+- "wolfe": strong Wolfe conditions (sufficient decrease and curvature),
+  with a cubic interpolation of the function along the direction
+
+Values and gradients computed by the line search at the accepted point are
+reused by the next iteration, and the numbers of evaluations of the function
+and of the gradient are counted:
+
+    res = descent(func, func_der, np.array([-5, -4]), step="wolfe")
+    res.x, res.fun, res.nit, res.nfev, res.njev
+    res.trajectory  # shape (nit + 1, 2), e.g. for plot_contours_func
+
+LBFGS replaces the gradient with a quasi-Newton direction built from the
+last m steps, and the trajectory can be recorded every k iterations or in a
+ring buffer of the last iterates, so that memory stays O(m D):
+
+    res = lbfgs(problem, problem.gradient, np.ravel(x0), m=10, last=20)
+
+Run this file to compare the number of evaluations of each step size rule.
+"""
+
+from typing import Callable, Optional
+
+import numpy as np
+from numpy.typing import NDArray
+from scipy.optimize import OptimizeResult, minimize_scalar
+
+__all__ = [
+    "Buffer",
+    "Recorder",
+    "Descent",
+    "LBFGS",
+    "descent",
+    "lbfgs",
+    "multistart",
+]
+
+
+class Buffer:
+    """A growing array of rows: the capacity doubles when it is full, so
+    that appending n rows costs O(n) copies overall."""
+
+    def __init__(self, shape: tuple = (), capacity: int = 16) -> None:
+        self.data = np.empty((capacity, *shape))
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def append(self, row) -> None:
+        if self.size == len(self.data):
+            data = np.empty((2 * len(self.data), *self.data.shape[1:]))
+            data[: self.size] = self.data
+            self.data = data
+        self.data[self.size] = row
+        self.size += 1
+
+    @property
+    def array(self) -> NDArray:
+        return self.data[: self.size]
+
+
+class Recorder:
+    """The iterates of a run, one every `every` iterations, and only the
+    `last` ones if given (in a ring buffer): memory stays bounded however
+    long the run."""
+
+    def __init__(
+        self, shape: tuple = (), every: int = 1, last: Optional[int] = None
+    ) -> None:
+        self.every = every
+        self.last = last
+        if last is None:
+            self.rows, self.numbers = Buffer(shape), Buffer()
+        else:
+            self.rows = np.empty((last, *shape))
+            self.numbers = np.empty(last, dtype=int)
+        self.count = 0  # iterates seen
+        self.size = 0  # iterates recorded
+
+    def __len__(self) -> int:
+        return self.size if self.last is None else min(self.size, self.last)
+
+    def append(self, row) -> None:
+        if self.count % self.every == 0:
+            if self.last is None:
+                self.rows.append(row)
+                self.numbers.append(self.count)
+            else:
+                self.rows[self.size % self.last] = row
+                self.numbers[self.size % self.last] = self.count
+            self.size += 1
+        self.count += 1
+
+    def ordered(self, data) -> NDArray:
+        if self.last is None:
+            return data.array
+        if self.size <= self.last:
+            return data[: self.size]
+        start = self.size % self.last
+        return np.concatenate([data[start:], data[:start]])
+
+    @property
+    def array(self) -> NDArray:
+        return self.ordered(self.rows)
+
+    @property
+    def iterations(self) -> NDArray:
+        """The iteration number of each recorded row."""
+
+        return self.ordered(self.numbers).astype(int)
+
+
+class LineSearchError(RuntimeError):
+    pass
+
+
+class Descent:
+    def __init__(
+        self,
+        fun: Callable[[NDArray], float],
+        jac: Callable[[NDArray], NDArray],
+        step: str = "armijo",
+        alpha: float = 1.0,
+        c1: float = 1e-4,
+        c2: float = 0.9,
+        tol: float = 1e-3,
+        max_iter: int = 1000,
+        every: int = 1,
+        last: Optional[int] = None,
+    ) -> None:
+        """Create a new Descent object.
+
+        Keyword Arguments:
+        fun      -- the function to minimise
+        jac      -- its gradient
+        step     -- "fixed", "normalised", "exact", "armijo" or "wolfe"
+        alpha    -- the step size ("fixed" and "normalised"), or the first
+                    trial step of the line searches
+        c1       -- the sufficient decrease constant (Armijo, Wolfe)
+        c2       -- the curvature constant (Wolfe), c1 < c2 < 1
+        tol      -- stop when the norm of the gradient is below tol
+        max_iter -- the maximum number of iterations
+        every    -- record the trajectory every this number of iterations
+        last     -- only keep the last recorded iterates (None for all)
+        """
+
+        if step not in ("fixed", "normalised", "exact", "armijo", "wolfe"):
+            raise ValueError(f"unknown step size rule {step!r}")
+
+        self.function = fun
+        self.gradient = jac
+        self.step = step
+        self.alpha = alpha
+        self.c1, self.c2 = c1, c2
+        self.tol = tol
+        self.max_iter = max_iter
+        self.every, self.last = every, last
+        self.nfev = self.njev = 0
+
+    def fun(self, x: NDArray) -> float:
+        self.nfev += 1
+        return float(self.function(x))
+
+    def jac(self, x: NDArray) -> NDArray:
+        self.njev += 1
+        return np.asarray(self.gradient(x), dtype=float)
+
+    def direction(self, g: NDArray) -> NDArray:
+        """The descent direction at a point where the gradient is g."""
+
+        return -g
+
+    def update(self, s: NDArray, y: NDArray) -> None:
+        """Called after each step s = x_new - x, y = g_new - g."""
+
+    def initial_step(self, alpha: float) -> float:
+        """The first trial step of the next line search, after a step of
+        size alpha."""
+
+        # the next line search starts from twice the last step size
+        if self.step in ("armijo", "wolfe"):
+            return min(2 * alpha, 1e10)
+        if self.step == "exact":
+            return max(alpha, 1e-8)
+        return alpha
+
+    def line_search(
+        self, x: NDArray, f: float, g: NDArray, d: NDArray, alpha: float
+    ) -> tuple:
+        """Return the step size along d, the new point, its value and its
+        gradient (None if not computed yet)."""
+
+        if self.step == "fixed":
+            y = x + self.alpha * d
+            return self.alpha, y, None, None
+
+        if self.step == "normalised":
+            alpha = self.alpha / np.linalg.norm(d)
+            return alpha, x + alpha * d, None, None
+
+        if self.step == "exact":
+            # the bracket starts from the previous step size, and the value
+            # at alpha = 0 is already known
+            def phi(a):
+                return f if a == 0 else self.fun(x + a * d)
+
+            res = minimize_scalar(phi, bracket=(0, alpha))
+            y = x + res.x * d
+            return res.x, y, float(res.fun), None
+
+        slope = g @ d
+        if slope >= 0:
+            raise LineSearchError("not a descent direction")
+        if self.step == "armijo":
+            return self.armijo(x, f, slope, d, alpha)
+        return self.wolfe(x, f, slope, d, alpha)
+
+    def armijo(
+        self, x: NDArray, f: float, slope: float, d: NDArray, alpha: float
+    ) -> tuple:
+        """Backtracking until f(x + alpha d) <= f + c1 alpha slope: the next
+        trial minimises the quadratic interpolation of f along d, within
+        [alpha / 10, alpha / 2]."""
+
+        for _ in range(60):
+            y = x + alpha * d
+            f_new = self.fun(y)
+            if f_new <= f + self.c1 * alpha * slope:
+                return alpha, y, f_new, None
+            curvature = f_new - f - slope * alpha
+            trial = -slope * alpha ** 2 / (2 * curvature)
+            alpha = min(max(trial, alpha / 10), alpha / 2)
+        raise LineSearchError("no sufficient decrease")
+
+    def wolfe(
+        self, x: NDArray, f: float, slope: float, d: NDArray, alpha: float
+    ) -> tuple:
+        """Step size satisfying the strong Wolfe conditions (Nocedal and
+        Wright, Algorithms 3.5 and 3.6): the interval containing acceptable
+        steps is bracketed with growing steps, then zoomed into with cubic
+        interpolations."""
+
+        def phi(a):
+            y = x + a * d
+            f_a, g_a = self.fun(y), self.jac(y)
+            return y, f_a, g_a, g_a @ d
+
+        c1, c2 = self.c1, self.c2
+        previous = (0.0, f, slope)
+        for i in range(30):
+            y, f_a, g_a, slope_a = phi(alpha)
+            if f_a > f + c1 * alpha * slope or (i > 0 and f_a >= previous[1]):
+                return self.zoom(phi, f, slope, previous, (alpha, f_a, slope_a))
+            if abs(slope_a) <= -c2 * slope:
+                return alpha, y, f_a, g_a
+            if slope_a >= 0:
+                return self.zoom(phi, f, slope, (alpha, f_a, slope_a), previous)
+            previous = (alpha, f_a, slope_a)
+            alpha *= 2
+        raise LineSearchError("no step satisfying the Wolfe conditions")
+
+    def zoom(
+        self, phi: Callable, f: float, slope: float, low: tuple, high: tuple
+    ) -> tuple:
+        """Shrink the interval [low, high] (each a triple step, value, slope,
+        with f(low) the lowest value so far) down to an acceptable step."""
+
+        c1, c2 = self.c1, self.c2
+        for _ in range(30):
+            alpha = cubic(*low, *high)
+            y, f_a, g_a, slope_a = phi(alpha)
+            if f_a > f + c1 * alpha * slope or f_a >= low[1]:
+                high = (alpha, f_a, slope_a)
+            else:
+                if abs(slope_a) <= -c2 * slope:
+                    return alpha, y, f_a, g_a
+                if slope_a * (high[0] - low[0]) >= 0:
+                    high = low
+                low = (alpha, f_a, slope_a)
+        # the best point found so far, which decreases f enough
+        if low[0] == 0:
+            raise LineSearchError("no step satisfying the Wolfe conditions")
+        y, f_a, g_a, _ = phi(low[0])
+        return low[0], y, f_a, g_a
+
+    def run(self, x0: NDArray, callback: Optional[Callable] = None):
+        """Run the descent from x0, and return an OptimizeResult with x,
+        fun, jac, nit, nfev, njev, success, message, the trajectory of the
+        iterates (nit + 1, D, or the rows recorded with every and last, at
+        iterations), and the values (fvals), gradient norms (grad_norms)
+        and step sizes (step_sizes) along the trajectory.
+
+        Keyword Arguments:
+        x0       -- the initial point
+        callback -- a function called with each new iterate
+        """
+
+        x = np.array(x0, dtype=float)
+        self.nfev = self.njev = 0
+        f, g = self.fun(x), self.jac(x)
+        norm = np.linalg.norm(g)
+        trajectory = Recorder(x.shape, self.every, self.last)
+        values = Buffer()
+        norms, steps = Buffer(), Buffer()
+        trajectory.append(x)
+        values.append(f)
+        norms.append(norm)
+
+        nit, alpha, message = 0, self.alpha, "maximum number of iterations"
+        while nit < self.max_iter:
+            if norm <= self.tol:
+                message = "gradient norm below tolerance"
+                break
+            d = self.direction(g)
+            try:
+                alpha, y, f_new, g_new = self.line_search(x, f, g, d, alpha)
+            except LineSearchError as error:
+                message = f"line search failed: {error}"
+                break
+            f = self.fun(y) if f_new is None else f_new
+            g_new = self.jac(y) if g_new is None else g_new
+            self.update(y - x, g_new - g)
+            x, g = y, g_new
+            norm = np.linalg.norm(g)
+            nit += 1
+
+            trajectory.append(x)
+            values.append(f)
+            norms.append(norm)
+            steps.append(alpha)
+            if callback is not None:
+                callback(x)
+            alpha = self.initial_step(alpha)
+
+        return OptimizeResult(
+            x=x,
+            fun=f,
+            jac=g,
+            nit=nit,
+            nfev=self.nfev,
+            njev=self.njev,
+            success=norm <= self.tol,
+            message=message,
+            trajectory=trajectory.array,
+            iterations=trajectory.iterations,
+            fvals=values.array,
+            grad_norms=norms.array,
+            step_sizes=steps.array,
+        )
+
+
+class LBFGS(Descent):
+    def __init__(
+        self,
+        fun: Callable[[NDArray], float],
+        jac: Callable[[NDArray], NDArray],
+        m: int = 10,
+        step: str = "wolfe",
+        **kwargs,
+    ) -> None:
+        """Create a new LBFGS object: a quasi-Newton descent, with the
+        inverse Hessian approximated from the last m steps (two-loop
+        recursion, Nocedal and Wright, Algorithm 7.4), in O(m D) memory.
+
+        Keyword Arguments:
+        fun  -- the function to minimise
+        jac  -- its gradient
+        m    -- the number of steps kept in memory
+        step -- "wolfe" (recommended) or "armijo"
+        (other keyword arguments as in Descent)
+        """
+
+        if step not in ("armijo", "wolfe"):
+            raise ValueError(f"unknown step size rule {step!r}")
+        super().__init__(fun, jac, step=step, **kwargs)
+        self.m = m
+        self.s = self.y = self.rho = None
+        self.size = 0  # pairs stored so far, the newest at (size - 1) % m
+
+    def run(self, x0: NDArray, callback: Optional[Callable] = None):
+        D = np.size(x0)
+        self.s, self.y = np.empty((self.m, D)), np.empty((self.m, D))
+        self.rho = np.empty(self.m)
+        self.size = 0
+        return super().run(x0, callback)
+
+    def update(self, s: NDArray, y: NDArray) -> None:
+        sy = np.vdot(s, y)
+        # pairs without positive curvature would break the approximation
+        if sy <= 1e-10 * np.vdot(y, y):
+            return
+        k = self.size % self.m
+        self.s[k], self.y[k], self.rho[k] = np.ravel(s), np.ravel(y), 1 / sy
+        self.size += 1
+
+    def direction(self, g: NDArray) -> NDArray:
+        if self.size == 0:
+            return -g
+        newest = [(self.size - 1 - i) % self.m for i in range(self.m)]
+        newest = newest[: min(self.size, self.m)]
+        q = np.ravel(g).copy()
+        a = {}
+        for k in newest:
+            a[k] = self.rho[k] * (self.s[k] @ q)
+            q -= a[k] * self.y[k]
+        k = newest[0]
+        q *= (self.s[k] @ self.y[k]) / (self.y[k] @ self.y[k])
+        for k in reversed(newest):
+            b = self.rho[k] * (self.y[k] @ q)
+            q += (a[k] - b) * self.s[k]
+        return -q.reshape(np.shape(g))
+
+    def initial_step(self, alpha: float) -> float:
+        # the direction is scaled: the natural step size is 1
+        return 1.0 if self.size else super().initial_step(alpha)
+
+
+def cubic(a: float, f_a: float, s_a: float, b: float, f_b: float, s_b: float):
+    """The minimiser of the cubic interpolating values and slopes at a and
+    b, safeguarded to stay inside the interval (bisection otherwise)."""
+
+    d1 = s_a + s_b - 3 * (f_a - f_b) / (a - b)
+    square = d1 ** 2 - s_a * s_b
+    low, high = min(a, b), max(a, b)
+    if square >= 0:
+        d2 = np.sign(b - a) * np.sqrt(square)
+        t = b - (b - a) * (s_b + d2 - d1) / (s_b - s_a + 2 * d2)
+        margin = 0.1 * (high - low)
+        if np.isfinite(t) and low + margin <= t <= high - margin:
+            return float(t)
+    return (a + b) / 2
+
+
+def descent(
+    fun: Callable[[NDArray], float],
+    jac: Callable[[NDArray], NDArray],
+    x0: NDArray,
+    callback: Optional[Callable] = None,
+    **kwargs,
+) -> OptimizeResult:
+    """Minimise fun from x0 (see Descent for the keyword arguments)."""
+
+    return Descent(fun, jac, **kwargs).run(x0, callback)
+
+
+def lbfgs(
+    fun: Callable[[NDArray], float],
+    jac: Callable[[NDArray], NDArray],
+    x0: NDArray,
+    callback: Optional[Callable] = None,
+    **kwargs,
+) -> OptimizeResult:
+    """Minimise fun from x0 with L-BFGS (see LBFGS and Descent for the
+    keyword arguments)."""
+
+    return LBFGS(fun, jac, **kwargs).run(x0, callback)
+
+
+def multistart(
+    fun: Callable[[NDArray], NDArray],
+    jac: Callable[[NDArray], NDArray],
+    X0: NDArray,
+    step: str = "armijo",
+    alpha=1.0,
+    c1: float = 1e-4,
+    tol: float = 1e-3,
+    max_iter: int = 1000,
+    radius: float = 1e-2,
+) -> OptimizeResult:
+    """Run descents from N starting points at once, as one (N, D) array.
+
+    Functions are called as in the notebook, with the coordinates first:
+    fun(X.T) returns the N values and jac(X.T) the (N, D) gradients (like
+    func and func_der on meshgrids). Each start has its own step size, and
+    starts are removed from the active set once converged. Returns an
+    OptimizeResult with the best x and fun, the final points X and values
+    F, nit, the converged mask, nfev and njev (in points), the distinct
+    minima found and the label of the minimum reached by each start (-1 if
+    not converged), e.g. for basins of attraction on a grid:
+
+        X, Y = np.meshgrid(X0, X1)
+        res = multistart(func, func_der, np.c_[X.ravel(), Y.ravel()])
+        ax.pcolormesh(X, Y, res.labels.reshape(X.shape))
+
+    Keyword Arguments:
+    fun      -- the function to minimise, vectorised
+    jac      -- its gradient, vectorised
+    X0       -- the starting points, shape (N, D)
+    step     -- "fixed", "normalised" or "armijo"
+    alpha    -- the step size, or the first trial step of the line search
+                (a scalar, or one value per start)
+    c1       -- the sufficient decrease constant (Armijo)
+    tol      -- a start converges when the norm of its gradient is below
+    max_iter -- the maximum number of iterations
+    radius   -- converged points closer than radius share the same minimum
+    """
+
+    if step not in ("fixed", "normalised", "armijo"):
+        raise ValueError(f"unknown step size rule {step!r}")
+
+    X = np.array(X0, dtype=float, ndmin=2)
+    N = len(X)
+    alpha = np.array(np.broadcast_to(alpha, (N,)), dtype=float)
+    counts = dict(nfev=0, njev=0)
+
+    def values(Y):
+        counts["nfev"] += len(Y)
+        return np.asarray(fun(Y.T), dtype=float).reshape(len(Y))
+
+    def gradients(Y):
+        counts["njev"] += len(Y)
+        return np.asarray(jac(Y.T), dtype=float).reshape(Y.shape)
+
+    f, g = values(X), gradients(X)
+    norm = np.linalg.norm(g, axis=1)
+    nit = np.zeros(N, dtype=int)
+    failed = np.zeros(N, dtype=bool)
+    active = np.flatnonzero(norm > tol)
+
+    for _ in range(max_iter):
+        if active.size == 0:
+            break
+        x, d = X[active], -g[active]
+        if step == "fixed":
+            a = alpha[active]
+        elif step == "normalised":
+            a = alpha[active] / norm[active]
+        if step != "armijo":
+            y = x + a[:, None] * d
+            f_new = values(y)
+        else:
+            # backtracking on the starts which have not found a step yet
+            a = alpha[active]
+            f_x = f[active]
+            slope = -(norm[active] ** 2)
+            y, f_new = x.copy(), f_x.copy()
+            todo = np.arange(len(active))
+            for _ in range(60):
+                trial = x[todo] + a[todo, None] * d[todo]
+                f_trial = values(trial)
+                ok = f_trial <= f_x[todo] + c1 * a[todo] * slope[todo]
+                y[todo[ok]], f_new[todo[ok]] = trial[ok], f_trial[ok]
+                todo, f_trial = todo[~ok], f_trial[~ok]
+                if todo.size == 0:
+                    break
+                curvature = f_trial - f_x[todo] - slope[todo] * a[todo]
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    q = -slope[todo] * a[todo] ** 2 / (2 * curvature)
+                q = np.where(np.isfinite(q), q, a[todo] / 2)
+                a[todo] = np.minimum(np.maximum(q, a[todo] / 10), a[todo] / 2)
+            failed[active[todo]] = True
+            # the next line search starts from twice the last step size
+            alpha[active] = np.minimum(2 * a, 1e10)
+
+        moved = active[~failed[active]]
+        keep = ~failed[active]
+        X[moved], f[moved] = y[keep], f_new[keep]
+        g[moved] = gradients(X[moved])
+        norm[moved] = np.linalg.norm(g[moved], axis=1)
+        nit[moved] += 1
+        active = moved[norm[moved] > tol]
+
+    converged = norm <= tol
+    minima, labels = basins(X, f, converged, radius)
+    best = np.argmin(np.where(np.isfinite(f), f, np.inf))
+    return OptimizeResult(
+        x=X[best].copy(),
+        fun=f[best],
+        X=X,
+        F=f,
+        nit=nit,
+        converged=converged,
+        nfev=counts["nfev"],
+        njev=counts["njev"],
+        minima=minima,
+        labels=labels,
+    )
+
+
+def basins(X: NDArray, f: NDArray, mask: NDArray, radius: float) -> tuple:
+    """Group the points X[mask] closer than radius, from the lowest values
+    up. Returns the distinct minima and the label of each point (-1 outside
+    the mask)."""
+
+    labels = np.full(len(X), -1)
+    minima = []
+    remaining = np.flatnonzero(mask)
+    remaining = remaining[np.argsort(f[remaining])]
+    while remaining.size:
+        centre = X[remaining[0]]
+        close = np.linalg.norm(X[remaining] - centre, axis=1) <= radius
+        labels[remaining[close]] = len(minima)
+        minima.append(centre)
+        remaining = remaining[~close]
+    return np.array(minima).reshape(-1, X.shape[1]), labels
+
+
+if __name__ == "__main__":
+    from scipy.optimize import rosen, rosen_der
+
+    def quadratic(x):
+        return x[0] ** 2 + 10 * x[1] ** 2
+
+    def quadratic_der(x):
+        return np.array([2 * x[0], 20 * x[1]])
+
+    problems = [
+        ("x^2 + 10 y^2", quadratic, quadratic_der, [-0.8, -0.7], 0.05),
+        ("Rosenbrock", rosen, rosen_der, [-1.2, 1.0], 1e-3),
+    ]
+    print(f"{'function':>14} {'step':>10} {'nit':>6} {'nfev':>6} {'njev':>6}")
+    for name, fun, jac, x0, alpha in problems:
+        for step in ("fixed", "normalised", "exact", "armijo", "wolfe"):
+            res = descent(
+                fun, jac, x0, step=step, alpha=alpha, tol=1e-4, max_iter=50000
+            )
+            print(
+                f"{name:>14} {step:>10} {res.nit:>6} {res.nfev:>6} "
+                f"{res.njev:>6}  f = {res.fun:.2e}"
+                + ("" if res.success else f"  ({res.message})")
+            )
+        res = lbfgs(fun, jac, x0, alpha=alpha, tol=1e-4, max_iter=50000)
+        print(
+            f"{name:>14} {'l-bfgs':>10} {res.nit:>6} {res.nfev:>6} "
+            f"{res.njev:>6}  f = {res.fun:.2e}"
+            + ("" if res.success else f"  ({res.message})")
+        )
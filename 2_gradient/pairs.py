@@ -0,0 +1,336 @@
+"""Stochastic (minibatch) optimisation of the city placement criterion, for
+instances too large to sum over all n (n - 1) / 2 pairs at each step.
+
+Each step samples a batch of pairs (i, j), i < j, uniformly or stratified by
+distance, reads their distances from the (memory-mapped) condensed store of
+city.py, and estimates the criterion and its gradient: the estimates are
+weighted to be unbiased estimates of the full sums, so that learning rates
+are comparable with full batch runs.
+
+A background thread prefetches the next batches while the current one is
+used, and the NumPy optimisers SGD and Adam follow the torch.optim API:
+
+    distances = CondensedDistances.load("distances_condensed.npy")
+    sampler = PairSampler(distances, batch=2 ** 16, strata=8, seed=0)
+    x = landmark_mds(distances)
+    # Adam moves each coordinate by about lr: relative to the RMS distance
+    optimizer = Adam(x, lr=1e-3 * distances.norm() / distances.shape[0])
+    with Prefetcher(sampler) as batches:
+        for step in range(10000):
+            value, grad = value_and_gradient(x, next(batches))
+            optimizer.step(grad)
+
+With torch, the batches are converted to tensors and torch_batch_criterion
+replaces value_and_gradient (see 3_pytorch/optim.md).
+
+This file is identical in 2_gradient and 3_pytorch.
+"""
+
+import queue
+import threading
+import time
+from typing import NamedTuple, Optional, Union
+
+import numpy as np
+from numpy.typing import NDArray
+
+from city import CondensedDistances
+
+__all__ = [
+    "Pairs",
+    "PairSampler",
+    "Prefetcher",
+    "SGD",
+    "Adam",
+    "pair_index",
+    "value_and_gradient",
+    "torch_batch_criterion",
+]
+
+
+class Pairs(NamedTuple):
+    i: NDArray
+    j: NDArray
+    distance: NDArray
+    weight: NDArray  # the number of pairs represented by each sample
+
+
+def pair_index(k: NDArray, n: int) -> tuple:
+    """The pairs (i, j), i < j, at indices k of a condensed matrix."""
+
+    k = np.asarray(k, dtype=np.int64)
+    total = n * (n - 1) // 2
+    # the row i is the largest one with offset(i) <= k
+    i = n - 2 - np.floor(np.sqrt(4.0 * (total - k) * 2 - 7) / 2 - 0.5)
+    i = i.astype(np.int64)
+    # rounding errors for large n
+    i -= i * (2 * n - i - 1) // 2 > k
+    i += (i + 1) * (2 * n - i - 2) // 2 <= k
+    j = k - i * (2 * n - i - 1) // 2 + i + 1
+    return i, j
+
+
+class PairSampler:
+    def __init__(
+        self,
+        distances: Union[NDArray, CondensedDistances],
+        batch: int = 2 ** 16,
+        strata: Optional[int] = None,
+        seed: Optional[int] = None,
+        sample: int = 2 ** 20,
+    ) -> None:
+        """Create a new PairSampler object.
+
+        Keyword Arguments:
+        distances -- the (n, n) distance matrix, or condensed distances
+        batch     -- the number of pairs per batch
+        strata    -- None for uniform sampling, or the number of strata of
+                     pairs with distances between quantiles: each stratum
+                     gets the same number of pairs in each batch (tied
+                     distances may merge or empty some strata)
+        seed      -- the seed of the random generator
+        sample    -- the number of pairs used to estimate the quantiles and
+                     the number of pairs in each stratum
+        """
+
+        self.distances = distances
+        self.n = distances.shape[0]
+        self.total = self.n * (self.n - 1) // 2
+        self.batch = batch
+        self.rng = np.random.default_rng(seed)
+        self.pairs = 0  # pairs sampled so far
+        self.elapsed = 0.0  # time spent sampling
+        self.bounds = self.sizes = None
+        if strata is not None:
+            k = np.sort(self.rng.integers(self.total, size=sample))
+            distance = self.read(k)
+            quantiles = np.linspace(0, 1, strata + 1)[1:-1]
+            self.bounds = np.unique(np.quantile(distance, quantiles))
+            stratum = np.searchsorted(self.bounds, distance, side="right")
+            counts = np.bincount(stratum, minlength=len(self.bounds) + 1)
+            # the estimated number of pairs in each stratum
+            self.sizes = counts * (self.total / sample)
+
+    @property
+    def throughput(self) -> float:
+        """Pairs sampled per second."""
+
+        return self.pairs / self.elapsed if self.elapsed else 0.0
+
+    def read(self, k: NDArray) -> NDArray:
+        """The distances at (sorted) indices k of the condensed matrix."""
+
+        if isinstance(self.distances, CondensedDistances):
+            data = self.distances.data[k].astype(float)
+            data *= self.distances.scale
+            return data
+        i, j = pair_index(k, self.n)
+        return np.asarray(self.distances[i, j], dtype=float)
+
+    def sample(self) -> Pairs:
+        """A new batch of pairs (sorted, so that reads are sequential)."""
+
+        start = time.perf_counter()
+        if self.bounds is None:
+            k = np.sort(self.rng.integers(self.total, size=self.batch))
+            distance = self.read(k)
+            weight = np.full(self.batch, self.total / self.batch)
+        else:
+            k, distance, weight = self.stratified()
+        i, j = pair_index(k, self.n)
+        self.pairs += len(k)
+        self.elapsed += time.perf_counter() - start
+        return Pairs(i, j, distance, weight)
+
+    def stratified(self, max_rounds: int = 100) -> tuple:
+        """Draw uniform pairs until each stratum has its quota. Strata are
+        weighted by their estimated number of pairs: each sample stands for
+        size / quota pairs of its stratum. Empty strata (in the sample used
+        for the quantiles) get no quota."""
+
+        strata = len(self.sizes)
+        full = np.flatnonzero(self.sizes)
+        quota = np.zeros(strata, dtype=np.int64)
+        quota[full] = self.batch // len(full)
+        quota[full[: self.batch % len(full)]] += 1
+        weights = np.zeros(strata)
+        weights[full] = self.sizes[full] / quota[full]
+        probability = self.sizes / self.total
+        ks, distances = [], []
+        for _ in range(max_rounds):
+            if not quota.any():
+                break
+            # enough candidates to fill the largest remaining quota
+            needed = np.max(quota[full] / probability[full])
+            size = int(min(max(1.1 * needed, 1024), 16 * self.batch))
+            # candidates stay in random order (the first ones of each
+            # stratum are kept), only reads are sorted
+            k = self.rng.integers(self.total, size=size)
+            sort = np.argsort(k)
+            distance = np.empty(len(k))
+            distance[sort] = self.read(k[sort])
+            stratum = np.searchsorted(self.bounds, distance, side="right")
+            # rank of each candidate within its stratum
+            rank = np.empty(len(k), dtype=np.int64)
+            for s in range(strata):
+                mask = stratum == s
+                rank[mask] = np.arange(np.count_nonzero(mask))
+            keep = rank < quota[stratum]
+            quota -= np.bincount(stratum[keep], minlength=strata)
+            ks.append(k[keep])
+            distances.append(distance[keep])
+        else:
+            if quota.any():
+                raise RuntimeError(
+                    f"strata {np.flatnonzero(quota).tolist()} could not be "
+                    f"filled in {max_rounds} rounds"
+                )
+        k, distance = np.concatenate(ks), np.concatenate(distances)
+        order = np.argsort(k)
+        k, distance = k[order], distance[order]
+        stratum = np.searchsorted(self.bounds, distance, side="right")
+        return k, distance, weights[stratum]
+
+
+class Prefetcher:
+    def __init__(self, sampler: PairSampler, depth: int = 4) -> None:
+        """Create a new Prefetcher object: a background thread fills a
+        queue of batches drawn from the sampler.
+
+        Keyword Arguments:
+        sampler -- the PairSampler
+        depth   -- the maximum number of batches waiting in the queue
+        """
+
+        self.sampler = sampler
+        self.queue: queue.Queue = queue.Queue(depth)
+        self.stopped = threading.Event()
+        self.waiting = 0.0  # time spent waiting for batches
+        self.thread = threading.Thread(target=self.work, daemon=True)
+        self.thread.start()
+
+    def work(self) -> None:
+        while not self.stopped.is_set():
+            try:
+                item = self.sampler.sample()
+            except BaseException as error:  # raised in the consumer
+                item = error
+            while not self.stopped.is_set():
+                try:
+                    self.queue.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+            if isinstance(item, BaseException):
+                return
+
+    def __iter__(self) -> "Prefetcher":
+        return self
+
+    def __next__(self) -> Pairs:
+        start = time.perf_counter()
+        item = self.queue.get()
+        self.waiting += time.perf_counter() - start
+        if isinstance(item, BaseException):
+            raise item
+        return item
+
+    def __enter__(self) -> "Prefetcher":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.stopped.set()
+        self.thread.join()
+
+
+def value_and_gradient(x: NDArray, pairs: Pairs) -> tuple:
+    """The estimates of the criterion and of its gradient (same shape as
+    x) from a batch of pairs."""
+
+    P = np.asarray(x, dtype=float).reshape(-1, 2)
+    dx = P[pairs.i] - P[pairs.j]
+    delta = np.einsum("ij,ij->i", dx, dx) - pairs.distance ** 2
+    value = float(np.sum(pairs.weight * delta ** 2))
+    dx *= (4 * pairs.weight * delta)[:, None]
+    grad = np.empty_like(P)
+    for c in range(2):
+        grad[:, c] = np.bincount(pairs.i, dx[:, c], minlength=len(P))
+        grad[:, c] -= np.bincount(pairs.j, dx[:, c], minlength=len(P))
+    return value, grad.reshape(np.shape(x))
+
+
+def torch_batch_criterion(x, pairs: Pairs):
+    """The estimate of the criterion on a torch tensor x of shape (n, 2)
+    from a batch of pairs (converted with torch.as_tensor on the device of
+    x)."""
+
+    import torch
+
+    i, j, distance, weight = (
+        torch.as_tensor(a, device=x.device) for a in pairs
+    )
+    delta = ((x[i] - x[j]) ** 2).sum(dim=1) - distance.to(x.dtype) ** 2
+    return (weight.to(x.dtype) * delta ** 2).sum()
+
+
+class SGD:
+    def __init__(self, x: NDArray, lr: float, momentum: float = 0.0) -> None:
+        """Create a new SGD object, updating the array x in place.
+
+        Keyword Arguments:
+        x        -- the parameters
+        lr       -- the learning rate
+        momentum -- the momentum factor
+        """
+
+        self.x = x
+        self.lr = lr
+        self.momentum = momentum
+        self.velocity = np.zeros_like(x)
+
+    def step(self, grad: NDArray) -> None:
+        self.velocity *= self.momentum
+        self.velocity += grad
+        self.x -= self.lr * self.velocity
+
+
+class Adam:
+    def __init__(
+        self,
+        x: NDArray,
+        lr: float = 1e-3,
+        betas: tuple = (0.9, 0.999),
+        eps: float = 1e-8,
+    ) -> None:
+        """Create a new Adam object, updating the array x in place (as in
+        torch.optim.Adam).
+
+        Keyword Arguments:
+        x     -- the parameters
+        lr    -- the learning rate
+        betas -- the decay rates of the averages of the gradient and of its
+                 square
+        eps   -- added to the denominator for numerical stability
+        """
+
+        self.x = x
+        self.lr = lr
+        self.betas = betas
+        self.eps = eps
+        self.m = np.zeros_like(x)
+        self.v = np.zeros_like(x)
+        self.t = 0
+
+    def step(self, grad: NDArray) -> None:
+        beta1, beta2 = self.betas
+        self.t += 1
+        self.m *= beta1
+        self.m += (1 - beta1) * grad
+        self.v *= beta2
+        self.v += (1 - beta2) * grad ** 2
+        m = self.m / (1 - beta1 ** self.t)
+        v = self.v / (1 - beta2 ** self.t)
+        self.x -= self.lr * m / (np.sqrt(v) + self.eps)
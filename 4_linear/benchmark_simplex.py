@@ -0,0 +1,104 @@
+"""Compare the revised simplex solver with scipy.optimize.linprog (HiGHS)
+on random dense and sparse linear programs of growing size.
+
+Usage: python benchmark_simplex.py [--sizes 50 100 200 400] [--repeat 3]
+"""
+
+import argparse
+import time
+
+import numpy as np
+import scipy.optimize
+import scipy.sparse
+
+from revised_simplex import linprog
+
+
+def random_lp(m, n, density=None, seed=0):
+    """Generate a random feasible and bounded LP: min c x s.t. A x <= b,
+    x >= 0. A feasible point and a dual feasible point are built first, so
+    that the problem always has an optimal solution.
+
+    Keyword Arguments:
+    m       -- the number of constraints
+    n       -- the number of variables
+    density -- the density of A, None for a dense matrix
+    seed    -- the seed of the random generator
+    """
+
+    rng = np.random.default_rng(seed)
+    if density is None:
+        A = rng.normal(size=(m, n))
+    else:
+        A = scipy.sparse.random(
+            m,
+            n,
+            density=density,
+            random_state=rng,
+            data_rvs=lambda k: rng.normal(size=k),
+        ).tocsr()
+
+    x = rng.random(n)
+    b = A @ x + rng.random(m)
+    y = rng.random(m)
+    c = -(A.T @ y) + rng.random(n)
+
+    return c, A, b
+
+
+def timeit(function, repeat):
+    """Return the result of the function and its best running time."""
+
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main(sizes, repeat):
+    print(
+        f"{'kind':>6} {'m':>5} {'n':>5} {'method':>10} "
+        f"{'nit':>6} {'time (s)':>10} {'|gap|':>10}"
+    )
+
+    for kind, density in [("dense", None), ("sparse", 0.05)]:
+        for m in sizes:
+            n = 2 * m
+            c, A, b = random_lp(m, n, density)
+
+            reference, elapsed = timeit(
+                lambda: scipy.optimize.linprog(
+                    c, A_ub=A, b_ub=b, method="highs"
+                ),
+                repeat,
+            )
+            print(
+                f"{kind:>6} {m:>5} {n:>5} {'highs':>10} "
+                f"{reference.nit:>6} {elapsed:>10.4f} {0:>10.1e}"
+            )
+
+            for pricing in ["dantzig", "steepest", "bland"]:
+                res, elapsed = timeit(
+                    lambda: linprog(
+                        c,
+                        A_ub=A,
+                        b_ub=b,
+                        options=dict(pricing=pricing, maxiter=50_000),
+                    ),
+                    repeat,
+                )
+                gap = abs(res.fun - reference.fun)
+                print(
+                    f"{kind:>6} {m:>5} {n:>5} {pricing:>10} "
+                    f"{res.nit:>6} {elapsed:>10.4f} {gap:>10.1e}"
+                )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 100, 200])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    main(args.sizes, args.repeat)
@@ -0,0 +1,594 @@
+"""A revised simplex solver for linear programs, with an LU factorisation
+of the basis updated in product form, several pricing rules and a callback
+at each iteration.
+
+The linprog function follows the interface of scipy.optimize.linprog, so
+that the notebooks written for the (now removed) method="simplex" keep
+working, and the results can be passed to LPVisu directly:
+
+    res = linprog(-c, A_ub=A, b_ub=b, callback=callback)
+    LPVisu(A, b, c, xk=res.x, obj=-res.fun)
+"""
+
+import numpy as np
+from scipy.linalg import lu_factor, lu_solve
+from scipy.optimize import OptimizeResult
+
+MESSAGES = {
+    0: "Optimization terminated successfully.",
+    1: "Iteration limit reached.",
+    2: "The problem is infeasible.",
+    3: "The problem is unbounded.",
+    4: "Numerical difficulties encountered.",
+}
+
+
+class RevisedSimplex:
+    """The revised simplex method for linear programs in the form:
+
+        min c x  s.t.  A_ub x <= b_ub,  A_eq x = b_eq,  x >= 0
+
+    Slack variables are added to inequality constraints and artificial
+    variables where no slack can start in the basis (equality constraints
+    and inequality constraints with a negative right-hand side).
+
+    The basis B is kept as an LU factorisation and each change of basis is
+    stored as an eta vector (product form): the factorisation is refreshed
+    every `refactor` iterations.
+    """
+
+    def __init__(
+        self,
+        c,
+        A_ub,
+        b_ub,
+        A_eq,
+        b_eq,
+        pricing="dantzig",
+        refactor=50,
+        tol=1e-9,
+    ):
+        """Create a new RevisedSimplex object.
+
+        Keyword Arguments:
+        c        -- the coefficients of the linear function to be minimized
+        A_ub     -- the matrix of inequality constraints, shape (m_ub, n)
+        b_ub     -- the right-hand side of inequality constraints
+        A_eq     -- the matrix of equality constraints, shape (m_eq, n)
+        b_eq     -- the right-hand side of equality constraints
+        pricing  -- "dantzig", "steepest" (steepest edge) or "bland"
+        refactor -- the number of eta vectors before refactorising B
+        tol      -- the tolerance on reduced costs and pivots
+        """
+
+        c = np.asarray(c, dtype=float).ravel()
+        n = c.size
+        A_ub = np.asarray(A_ub, dtype=float).reshape(-1, n)
+        A_eq = np.asarray(A_eq, dtype=float).reshape(-1, n)
+        b_ub = np.asarray(b_ub, dtype=float).ravel()
+        b_eq = np.asarray(b_eq, dtype=float).ravel()
+        m_ub, m_eq = A_ub.shape[0], A_eq.shape[0]
+        m = m_ub + m_eq
+
+        # structural variables, then slack variables
+        A = np.zeros((m, n + m_ub))
+        A[:m_ub, :n] = A_ub
+        A[m_ub:, :n] = A_eq
+        A[np.arange(m_ub), n + np.arange(m_ub)] = 1
+        b = np.concatenate([b_ub, b_eq])
+
+        # make the right-hand side nonnegative
+        sign = np.where(b < 0, -1.0, 1.0)
+        A *= sign[:, None]
+        b *= sign
+
+        # artificial variables where the slack cannot be basic
+        needs_artificial = np.ones(m, dtype=bool)
+        needs_artificial[:m_ub] = sign[:m_ub] < 0
+        rows = np.flatnonzero(needs_artificial)
+        artificial = np.zeros((m, rows.size))
+        artificial[rows, np.arange(rows.size)] = 1
+
+        self.A = np.hstack([A, artificial])
+        self.b = b
+        self.c = np.concatenate([c, np.zeros(m_ub + rows.size)])
+        self.n, self.m_ub, self.m_eq = n, m_ub, m_eq
+        self.artificial = np.zeros(self.A.shape[1], dtype=bool)
+        self.artificial[n + m_ub :] = True
+
+        self.basis = np.empty(m, dtype=int)
+        self.basis[rows] = n + m_ub + np.arange(rows.size)
+        slack_rows = np.flatnonzero(~needs_artificial)
+        self.basis[slack_rows] = n + slack_rows
+
+        self.pricing = pricing
+        self.refactor = refactor
+        self.tol = tol
+        self.nit = 0
+        self.phase = 1
+        self.factorize()
+
+        # steepest edge reference weights, exact for the initial basis B = I
+        self.weights = 1 + np.einsum("ij,ij->j", self.A, self.A)
+
+    def factorize(self):
+        """Compute the LU factorisation of the basis and drop eta vectors.
+
+        Not to be used outside the class.
+        """
+
+        m = self.b.size
+        if m == 0:
+            self.lu = None
+        else:
+            self.lu = lu_factor(self.A[:, self.basis])
+        self.etas = []
+        self.x_B = self.ftran(self.b)
+
+    def ftran(self, v):
+        """Solve B x = v."""
+
+        if self.lu is None:
+            return np.zeros(0)
+        x = lu_solve(self.lu, v)
+        for r, d in self.etas:
+            x[r] /= d[r]
+            x_r = x[r]
+            x -= x_r * d
+            x[r] = x_r
+        return x
+
+    def btran(self, v):
+        """Solve B^T y = v."""
+
+        if self.lu is None:
+            return np.zeros(0)
+        y = np.array(v, dtype=float)
+        for r, d in reversed(self.etas):
+            y[r] -= (d @ y - y[r]) / d[r]
+        return lu_solve(self.lu, y, trans=1)
+
+    def objective(self, cost=None):
+        """Return the value of the objective function for the current basis.
+
+        Keyword Arguments:
+        cost -- the cost vector. Defaults to None (phase 2 costs)
+        """
+
+        cost = self.c if cost is None else cost
+        return cost[self.basis] @ self.x_B
+
+    def solution(self):
+        """Return the values of all variables (structural and slack)."""
+
+        y = np.zeros(self.A.shape[1])
+        y[self.basis] = self.x_B
+        return y
+
+    def pivot(self, q, r, d):
+        """Replace the r-th basic variable with variable q.
+
+        Keyword Arguments:
+        q -- the index of the entering variable
+        r -- the position in the basis of the leaving variable
+        d -- the entering column expressed in the basis (ftran(A[:, q]))
+        """
+
+        if self.pricing == "steepest":
+            self.update_weights(q, r, d)
+
+        theta = self.x_B[r] / d[r]
+        self.x_B -= theta * d
+        self.x_B[r] = theta
+        self.basis[r] = q
+        self.etas.append((r, d))
+        self.nit += 1
+
+        if len(self.etas) >= self.refactor:
+            self.factorize()
+
+    def update_weights(self, q, r, d):
+        """Update the steepest edge weights for a change of basis
+        (Goldfarb and Reid recurrence).
+
+        Not to be used outside the class.
+        """
+
+        leaving = self.basis[r]
+        rho = self.btran(np.eye(1, d.size, r).ravel())
+        alpha_r = (rho @ self.A) / d[r]
+        w = self.btran(d)
+        gamma_q = 1 + d @ d
+
+        update = self.weights - 2 * alpha_r * (w @ self.A)
+        update += alpha_r**2 * gamma_q
+        self.weights = np.maximum(update, 1 + alpha_r**2)
+        self.weights[leaving] = max(gamma_q / d[r] ** 2, 1)
+
+    def price(self, cost, allowed, rule):
+        """Select the entering variable, or return None if the basis is
+        optimal for the given cost vector.
+
+        Not to be used outside the class.
+        """
+
+        y = self.btran(cost[self.basis])
+        reduced = cost - y @ self.A
+        candidates = allowed & (reduced < -self.tol)
+        candidates[self.basis] = False
+
+        if not candidates.any():
+            return None
+        if rule == "bland":
+            return np.argmax(candidates)
+        if rule == "steepest":
+            score = np.where(candidates, reduced**2 / self.weights, -1)
+            return np.argmax(score)
+        return np.argmin(np.where(candidates, reduced, 0))
+
+    def ratio_test(self, d, rule):
+        """Select the position in the basis of the leaving variable, or
+        return None if the problem is unbounded in this direction.
+
+        Not to be used outside the class.
+        """
+
+        positive = d > self.tol
+        if not positive.any():
+            return None
+
+        ratios = np.full(d.size, np.inf)
+        ratios[positive] = self.x_B[positive] / d[positive]
+        ties = np.flatnonzero(ratios <= ratios.min() + self.tol)
+
+        if rule == "bland":
+            return ties[np.argmin(self.basis[ties])]
+        # the largest pivot among ties is the most stable one
+        return ties[np.argmax(d[ties])]
+
+    def iterate(self, cost, allowed, maxiter, callback=None):
+        """Run primal simplex iterations until optimality. Returns a status
+        code (see MESSAGES).
+
+        Dantzig and steepest edge pricing fall back to Bland's rule while
+        the objective stalls, to prevent cycling on degenerate problems.
+
+        Not to be used outside the class.
+        """
+
+        best, stalled = self.objective(cost), 0
+
+        while self.nit < maxiter:
+            rule = self.pricing if stalled < 50 else "bland"
+            q = self.price(cost, allowed, rule)
+            if q is None:
+                return 0
+
+            d = self.ftran(self.A[:, q])
+            r = self.ratio_test(d, rule)
+            if r is None:
+                return 3
+
+            self.pivot(q, r, d)
+
+            value = self.objective(cost)
+            if value < best - self.tol:
+                best, stalled = value, 0
+            else:
+                stalled += 1
+
+            if callback is not None:
+                callback(self)
+
+        return 1
+
+    def drive_out_artificials(self):
+        """After phase 1, replace artificial variables still in the basis
+        (at zero) with structural or slack variables where possible.
+        Artificial variables left in the basis correspond to redundant
+        constraints and remain at zero.
+
+        Not to be used outside the class.
+        """
+
+        for r in np.flatnonzero(self.artificial[self.basis]):
+            rho = self.btran(np.eye(1, self.b.size, r).ravel())
+            alpha = rho @ self.A
+            alpha[self.artificial] = 0
+            alpha[self.basis] = 0
+            q = np.argmax(np.abs(alpha))
+            if abs(alpha[q]) > self.tol:
+                self.pivot(q, r, self.ftran(self.A[:, q]))
+
+    def solve(self, maxiter=5000, callback=None):
+        """Run phase 1 (if needed) and phase 2. Returns a status code
+        (see MESSAGES).
+
+        Keyword Arguments:
+        maxiter  -- the maximum number of iterations for both phases
+        callback -- a function called with this object after each iteration
+        """
+
+        if self.artificial[self.basis].any():
+            self.phase = 1
+            cost = self.artificial.astype(float)
+            allowed = np.ones(self.A.shape[1], dtype=bool)
+            status = self.iterate(cost, allowed, maxiter, callback)
+            if status == 1:
+                return status
+            scale = max(1.0, np.abs(self.b).max())
+            if self.objective(cost) > 1e3 * self.tol * scale:
+                return 2
+            self.drive_out_artificials()
+
+        self.phase = 2
+        return self.iterate(self.c, ~self.artificial, maxiter, callback)
+
+    def reduced_costs(self):
+        """Return the reduced costs of all variables for phase 2 costs."""
+
+        return self.c - self.btran(self.c[self.basis]) @ self.A
+
+    def set_basis(self, basis):
+        """Start from a given basis, e.g. the optimal basis of a parent
+        problem in a branch-and-bound tree.
+
+        Keyword Arguments:
+        basis -- the indices of the basic variables, one per constraint
+        """
+
+        self.basis = np.array(basis, dtype=int)
+        self.factorize()
+
+    def add_constraints(self, A_rows, b_rows):
+        """Append constraints A_rows x <= b_rows on structural variables.
+
+        The slack variable of each new constraint enters the basis, so an
+        optimal basis stays dual feasible and the problem can be
+        reoptimised with dual_solve instead of starting from scratch.
+
+        Keyword Arguments:
+        A_rows -- the left part of the new constraints, shape (k, n)
+        b_rows -- the right part of the new constraints
+        """
+
+        A_rows = np.asarray(A_rows, dtype=float).reshape(-1, self.n)
+        b_rows = np.asarray(b_rows, dtype=float).ravel()
+        k = b_rows.size
+        m, N = self.A.shape
+
+        A = np.zeros((m + k, N + k))
+        A[:m, :N] = self.A
+        A[m:, : self.n] = A_rows
+        A[m + np.arange(k), N + np.arange(k)] = 1
+
+        self.A = A
+        self.b = np.concatenate([self.b, b_rows])
+        self.c = np.concatenate([self.c, np.zeros(k)])
+        self.artificial = np.concatenate([self.artificial, np.zeros(k, bool)])
+        self.weights = np.concatenate([self.weights, np.ones(k)])
+        self.basis = np.concatenate([self.basis, N + np.arange(k)])
+        self.factorize()
+
+    def remove_constraints(self, rows):
+        """Remove inequality constraints whose slack variable is basic, e.g.
+        cuts which are no longer active. The row and the slack column are
+        removed together, so the basis stays nonsingular and optimal.
+
+        Keyword Arguments:
+        rows -- the indices of the constraints to remove
+        """
+
+        rows = np.asarray(rows, dtype=int).ravel()
+        columns = np.flatnonzero(~self.artificial)
+        columns = columns[columns >= self.n]
+        slack = columns[np.argmax(np.abs(self.A[rows][:, columns]), axis=1)]
+        if (self.A[rows, slack] == 0).any() or not np.isin(
+            slack, self.basis
+        ).all():
+            raise ValueError("only constraints with a basic slack variable")
+
+        keep_rows = np.ones(self.b.size, dtype=bool)
+        keep_rows[rows] = False
+        keep_columns = np.ones(self.A.shape[1], dtype=bool)
+        keep_columns[slack] = False
+        index = np.cumsum(keep_columns) - 1
+
+        basis = self.basis[~np.isin(self.basis, slack)]
+        self.A = self.A[keep_rows][:, keep_columns]
+        self.b = self.b[keep_rows]
+        self.c = self.c[keep_columns]
+        self.artificial = self.artificial[keep_columns]
+        self.weights = self.weights[keep_columns]
+        self.basis = index[basis]
+        self.factorize()
+
+    def dual_solve(self, maxiter=5000, callback=None):
+        """Reoptimise with the dual simplex method from a dual feasible
+        basis (nonnegative reduced costs), e.g. after add_constraints.
+        Returns a status code (see MESSAGES).
+
+        Keyword Arguments:
+        maxiter  -- the maximum number of iterations
+        callback -- a function called with this object after each iteration
+        """
+
+        self.phase = 2
+        allowed = ~self.artificial
+        feasibility = 1e3 * self.tol * max(1.0, np.abs(self.b).max())
+
+        while self.nit < maxiter:
+            r = np.argmin(self.x_B)
+            if self.x_B[r] >= -feasibility:
+                # primal feasible: clean up with a few primal iterations
+                return self.iterate(self.c, allowed, maxiter, callback)
+
+            rho = self.btran(np.eye(1, self.b.size, r).ravel())
+            alpha = rho @ self.A
+            reduced = np.maximum(self.reduced_costs(), 0)
+
+            candidates = allowed & (alpha < -self.tol)
+            candidates[self.basis] = False
+            if not candidates.any():
+                return 2
+
+            ratios = np.full(alpha.size, np.inf)
+            ratios[candidates] = reduced[candidates] / -alpha[candidates]
+            ties = np.flatnonzero(ratios <= ratios.min() + self.tol)
+            q = ties[np.argmax(-alpha[ties])]
+
+            self.pivot(q, r, self.ftran(self.A[:, q]))
+
+            if callback is not None:
+                callback(self)
+
+        return 1
+
+
+def as_arrays(c, A_ub, b_ub, A_eq, b_eq):
+    """Convert the data of a linear program into dense NumPy arrays, with
+    empty matrices for missing constraints.
+
+    Not to be used outside the module.
+    """
+
+    c = np.asarray(c, dtype=float).ravel()
+
+    def as_matrix(A):
+        if A is None:
+            return np.zeros((0, c.size))
+        if hasattr(A, "toarray"):  # scipy sparse matrices
+            A = A.toarray()
+        return np.asarray(A, dtype=float).reshape(-1, c.size)
+
+    def as_vector(b):
+        return np.zeros(0) if b is None else np.asarray(b, float).ravel()
+
+    return c, as_matrix(A_ub), as_vector(b_ub), as_matrix(A_eq), as_vector(b_eq)
+
+
+def standard_form(c, A_ub, b_ub, A_eq, b_eq, bounds):
+    """Rewrite a linear program with bounds on variables into a problem with
+    nonnegative variables y, with x = T y + x0.
+
+    Returns c, A_ub, b_ub, A_eq, b_eq for variables y, and T, x0.
+
+    Not to be used outside the module.
+    """
+
+    n = c.size
+
+    if bounds is None:
+        bounds = (0, None)
+    if len(bounds) == 2 and np.ndim(bounds[0]) == 0:
+        bounds = [bounds] * n
+
+    columns, upper_rows = [], []
+    x0 = np.zeros(n)
+    for j, (lb, ub) in enumerate(bounds):
+        lb = -np.inf if lb is None else lb
+        ub = np.inf if ub is None else ub
+        if np.isfinite(lb):
+            x0[j] = lb
+            columns.append((j, 1.0))
+            if np.isfinite(ub):
+                upper_rows.append((len(columns) - 1, ub - lb))
+        elif np.isfinite(ub):
+            x0[j] = ub
+            columns.append((j, -1.0))
+        else:
+            columns.append((j, 1.0))
+            columns.append((j, -1.0))
+
+    T = np.zeros((n, len(columns)))
+    for k, (j, sign) in enumerate(columns):
+        T[j, k] = sign
+
+    bounds_A = np.zeros((len(upper_rows), len(columns)))
+    bounds_b = np.zeros(len(upper_rows))
+    for i, (k, value) in enumerate(upper_rows):
+        bounds_A[i, k] = 1
+        bounds_b[i] = value
+
+    return (
+        c @ T,
+        np.vstack([A_ub @ T, bounds_A]),
+        np.concatenate([b_ub - A_ub @ x0, bounds_b]),
+        A_eq @ T,
+        b_eq - A_eq @ x0,
+        T,
+        x0,
+    )
+
+
+def linprog(
+    c,
+    A_ub=None,
+    b_ub=None,
+    A_eq=None,
+    b_eq=None,
+    bounds=(0, None),
+    method="revised simplex",
+    callback=None,
+    options=None,
+):
+    """Minimize a linear objective function subject to linear equality and
+    inequality constraints, with the same interface as
+    scipy.optimize.linprog.
+
+    The callback is called after each iteration with an OptimizeResult
+    holding x, fun, slack, con, phase, nit, status, message and basis (the
+    indices of basic variables: structural, then slack variables).
+
+    Keyword Arguments:
+    c        -- the coefficients of the linear function to be minimized
+    A_ub     -- the matrix of inequality constraints (dense or sparse)
+    b_ub     -- the right-hand side of inequality constraints
+    A_eq     -- the matrix of equality constraints (dense or sparse)
+    b_eq     -- the right-hand side of equality constraints
+    bounds   -- a pair (min, max) for all variables or a sequence of pairs.
+                Use None for infinity. Defaults to (0, None)
+    method   -- "revised simplex" (or "simplex"); other methods (e.g.
+                "highs") are passed to scipy.optimize.linprog
+    callback -- a function called with an OptimizeResult after each
+                iteration. Defaults to None
+    options  -- a dictionary with pricing ("dantzig", "steepest" or
+                "bland"), maxiter, refactor and tol
+    """
+
+    if method not in ("simplex", "revised simplex"):
+        from scipy.optimize import linprog as scipy_linprog
+
+        return scipy_linprog(
+            c, A_ub, b_ub, A_eq, b_eq, bounds, method=method, options=options
+        )
+
+    options = dict(options or {})
+    maxiter = options.pop("maxiter", 5000)
+
+    c, A_ub, b_ub, A_eq, b_eq = as_arrays(c, A_ub, b_ub, A_eq, b_eq)
+    *problem, T, x0 = standard_form(c, A_ub, b_ub, A_eq, b_eq, bounds)
+    solver = RevisedSimplex(*problem, **options)
+
+    def result(status):
+        x = T @ solver.solution()[: T.shape[1]] + x0
+        return OptimizeResult(
+            x=x,
+            fun=c @ x,
+            slack=b_ub - A_ub @ x,
+            con=b_eq - A_eq @ x,
+            phase=solver.phase,
+            nit=solver.nit,
+            status=status,
+            message=MESSAGES[status],
+            success=status == 0,
+            basis=solver.basis.copy(),
+        )
+
+    solver_callback = None
+    if callback is not None:
+
+        def solver_callback(solver):
+            callback(result(0))
+
+    return result(solver.solve(maxiter, solver_callback))
@@ -0,0 +1,453 @@
+"""A branch-and-bound solver for mixed integer linear programs, built on
+the revised simplex solver.
+
+Each node of the tree only adds one bound on a variable to its parent
+problem: the LP relaxation is warm started from the optimal basis of the
+parent and reoptimised with the dual simplex method. Open nodes are kept in
+a priority queue and selected by best bound, depth first or a hybrid of
+both (depth first until an incumbent is found, then best bound).
+
+The explored tree can be exported and the nodes of two-variable problems
+displayed with LPVisu:
+
+    bb = BranchAndBound(-c, A_ub=A, b_ub=b)
+    res = bb.solve()
+    for node in res.tree:
+        LPVisu(A + node["A"], b + node["b"], c, integers=True, xk=node["x"])
+"""
+
+import heapq
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy.optimize import OptimizeResult
+
+from revised_simplex import RevisedSimplex, as_arrays, standard_form
+
+MESSAGES = {
+    0: "Optimal solution found.",
+    1: "Node, time or iteration limit reached.",
+    2: "The problem is infeasible.",
+    3: "The LP relaxation is unbounded.",
+}
+
+
+class Node:
+    """A node of the branch-and-bound tree."""
+
+    def __init__(self, id, parent, depth, branches, bound, basis, n):
+        """Create a new Node object.
+
+        Keyword Arguments:
+        id       -- the number of the node, in order of creation
+        parent   -- the number of the parent node (None for the root)
+        depth    -- the depth of the node in the tree
+        branches -- a list of bounds (j, sign, value) meaning
+                    sign * x[j] <= sign * value, from the root to this node
+        bound    -- a lower bound on the objective value in this subtree
+        basis    -- the optimal basis of the parent, None for the root
+        n        -- the number of variables
+        """
+
+        self.id = id
+        self.parent = parent
+        self.depth = depth
+        self.branches = branches
+        self.bound = bound
+        self.basis = basis
+        self.n = n
+
+        self.status = None
+        self.x = None
+        self.fun = None
+        self.nit = 0
+        self.time = 0.0
+        self.pruned = False
+
+    def constraints(self):
+        """Return the bounds of the node as constraints A x <= b, as lists
+        so that they can be appended to the constraints of LPVisu.
+        """
+
+        A, b = [], []
+        for j, sign, value in self.branches:
+            row = [0.0] * self.n
+            row[j] = float(sign)
+            A.append(row)
+            b.append(float(sign * value))
+        return A, b
+
+
+# problem shared with the worker processes
+_problem = None
+
+
+def _init_worker(problem):
+    global _problem
+    _problem = problem
+
+
+def evaluate_node(branches, basis, problem=None, options=None):
+    """Solve the LP relaxation of a node. Returns a tuple with the status,
+    the solution x (None if not optimal), the objective value, the optimal
+    basis, the number of simplex iterations and the elapsed time.
+
+    When the basis of the parent is given, the new bound is added as a
+    constraint whose slack variable enters the basis, and the problem is
+    reoptimised with the dual simplex method.
+
+    Keyword Arguments:
+    branches -- a list of bounds (j, sign, value) from the root to the node
+    basis    -- the optimal basis of the parent node, None for the root
+    problem  -- the objective c and the problem (c, A_ub, b_ub, A_eq, b_eq,
+                T, x0) in standard form, with x = T y + x0.
+                Defaults to None (problem set in the worker process)
+    options  -- options passed to RevisedSimplex
+    """
+
+    start = time.perf_counter()
+    c_x, c, A_ub, b_ub, A_eq, b_eq, T, x0 = (
+        _problem if problem is None else problem
+    )
+    options = dict(options or {})
+    maxiter = options.pop("maxiter", 5000)
+
+    # sign * x[j] <= sign * value, with x = T y + x0
+    A_rows = np.array([sign * T[j] for j, sign, _ in branches]).reshape(
+        -1, T.shape[1]
+    )
+    b_rows = np.array(
+        [sign * (value - x0[j]) for j, sign, value in branches], dtype=float
+    )
+
+    solver = RevisedSimplex(c, A_ub, b_ub, A_eq, b_eq, **options)
+    warm = basis is not None
+    if warm:
+        solver.add_constraints(A_rows, b_rows)
+        solver.set_basis(np.append(basis, solver.A.shape[1] - 1))
+        # the parent basis stays dual feasible, up to numerical errors
+        reduced = solver.reduced_costs()[~solver.artificial]
+        warm = reduced.min() >= -1e3 * solver.tol
+    if warm:
+        status = solver.dual_solve(maxiter)
+    elif branches:
+        # start from scratch with the bounds as regular constraints
+        solver = RevisedSimplex(
+            c,
+            np.vstack([A_ub, A_rows]),
+            np.concatenate([b_ub, b_rows]),
+            A_eq,
+            b_eq,
+            **options,
+        )
+        status = solver.solve(maxiter)
+    else:
+        status = solver.solve(maxiter)
+
+    x, fun, new_basis = None, None, None
+    if status == 0:
+        x = T @ solver.solution()[: T.shape[1]] + x0
+        fun = c_x @ x
+        # the basis can only be passed on to children with the same layout
+        if warm or not branches:
+            new_basis = solver.basis.copy()
+
+    return status, x, fun, new_basis, solver.nit, time.perf_counter() - start
+
+
+class BranchAndBound:
+    """A branch-and-bound solver for problems in the form:
+
+        min c x  s.t.  A_ub x <= b_ub,  A_eq x = b_eq,  bounds on x,
+                       x[j] integer for j in integrality
+    """
+
+    def __init__(
+        self,
+        c,
+        A_ub=None,
+        b_ub=None,
+        A_eq=None,
+        b_eq=None,
+        bounds=(0, None),
+        integrality=None,
+        strategy="best",
+        processes=None,
+        tol=1e-6,
+        options=None,
+    ):
+        """Create a new BranchAndBound object.
+
+        Keyword Arguments:
+        c           -- the coefficients of the linear function to minimize
+        A_ub        -- the matrix of inequality constraints
+        b_ub        -- the right-hand side of inequality constraints
+        A_eq        -- the matrix of equality constraints
+        b_eq        -- the right-hand side of equality constraints
+        bounds      -- a pair (min, max) for all variables or a sequence of
+                       pairs. Use None for infinity. Defaults to (0, None)
+        integrality -- the indices of integer variables.
+                       Defaults to None (all variables)
+        strategy    -- the node selection: "best" (best bound), "depth"
+                       (depth first) or "hybrid". Defaults to "best"
+        processes   -- the number of worker processes evaluating nodes in
+                       parallel. Defaults to None (sequential)
+        tol         -- the integrality and pruning tolerance
+        options     -- options passed to RevisedSimplex (e.g. pricing)
+        """
+
+        c, A_ub, b_ub, A_eq, b_eq = as_arrays(c, A_ub, b_ub, A_eq, b_eq)
+        self.c = c
+        self.problem = (c, *standard_form(c, A_ub, b_ub, A_eq, b_eq, bounds))
+        self.integrality = (
+            np.arange(c.size)
+            if integrality is None
+            else np.asarray(integrality, dtype=int)
+        )
+        self.strategy = strategy
+        self.processes = processes
+        self.tol = tol
+        self.options = options
+
+        self.nodes = []
+        self.queue = []
+        self.incumbent = None
+        self.incumbent_value = np.inf
+        self.history = []
+        self.unsolved = []
+
+    def key(self, node):
+        """The priority of a node in the queue (lowest first).
+
+        Not to be used outside the class.
+        """
+
+        depth_first = self.strategy == "depth" or (
+            self.strategy == "hybrid" and self.incumbent is None
+        )
+        if depth_first:
+            return (-node.depth, node.bound, node.id)
+        return (node.bound, node.id)
+
+    def push(self, node):
+        """Insert a new node in the tree and in the queue.
+
+        Not to be used outside the class.
+        """
+
+        self.nodes.append(node)
+        heapq.heappush(self.queue, (self.key(node), node.id))
+
+    def pop(self):
+        """Return the next open node which cannot be pruned by bound, or
+        None if the queue is empty.
+
+        Not to be used outside the class.
+        """
+
+        while self.queue:
+            _, id = heapq.heappop(self.queue)
+            node = self.nodes[id]
+            if node.bound < self.incumbent_value - self.tol:
+                return node
+            node.pruned = True
+        return None
+
+    def best_bound(self):
+        """The best lower bound among open nodes, nodes whose relaxation
+        reached the iteration limit (and the incumbent)."""
+
+        bounds = [self.nodes[id].bound for _, id in self.queue]
+        bounds += [node.bound for node in self.unsolved]
+        return min(bounds + [self.incumbent_value])
+
+    def gap(self):
+        """The relative gap between the incumbent and the best bound."""
+
+        if self.incumbent is None:
+            return np.inf
+        bound = self.best_bound()
+        return (self.incumbent_value - bound) / max(
+            abs(self.incumbent_value), 1e-10
+        )
+
+    def process(self, node, result):
+        """Record the LP solution of a node, then update the incumbent or
+        branch on the most fractional variable.
+
+        Not to be used outside the class.
+        """
+
+        node.status, node.x, node.fun, basis, node.nit, node.time = result
+
+        if node.status == 1:
+            # the subtree is not explored: not pruned, but not solved either
+            self.unsolved.append(node)
+            return False
+        if node.status != 0:
+            node.pruned = True
+            return node.status == 3 and node.parent is None
+        if node.fun >= self.incumbent_value - self.tol:
+            node.pruned = True
+            return False
+
+        values = node.x[self.integrality]
+        fraction = np.abs(values - np.round(values))
+        if np.all(fraction <= self.tol):
+            self.incumbent = node.x.copy()
+            self.incumbent[self.integrality] = np.round(values)
+            self.incumbent_value = node.fun
+            self.history.append(
+                (time.perf_counter() - self.start, len(self.nodes), node.fun)
+            )
+            if self.strategy == "hybrid":
+                # switch to best bound: reorder the queue
+                self.queue = [
+                    (self.key(self.nodes[id]), id) for _, id in self.queue
+                ]
+                heapq.heapify(self.queue)
+            return False
+
+        j = self.integrality[np.argmax(fraction)]
+        for sign, value in [(1, np.floor(node.x[j])), (-1, np.ceil(node.x[j]))]:
+            child = Node(
+                len(self.nodes),
+                node.id,
+                node.depth + 1,
+                node.branches + [(j, sign, value)],
+                node.fun,
+                basis,
+                self.c.size,
+            )
+            self.push(child)
+        return False
+
+    def solve(self, max_nodes=10_000, time_limit=None, callback=None):
+        """Explore the tree. Returns an OptimizeResult with x, fun, status,
+        message, success, nodes, gap, bound, history (time, nodes and value
+        of each new incumbent), time and tree (see export_tree).
+
+        Keyword Arguments:
+        max_nodes  -- the maximum number of nodes to evaluate
+        time_limit -- the maximum time in seconds. Defaults to None
+        callback   -- a function called with this object after each node
+        """
+
+        self.start = time.perf_counter()
+        self.nodes, self.queue = [], []
+        self.incumbent, self.incumbent_value = None, np.inf
+        self.history = []
+        self.unsolved = []
+        self.push(Node(0, None, 0, [], -np.inf, None, self.c.size))
+
+        pool = None
+        if self.processes is not None:
+            pool = ProcessPoolExecutor(
+                self.processes,
+                initializer=_init_worker,
+                initargs=(self.problem,),
+            )
+
+        evaluated, status = 0, 0
+        try:
+            while self.queue:
+                elapsed = time.perf_counter() - self.start
+                if evaluated >= max_nodes or (
+                    time_limit is not None and elapsed > time_limit
+                ):
+                    status = 1
+                    break
+
+                batch = []
+                while len(batch) < (self.processes or 1):
+                    node = self.pop()
+                    if node is None:
+                        break
+                    batch.append(node)
+                if not batch:
+                    break
+
+                if pool is None:
+                    results = [
+                        evaluate_node(
+                            node.branches,
+                            node.basis,
+                            self.problem,
+                            self.options,
+                        )
+                        for node in batch
+                    ]
+                else:
+                    results = pool.map(
+                        evaluate_node,
+                        [node.branches for node in batch],
+                        [node.basis for node in batch],
+                        [None] * len(batch),
+                        [self.options] * len(batch),
+                    )
+
+                for node, result in zip(batch, results):
+                    evaluated += 1
+                    if self.process(node, result):
+                        status = 3
+                        self.queue = []
+                    if callback is not None:
+                        callback(self)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        # nodes whose relaxation reached the iteration limit, and which
+        # could still hold a better solution
+        unsolved = [
+            node
+            for node in self.unsolved
+            if node.bound < self.incumbent_value - self.tol
+        ]
+        if status == 0 and unsolved:
+            status = 1
+        if status == 0 and self.incumbent is None:
+            status = 2
+
+        return OptimizeResult(
+            x=self.incumbent,
+            fun=self.incumbent_value if self.incumbent is not None else None,
+            status=status,
+            message=MESSAGES[status],
+            success=status == 0,
+            nodes=evaluated,
+            gap=self.gap(),
+            bound=self.best_bound(),
+            history=self.history,
+            time=time.perf_counter() - self.start,
+            tree=self.export_tree(),
+        )
+
+    def export_tree(self):
+        """Return the explored tree as a list of dictionaries (one per node)
+        with the id of the node and of its parent, its depth, the
+        constraints A and b added to the root problem, the LP solution x,
+        its value fun, the status, whether the node was pruned, the number
+        of simplex iterations and the evaluation time.
+        """
+
+        tree = []
+        for node in self.nodes:
+            A, b = node.constraints()
+            tree.append(
+                dict(
+                    id=node.id,
+                    parent=node.parent,
+                    depth=node.depth,
+                    A=A,
+                    b=b,
+                    x=node.x,
+                    fun=node.fun,
+                    status=node.status,
+                    pruned=node.pruned,
+                    nit=node.nit,
+                    time=node.time,
+                )
+            )
+        return tree
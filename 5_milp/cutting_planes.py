@@ -0,0 +1,363 @@
+"""A cutting-plane loop with Gomory mixed-integer cuts, built on the revised
+simplex solver.
+
+At each round, cuts are read from all rows of the optimal tableau with a
+fractional integer basic variable, then filtered through a cut pool:
+duplicates and cuts with a low efficacy (distance from the current solution
+to the cut) are discarded, and cuts which have not been active for a few
+rounds are removed from the problem. The new cuts are added to the LP,
+which is reoptimised from the previous basis with the dual simplex method.
+
+The cuts can be displayed with LPVisu as they are found:
+
+    visu = LPVisu(A, b, c, integers=True)
+    res = CuttingPlanes(-c, A_ub=A, b_ub=b).solve(visu=visu)
+    visu
+"""
+
+import time
+
+import numpy as np
+from scipy.linalg import lu_solve
+from scipy.optimize import OptimizeResult
+
+from revised_simplex import RevisedSimplex, as_arrays, standard_form
+
+MESSAGES = {
+    0: "Integer solution found.",
+    1: "Round or time limit reached.",
+    2: "The problem is infeasible.",
+    3: "The LP relaxation is unbounded.",
+    4: "No more efficient cuts.",
+}
+
+
+def gomory_cuts(solver, integer, away=1e-4):
+    """Compute the Gomory mixed-integer cuts of all tableau rows with a
+    fractional integer basic variable, as constraints alpha y <= beta on
+    the structural variables of the solver.
+
+    Slack variables in the cuts are replaced with their definition, so that
+    the cuts can be added to the problem with solver.add_constraints.
+
+    Keyword Arguments:
+    solver  -- a RevisedSimplex object at an optimal basis
+    integer -- a boolean mask of integer structural variables
+    away    -- the minimum distance of basic variables to an integer
+    """
+
+    A, b, n = solver.A, solver.b, solver.n
+    N = A.shape[1]
+
+    # slack variables and the constraint they belong to
+    slack = np.flatnonzero(~solver.artificial)
+    slack = slack[slack >= n]
+    rows = np.argmax(np.abs(A[:, slack]), axis=0)
+    coef = A[rows, slack]
+
+    # a slack variable is integer if its constraint has integer data
+    # on integer variables only
+    A_rows = A[rows, :n]
+    integral = np.all(
+        np.isclose(A_rows, np.round(A_rows)) & (integer | (A_rows == 0)),
+        axis=1,
+    ) & np.isclose(b[rows], np.round(b[rows]))
+
+    is_integer = np.zeros(N, dtype=bool)
+    is_integer[:n] = integer
+    is_integer[slack] = integral
+
+    # fractional integer basic variables
+    x_B = solver.x_B
+    f0 = x_B - np.floor(x_B)
+    candidates = is_integer[solver.basis] & (f0 > away) & (f0 < 1 - away)
+    position = np.flatnonzero(candidates)
+    if position.size == 0:
+        return np.zeros((0, n)), np.zeros(0)
+
+    # the corresponding tableau rows: e_r^T B^-1 A
+    solver.factorize()
+    E = np.zeros((b.size, position.size))
+    E[position, np.arange(position.size)] = 1
+    tableau = lu_solve(solver.lu, E, trans=1).T @ A
+    f0 = f0[position][:, None]
+
+    # pi y_N >= 1 on nonbasic variables
+    f = tableau - np.floor(tableau)
+    pi = np.where(
+        is_integer,
+        np.where(f <= f0, f / f0, (1 - f) / (1 - f0)),
+        np.where(tableau > 0, tableau / f0, -tableau / (1 - f0)),
+    )
+    pi[:, solver.basis] = 0
+    pi[:, solver.artificial] = 0
+
+    # y_k = (b_i - A_i y) / coef for each slack variable k of constraint i
+    weights = pi[:, slack] / coef
+    alpha = pi[:, :n] - weights @ A[rows, :n]
+    beta = 1 - weights @ b[rows]
+
+    return -alpha, -beta
+
+
+class CuttingPlanes:
+    """A cutting-plane solver for problems in the form:
+
+        min c x  s.t.  A_ub x <= b_ub,  A_eq x = b_eq,  bounds on x,
+                       x[j] integer for j in integrality
+
+    Variables must be bounded on at least one side.
+    """
+
+    def __init__(
+        self,
+        c,
+        A_ub=None,
+        b_ub=None,
+        A_eq=None,
+        b_eq=None,
+        bounds=(0, None),
+        integrality=None,
+        max_cuts=50,
+        min_efficacy=1e-4,
+        max_age=3,
+        tol=1e-6,
+        options=None,
+    ):
+        """Create a new CuttingPlanes object.
+
+        Keyword Arguments:
+        c            -- the coefficients of the linear function to minimize
+        A_ub         -- the matrix of inequality constraints
+        b_ub         -- the right-hand side of inequality constraints
+        A_eq         -- the matrix of equality constraints
+        b_eq         -- the right-hand side of equality constraints
+        bounds       -- a pair (min, max) for all variables or a sequence
+                        of pairs. Use None for infinity. Defaults to (0, None)
+        integrality  -- the indices of integer variables.
+                        Defaults to None (all variables)
+        max_cuts     -- the maximum number of cuts added at each round
+        min_efficacy -- the minimum distance from the current solution to
+                        a new cut
+        max_age      -- the number of rounds an inactive cut is kept
+        tol          -- the integrality tolerance
+        options      -- options passed to RevisedSimplex (e.g. pricing)
+        """
+
+        c, A_ub, b_ub, A_eq, b_eq = as_arrays(c, A_ub, b_ub, A_eq, b_eq)
+        *problem, T, x0 = standard_form(c, A_ub, b_ub, A_eq, b_eq, bounds)
+        if T.shape[0] != T.shape[1]:
+            raise ValueError("free variables are not supported")
+
+        self.c = c
+        self.problem = problem
+        self.T, self.x0 = T, x0
+        self.integrality = (
+            np.arange(c.size)
+            if integrality is None
+            else np.asarray(integrality, dtype=int)
+        )
+        self.max_cuts = max_cuts
+        self.min_efficacy = min_efficacy
+        self.max_age = max_age
+        self.tol = tol
+        self.options = dict(options or {})
+
+        # y[k] is an integer if x[j] = +/- y[k] + x0[j] is an integer
+        integer = np.zeros(c.size, dtype=bool)
+        integer[self.integrality] = True
+        integer &= np.isclose(x0, np.round(x0))
+        self.integer = np.abs(T.T) @ integer > 0
+
+    def to_x(self, alpha, beta):
+        """Express cuts alpha y <= beta as constraints on x.
+
+        Not to be used outside the class.
+        """
+
+        A = alpha @ self.T.T
+        return A, beta + A @ self.x0
+
+    def select(self, alpha, beta, y):
+        """Filter new cuts: keep the most efficient ones, above the efficacy
+        threshold and different from each other and from cuts in the pool.
+
+        Not to be used outside the class.
+        """
+
+        norm = np.linalg.norm(alpha, axis=1)
+        valid = norm > 1e-12
+        alpha, beta, norm = alpha[valid], beta[valid], norm[valid]
+        efficacy = (alpha @ y - beta) / norm
+
+        order = np.argsort(-efficacy)
+        order = order[efficacy[order] >= self.min_efficacy]
+        alpha, beta = alpha[order], beta[order]
+
+        # normalised cuts, compared with all cuts in the pool
+        cuts = np.hstack([alpha, beta[:, None]]) / norm[order][:, None]
+        pool = [cut["normalised"] for cut in self.pool]
+
+        selected = []
+        for i, cut in enumerate(cuts):
+            if len(selected) == self.max_cuts:
+                break
+            others = np.array(pool + [cuts[j] for j in selected])
+            if len(others) and np.abs(others - cut).max(axis=1).min() < 1e-6:
+                continue
+            selected.append(i)
+
+        return alpha[selected], beta[selected], cuts[selected]
+
+    def solution(self):
+        """The current solution x and its value.
+
+        Not to be used outside the class.
+        """
+
+        y = self.solver.solution()[: self.solver.n]
+        x = self.T @ y + self.x0
+        return x, self.c @ x
+
+    def solve(
+        self, max_rounds=50, time_limit=None, visu=None, callback=None
+    ):
+        """Solve the LP relaxation, then add rounds of cuts until an integer
+        solution is found or no efficient cut is left.
+
+        Returns an OptimizeResult with x, fun (the bound given by the last
+        LP relaxation), status, message, success (an integer solution is
+        found), rounds, nit, A_cuts and b_cuts (all cuts as constraints
+        on x), active (the number of cuts in the problem) and history: a
+        list of dictionaries with the round, the elapsed time, the bound,
+        the bound improvement and the number of added and removed cuts.
+
+        Keyword Arguments:
+        max_rounds -- the maximum number of rounds of cuts
+        time_limit -- the maximum time in seconds. Defaults to None
+        visu       -- an LPVisu object: new cuts are passed to add_cuts
+        callback   -- a function called with the last entry of the
+                      history after each round
+        """
+
+        start = time.perf_counter()
+        options = dict(self.options)
+        maxiter = options.pop("maxiter", 5000)
+
+        self.solver = solver = RevisedSimplex(*self.problem, **options)
+        self.m = solver.b.size
+        self.pool = []
+        A_cuts, b_cuts = [], []
+
+        status = solver.solve(maxiter)
+        x, fun = self.solution() if status == 0 else (None, None)
+        history = [
+            dict(
+                round=0,
+                time=time.perf_counter() - start,
+                bound=fun,
+                improvement=0.0,
+                added=0,
+                removed=0,
+            )
+        ]
+
+        for round in range(1, max_rounds + 1):
+            if status != 0:
+                break
+            values = x[self.integrality]
+            if np.abs(values - np.round(values)).max() <= self.tol:
+                break
+            elapsed = time.perf_counter() - start
+            if time_limit is not None and elapsed > time_limit:
+                status = 1
+                break
+
+            # age cuts and remove the ones inactive for too long
+            slack = solver.solution()[solver.n :]
+            removed = []
+            for i, cut in enumerate(self.pool):
+                row = self.m + i
+                column = np.flatnonzero(solver.A[row, solver.n :])
+                active = slack[column].min() <= 1e-7 * max(1.0, abs(cut["b"]))
+                cut["age"] = 0 if active else cut["age"] + 1
+                if cut["age"] > self.max_age:
+                    removed.append(i)
+            if removed:
+                solver.remove_constraints(self.m + np.array(removed))
+                self.pool = [
+                    cut for i, cut in enumerate(self.pool) if i not in removed
+                ]
+
+            alpha, beta = gomory_cuts(solver, self.integer)
+            y = solver.solution()[: solver.n]
+            alpha, beta, normalised = self.select(alpha, beta, y)
+            if beta.size == 0:
+                status = 4
+                break
+
+            for value, cut in zip(beta, normalised):
+                self.pool.append(dict(normalised=cut, b=value, age=0))
+
+            A_new, b_new = self.to_x(alpha, beta)
+            A_cuts += A_new.tolist()
+            b_cuts += b_new.tolist()
+            if visu is not None:
+                visu.add_cuts(A_new.tolist(), b_new.tolist())
+
+            solver.add_constraints(alpha, beta)
+            status = solver.dual_solve(maxiter)
+            bound = fun
+            x, fun = self.solution() if status == 0 else (None, None)
+
+            history.append(
+                dict(
+                    round=round,
+                    time=time.perf_counter() - start,
+                    bound=fun,
+                    improvement=None if fun is None else fun - bound,
+                    added=beta.size,
+                    removed=len(removed),
+                )
+            )
+            if callback is not None:
+                callback(history[-1])
+
+        integral = status == 0 and (
+            np.abs(x[self.integrality] - np.round(x[self.integrality])).max()
+            <= self.tol
+        )
+        if status == 0 and not integral:
+            status = 1
+        if integral:
+            x = x.copy()
+            x[self.integrality] = np.round(x[self.integrality])
+
+        return OptimizeResult(
+            x=x,
+            fun=fun,
+            status=status,
+            message=MESSAGES[status],
+            success=bool(integral),
+            rounds=len(history) - 1,
+            nit=solver.nit,
+            A_cuts=A_cuts,
+            b_cuts=b_cuts,
+            active=len(self.pool),
+            history=history,
+        )
+
+
+if __name__ == "__main__":
+    A = [[4, 1], [1, 4], [1, -1]]
+    b = [28, 27, 2]
+    c = [1, 2]
+
+    res = CuttingPlanes(-np.array(c), A_ub=A, b_ub=b).solve()
+    print(f"{'round':>5} {'time (s)':>10} {'bound':>10} {'improvement':>12}")
+    for entry in res.history:
+        print(
+            f"{entry['round']:>5} {entry['time']:>10.4f} "
+            f"{entry['bound']:>10.4f} {entry['improvement']:>12.4f}"
+        )
+    print(res.message, res.x)
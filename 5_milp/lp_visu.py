@@ -1,13 +1,19 @@
 """A module to visualize simplex algorithm for (integer) linear
 programs with two variables.
+
+The geometry (lines, polygon, convex hull, integer points) only relies on
+NumPy and can be used without any graphics: matplotlib and IPython are
+only imported when a figure is first rendered.
 """
 
 import base64
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from pathlib import Path
 
-import matplotlib.pyplot as plt
 import numpy as np
-from IPython.core.pylabtools import print_figure
-from scipy.spatial import ConvexHull
 
 
 def intersect(a1, a2, b1, b2):
@@ -41,11 +47,494 @@ def intersect(a1, a2, b1, b2):
     return (num / denom.astype(float)) * vb + b1
 
 
+def constraint_lines(
+    A,
+    b,
+    x1_gui_bounds=(-1000, 1000),
+    x2_gui_bounds=(-1000, 1000),
+    x1_bounds=None,
+    x2_bounds=None,
+):
+    """
+    Compute the endpoints of the lines A x = b within the GUI bounds.
+    Returns an array of shape (m, 2, 2) with two points per line.
+
+    If x1_bounds and x2_bounds are given, the two axes (x2 = 0 and x1 = 0)
+    are appended to the lines, limited to those bounds.
+
+    Keyword Arguments:
+    A             -- the A matrix
+    b             -- the b matrix
+    x1_gui_bounds -- a pair representing x1 bounds in the GUI
+    x2_gui_bounds -- a pair representing x2 bounds in the GUI
+    x1_bounds     -- a pair representing x1 bounds. Use None for infinity
+    x2_bounds     -- a pair representing x2 bounds. Use None for infinity
+    """
+
+    A = np.asarray(A, dtype=float).reshape(-1, 2)
+    b = np.asarray(b, dtype=float).reshape(-1)
+    x1_gui = np.asarray(x1_gui_bounds, dtype=float)
+    x2_gui = np.asarray(x2_gui_bounds, dtype=float)
+
+    lines = np.empty((A.shape[0], 2, 2))
+    vertical = A[:, 1] == 0
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        lines[:, :, 0] = x1_gui
+        lines[:, :, 1] = (b[:, None] - x1_gui * A[:, :1]) / A[:, 1:]
+        lines[vertical, :, 0] = (b[vertical] / A[vertical, 0])[:, None]
+    lines[vertical, :, 1] = x2_gui
+
+    if x1_bounds is None or x2_bounds is None:
+        return lines
+
+    x1_axis = [
+        x1_gui[i] if x1_bounds[i] is None else x1_bounds[i] for i in (0, 1)
+    ]
+    x2_axis = [
+        x2_gui[i] if x2_bounds[i] is None else x2_bounds[i] for i in (0, 1)
+    ]
+    axes = np.array(
+        [
+            [[x1_axis[0], 0], [x1_axis[1], 0]],
+            [[0, x2_axis[0]], [0, x2_axis[1]]],
+        ],
+        dtype=float,
+    )
+
+    return np.concatenate([lines, axes])
+
+
+def pairwise_intersections(lines, rows=None, epsilon=1e-6):
+    """
+    Batched version of intersect: compute in one go the intersections of
+    lines[i] with all lines[j] for i in rows and j > i. Parallel pairs are
+    masked out instead of raising an exception.
+
+    Returns an array of shape (k, 2) with all the intersection points.
+
+    Keyword Arguments:
+    lines   -- an array-like of shape (m, 2, 2) with two points per line
+    rows    -- a slice (or index array) of the lines to intersect with all
+               the following ones. Defaults to None (all lines)
+    epsilon -- the threshold under which two lines are deemed parallel
+    """
+
+    lines = np.asarray(lines, dtype=float).reshape(-1, 2, 2)
+    index = np.arange(lines.shape[0])
+    if rows is not None:
+        index = index[rows]
+
+    a1, a2 = lines[index, 0, None, :], lines[index, 1, None, :]
+    b1, b2 = lines[None, :, 0, :], lines[None, :, 1, :]
+
+    va = a2 - a1  # (r, 1, 2)
+    vb = b2 - b1  # (1, m, 2)
+    vp = a1 - b1  # (r, m, 2)
+
+    # vap is va rotated by 90 degrees
+    denom = -va[..., 1] * vb[..., 0] + va[..., 0] * vb[..., 1]
+    num = -va[..., 1] * vp[..., 0] + va[..., 0] * vp[..., 1]
+
+    mask = (index[:, None] < np.arange(lines.shape[0])[None, :]) & (
+        np.abs(denom) >= epsilon
+    )
+    i, j = np.nonzero(mask)
+
+    return (num[i, j] / denom[i, j])[:, None] * vb[0, j] + b1[0, j]
+
+
+def feasible_vertices(
+    lines,
+    A,
+    b,
+    x1_bounds=(0, None),
+    x2_bounds=(0, None),
+    epsilon=1e-6,
+    max_candidates=None,
+):
+    """
+    Compute all the intersections of the lines which satisfy the constraints
+    A x <= b and the bounds on x1 and x2. Returns an array of shape (k, 2).
+
+    All pairwise 2x2 systems are solved with NumPy operations and the
+    feasibility of the candidate points is checked with one matrix product.
+    With max_candidates, lines are processed by chunks of rows so that no
+    more than max_candidates points are held in memory at the same time
+    (the feasibility check then takes max_candidates * len(A) floats).
+
+    Keyword Arguments:
+    lines          -- the GUI lines for the equations, shape (m, 2, 2)
+    A              -- the A matrix
+    b              -- the b matrix
+    x1_bounds      -- a pair representing x1 bounds. Use None for infinity
+    x2_bounds      -- a pair representing x2 bounds. Use None for infinity
+    epsilon        -- the precision needed for floating points operations
+    max_candidates -- the maximum number of candidate points per chunk.
+                      Defaults to None (no chunking)
+    """
+
+    lines = np.asarray(lines, dtype=float).reshape(-1, 2, 2)
+    A_arr = np.asarray(A, dtype=float).reshape(-1, 2)
+    b_arr = np.asarray(b, dtype=float).reshape(-1)
+
+    m = lines.shape[0]
+    chunk = m
+    if max_candidates is not None:
+        chunk = max(1, max_candidates // max(m, 1))
+
+    lower = np.array(
+        [
+            -np.inf if x1_bounds[0] is None else x1_bounds[0],
+            -np.inf if x2_bounds[0] is None else x2_bounds[0],
+        ]
+    )
+    upper = np.array(
+        [
+            np.inf if x1_bounds[1] is None else x1_bounds[1],
+            np.inf if x2_bounds[1] is None else x2_bounds[1],
+        ]
+    )
+
+    polygon = []
+    for start in range(0, m, chunk):
+        p = pairwise_intersections(lines, slice(start, start + chunk), epsilon)
+        p = p[np.all((p >= lower) & (p <= upper), axis=1)]
+        polygon.append(p[np.all(p @ A_arr.T - b_arr <= epsilon, axis=1)])
+
+    return np.concatenate(polygon) if polygon else np.empty((0, 2))
+
+
+def convex_hull(points):
+    """
+    Compute the convex hull of a set of points (monotone chain algorithm).
+    Returns the indices of the vertices of the hull in counterclockwise
+    order, as the vertices attribute of scipy.spatial.ConvexHull.
+
+    Keyword Arguments:
+    points -- an array-like of shape (k, 2)
+    """
+
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    order = np.lexsort((points[:, 1], points[:, 0]))
+
+    def half_hull(indices):
+        chain = []
+        for i in indices:
+            while len(chain) >= 2:
+                (x0, y0), (x1, y1) = points[chain[-2]], points[chain[-1]]
+                x2, y2 = points[i]
+                if (x1 - x0) * (y2 - y0) - (y1 - y0) * (x2 - x0) > 0:
+                    break
+                chain.pop()
+            chain.append(i)
+        return chain
+
+    lower, upper = half_hull(order), half_hull(order[::-1])
+
+    return np.array(lower[:-1] + upper[:-1], dtype=int)
+
+
+def feasible_polygon(
+    A,
+    b,
+    x1_bounds=(0, None),
+    x2_bounds=(0, None),
+    epsilon=1e-6,
+    max_candidates=None,
+):
+    """
+    Compute the polygon of admissible solutions of A x <= b within the
+    bounds on x1 and x2. Returns an array of shape (k, 2) with the
+    vertices in counterclockwise order.
+
+    Keyword Arguments:
+    A              -- the A matrix
+    b              -- the b matrix
+    x1_bounds      -- a pair representing x1 bounds. Use None for infinity
+    x2_bounds      -- a pair representing x2 bounds. Use None for infinity
+    epsilon        -- the precision needed for floating points operations
+    max_candidates -- the maximum number of candidate points per chunk
+                      (see feasible_vertices). Defaults to None
+    """
+
+    lines = constraint_lines(A, b, x1_bounds=x1_bounds, x2_bounds=x2_bounds)
+    vertices = feasible_vertices(
+        lines, A, b, x1_bounds, x2_bounds, epsilon, max_candidates
+    )
+
+    return vertices[convex_hull(vertices)]
+
+
+def clip_polygon(vertices, a, b, epsilon=1e-6):
+    """
+    Clip a convex polygon with the half-plane a . x <= b (one step of the
+    Sutherland-Hodgman algorithm). Returns the ordered vertices of the
+    clipped polygon, possibly empty.
+
+    Keyword Arguments:
+    vertices -- an array of shape (k, 2) with the ordered polygon vertices
+    a        -- a pair representing the left part of the cut
+    b        -- the right part of the cut
+    epsilon  -- the precision needed for floating points operations
+    """
+
+    vertices = np.asarray(vertices, dtype=float).reshape(-1, 2)
+    if vertices.shape[0] == 0:
+        return vertices
+
+    s = vertices @ np.asarray(a, dtype=float) - b
+    inside = s <= epsilon
+    if inside.all():
+        return vertices
+    if not inside.any():
+        return np.empty((0, 2))
+
+    # edges go from the previous vertex to the current one
+    prev = np.roll(vertices, 1, axis=0)
+    s_prev = np.roll(s, 1)
+    crossing = inside != np.roll(inside, 1)
+
+    t = np.zeros_like(s)
+    t[crossing] = s_prev[crossing] / (s_prev[crossing] - s[crossing])
+    cross_points = prev + t[:, None] * (vertices - prev)
+
+    # for each edge, output the crossing point (if any) then the current
+    # vertex (if inside)
+    output = np.stack([cross_points, vertices], axis=1).reshape(-1, 2)
+    keep = np.stack([crossing, inside], axis=1).reshape(-1)
+    output = output[keep]
+
+    # drop duplicates created when a vertex lies on the cut
+    distinct = np.abs(output - np.roll(output, 1, axis=0)).max(axis=1)
+    distinct = distinct > epsilon
+    distinct[0] = True
+
+    return output[distinct]
+
+
+def lattice_points(vertices, epsilon=1e-6):
+    """
+    Enumerate all the integer points inside a convex polygon (boundary
+    included). Returns an array of shape (k, 2).
+
+    The lattice of the bounding box is built with a meshgrid and checked at
+    once against the half-planes defined by each edge of the polygon.
+
+    Keyword Arguments:
+    vertices -- an array of shape (k, 2) with the polygon vertices,
+                ordered along its boundary
+    epsilon  -- the precision needed for floating points operations
+    """
+
+    vertices = np.asarray(vertices, dtype=float).reshape(-1, 2)
+    if vertices.shape[0] < 3:
+        # degenerate polygon (empty, point or segment)
+        return np.empty((0, 2), dtype=int)
+
+    x1_min, x2_min = np.ceil(vertices.min(axis=0) - epsilon)
+    x1_max, x2_max = np.floor(vertices.max(axis=0) + epsilon)
+    x1, x2 = np.meshgrid(
+        np.arange(x1_min, x1_max + 1), np.arange(x2_min, x2_max + 1)
+    )
+    points = np.column_stack([x1.ravel(), x2.ravel()])
+
+    edges = np.roll(vertices, -1, axis=0) - vertices
+    norms = np.hypot(edges[:, 0], edges[:, 1])
+    edges, vertices = edges[norms > 0], vertices[norms > 0]
+    norms = norms[norms > 0]
+
+    # signed area gives the orientation of the polygon
+    orientation = np.sign(
+        np.sum(edges[:, 1] * vertices[:, 0] - edges[:, 0] * vertices[:, 1])
+    )
+
+    # distance of each point to each edge (positive inside)
+    cross = edges[None, :, 0] * (points[:, None, 1] - vertices[None, :, 1])
+    cross -= edges[None, :, 1] * (points[:, None, 0] - vertices[None, :, 0])
+    inside = np.all(orientation * cross / norms >= -epsilon, axis=1)
+
+    return points[inside].astype(int)
+
+
+class FeasibleRegion:
+    """The convex polygon of admissible solutions, stored as an array of
+    ordered vertices. Cuts clip the current polygon in O(k) and every
+    previous state is kept so that cuts can be undone without recomputing
+    anything.
+    """
+
+    def __init__(self, vertices, epsilon=1e-6):
+        """Create a new FeasibleRegion object.
+
+        Keyword Arguments:
+        vertices -- an array of shape (k, 2) with the polygon vertices,
+                    ordered along its boundary
+        epsilon  -- the precision needed for floating points operations.
+                    Defaults to 1E-6
+        """
+
+        self.vertices = np.asarray(vertices, dtype=float).reshape(-1, 2)
+        self.epsilon = epsilon
+        self.history = []
+
+    @property
+    def depth(self):
+        """The number of cuts applied since the initial polygon."""
+        return len(self.history)
+
+    def clip(self, a, b):
+        """Apply the cut a . x <= b and return the new vertices.
+
+        Keyword Arguments:
+        a -- a pair representing the left part of the cut
+        b -- the right part of the cut
+        """
+
+        self.history.append(self.vertices)
+        self.vertices = clip_polygon(self.vertices, a, b, self.epsilon)
+        return self.vertices
+
+    def add_cuts(self, A_cuts, b_cuts):
+        """Apply all the cuts A_cuts x <= b_cuts, one at a time.
+
+        Keyword Arguments:
+        A_cuts -- the A matrix for the cuts
+        b_cuts -- the b matrix for the cuts
+        """
+
+        for a, b in zip(A_cuts, b_cuts):
+            self.clip(a, b)
+        return self.vertices
+
+    def undo(self, n=1):
+        """Remove the last n cuts and return the restored vertices."""
+
+        n = min(n, len(self.history))
+        if n > 0:
+            self.vertices = self.history[-n]
+            del self.history[-n:]
+        return self.vertices
+
+    def undo_to(self, depth):
+        """Restore the polygon as it was when self.depth was depth.
+        Useful to backtrack in a branch-and-bound tree.
+        """
+
+        return self.undo(len(self.history) - depth)
+
+    def reset(self):
+        """Remove all cuts and return the initial vertices."""
+
+        return self.undo_to(0)
+
+
+class RenderCache:
+    """A cache for the HTML rendering of LPVisu objects, keyed by a hash of
+    everything which is drawn. Recent renderings are kept in memory (LRU);
+    with a directory, they are also written on disk so that they survive
+    kernel restarts, with the oldest files evicted above max_bytes.
+    """
+
+    def __init__(self, maxsize=64, directory=None, max_bytes=64 * 2**20):
+        """Create a new RenderCache object.
+
+        Keyword Arguments:
+        maxsize   -- the number of renderings kept in memory.
+                     Defaults to 64
+        directory -- the directory for the on-disk cache, None to disable.
+                     Defaults to the LPVISU_CACHE_DIR environment variable
+        max_bytes -- the maximum size of the on-disk cache.
+                     Defaults to 64 MB
+        """
+
+        if directory is None:
+            directory = os.environ.get("LPVISU_CACHE_DIR")
+        self.maxsize = maxsize
+        self.directory = Path(directory) if directory is not None else None
+        self.max_bytes = max_bytes
+        self.memory = OrderedDict()
+
+    def get(self, key):
+        """Return the HTML rendering stored for key, or None."""
+
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            return self.memory[key]
+
+        if self.directory is None:
+            return None
+
+        path = self.directory / f"{key}.html"
+        try:
+            html = path.read_text()
+            os.utime(path)  # the modification time is used for eviction
+        except OSError:
+            return None
+
+        self.store_memory(key, html)
+        return html
+
+    def put(self, key, html):
+        """Store the HTML rendering for key."""
+
+        self.store_memory(key, html)
+
+        if self.directory is None:
+            return
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{key}.html"
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(html)
+        os.replace(tmp, path)
+        self.evict()
+
+    def store_memory(self, key, html):
+        """Internal function to insert in the in-memory LRU cache."""
+
+        self.memory[key] = html
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.maxsize:
+            self.memory.popitem(last=False)
+
+    def evict(self):
+        """Remove the least recently used files of the on-disk cache until
+        its size goes below max_bytes.
+        """
+
+        files = []
+        for path in self.directory.glob("*.html"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def clear(self):
+        """Empty both the in-memory and the on-disk caches."""
+
+        self.memory.clear()
+        if self.directory is not None:
+            for path in self.directory.glob("*.html"):
+                path.unlink(missing_ok=True)
+
+
 class LPVisu:
     """This class is a simple visualization for simplex resolution for
     linear programs with 2 variables.
     """
 
+    # shared by all instances, set to None to disable caching
+    render_cache = RenderCache()
+
     def __init__(
         self,
         A,
@@ -66,6 +555,7 @@ class LPVisu:
         scale=0.8,
         pivot_scale=1.0,
         variables=("x_1", "x_2"),
+        max_candidates=None,
     ):
         """Create a new LPVisu object.
 
@@ -99,6 +589,9 @@ class LPVisu:
                        Defaults to 1.0.
         pivot_scale -- the scale factor to draw pivot.
                        Defaults to 1.0.
+        max_candidates -- the maximum number of candidate vertices computed
+                       at once when building the polygon (see
+                       feasible_vertices). Defaults to None (no limit).
         """
 
         # attributes
@@ -117,6 +610,7 @@ class LPVisu:
         self.scale = scale
         self.pivot_scale = pivot_scale
         self.variables = variables
+        self.max_candidates = max_candidates
         if A_cuts:
             self.A_cuts = A_cuts
         else:
@@ -152,16 +646,69 @@ class LPVisu:
         self.cuts_lines_patch = []
         self.cuts_circles = []
         self.initial_polygon = np.array(self.polygon)
-        self.initial_path = plt.Polygon(
-            [
-                (self.initial_polygon[index, 0], self.initial_polygon[index, 1])
-                for index in self.convex_hull.vertices
-            ],
-            edgecolor="#54a24b",
-            facecolor="#88d27a",
+        self.region = FeasibleRegion(
+            self.initial_polygon[self.convex_hull], self.epsilon
         )
+        # the cuts given here are drawn with the picture (render_html)
+        if self.A_cuts and self.b_cuts:
+            self.region.add_cuts(self.A_cuts, self.b_cuts)
+        self.initial_path = None
+
+    def render_key(self):
+        """Compute a hash of everything drawn by _repr_html_, used as a key
+        for the render cache.
+        """
+
+        digest = hashlib.sha256()
+        for value in (self.A, self.b, self.c, self.A_cuts, self.b_cuts):
+            array = np.asarray(value, dtype=float)
+            digest.update(repr(array.shape).encode())
+            digest.update(array.tobytes())
+
+        parameters = [
+            self.__class__.__name__,
+            None if self.xk is None else np.asarray(self.xk).tolist(),
+            self.obj,
+            self.integers,
+            self.x1_bounds,
+            self.x2_bounds,
+            self.x1_gui_bounds,
+            self.x2_gui_bounds,
+            self.x1_grid_step,
+            self.x2_grid_step,
+            self.epsilon,
+            self.scale,
+            self.pivot_scale,
+            self.variables,
+        ]
+        digest.update(json.dumps(parameters, default=float).encode())
+
+        return digest.hexdigest()
 
     def _repr_html_(self):
+        cache = self.render_cache
+        if cache is not None:
+            key = self.render_key()
+            html = cache.get(key)
+            if html is not None:
+                return html
+
+        html = self.render_html()
+
+        if cache is not None:
+            cache.put(key, html)
+
+        return html
+
+    def render_html(self):
+        """Render the figure and the constraints as HTML.
+
+        Not to be used outside the class.
+        """
+
+        import matplotlib.pyplot as plt
+        from IPython.core.pylabtools import print_figure
+
         # initialize picture
         self.init_picture()
 
@@ -179,7 +726,12 @@ class LPVisu:
 
         # draw cuts if asked
         if self.A_cuts and self.b_cuts:
-            self.add_cuts(self.A_cuts, self.b_cuts)
+            A_cuts, b_cuts = self.A_cuts, self.b_cuts
+            self.A_cuts, self.b_cuts = [], []
+            self.lines_cuts, self.cuts_lines_patch = [], []
+            self.initial_patch, self.cuts_patch = None, None
+            self.region.reset()
+            self.add_cuts(A_cuts, b_cuts)
 
         plt.close(self.fig)
 
@@ -203,6 +755,32 @@ class LPVisu:
              alt="Plot" />
         """
 
+    def objective_points(self, value):
+        """Compute the two endpoints of the line of the objective function
+        for a specific value, within the GUI bounds.
+
+        Keyword Arguments:
+        value -- the value of the objective function.
+        """
+
+        return (
+            [
+                (
+                    self.x1_gui_bounds[0],
+                    (value - self.x1_gui_bounds[0] * self.c[0]) / self.c[1],
+                ),
+                (
+                    self.x1_gui_bounds[1],
+                    (value - self.x1_gui_bounds[1] * self.c[0]) / self.c[1],
+                ),
+            ]
+            if abs(self.c[1]) > self.epsilon
+            else [
+                (value / self.c[0], self.x2_gui_bounds[0]),
+                (value / self.c[0], self.x2_gui_bounds[1]),
+            ]
+        )
+
     def draw_objective_function(self, value):
         """Draw the objective function for a specific value.
 
@@ -211,25 +789,10 @@ class LPVisu:
                  If None, remove objective function line.
         """
 
-        if value is not None:
-            points = (
-                [
-                    (
-                        self.x1_gui_bounds[0],
-                        (value - self.x1_gui_bounds[0] * self.c[0]) / self.c[1],
-                    ),
-                    (
-                        self.x1_gui_bounds[1],
-                        (value - self.x1_gui_bounds[1] * self.c[0]) / self.c[1],
-                    ),
-                ]
-                if abs(self.c[1]) > self.epsilon
-                else [
-                    (value / self.c[0], self.x2_gui_bounds[0]),
-                    (value / self.c[0], self.x2_gui_bounds[1]),
-                ]
-            )
+        import matplotlib.pyplot as plt
 
+        if value is not None:
+            points = self.objective_points(value)
             self.obj_patch = plt.Polygon(points, color="#e45756", linewidth=2.0)
             self.ax.add_patch(self.obj_patch)
         else:
@@ -244,12 +807,12 @@ class LPVisu:
               If None, remove pivot
         """
 
-        if xk is not None:
+        import matplotlib.pyplot as plt
 
+        if xk is not None:
             self.pivot_patch = plt.Circle(
                 (xk[0], xk[1]), self.pivot_scale * 0.1, fc="r"
             )
-
             self.ax.add_patch(self.pivot_patch)
         else:
             if self.pivot_patch is not None:
@@ -266,6 +829,8 @@ class LPVisu:
         wait_time   -- the time in seconds to wait
         """
 
+        import matplotlib.pyplot as plt
+
         if self.pivot_patch is None:
             self.pivot_patch = plt.Circle((0, 0), 0.1, fc="r")
         else:
@@ -286,30 +851,175 @@ class LPVisu:
         else:
             plt.pause(wait_time)
 
+    def animate_pivots(
+        self,
+        pivots,
+        objectives=None,
+        interval=500,
+        filename=None,
+        writer=None,
+        dpi=None,
+    ):
+        """Animate the path followed by the simplex algorithm through a
+        sequence of pivots, without any GUI event loop.
+
+        The same few artists (path, pivot and objective function) are
+        updated at each frame and redrawn with blitting, so each frame costs
+        the same whatever the length of the path. Pivots may be collected
+        with a linprog callback, e.g.:
+
+            pivots = []
+            linprog(-c, A_ub=A, b_ub=b, callback=lambda r: pivots.append(r.x))
+            LPVisu(A, b, c).animate_pivots(pivots, filename="simplex.mp4")
+
+        Returns the matplotlib FuncAnimation object (use to_html5_video()
+        to display it in a notebook).
+
+        Keyword Arguments:
+        pivots     -- a sequence of pairs representing the successive pivots
+        objectives -- the values of the objective function at each pivot.
+                      Defaults to None (computed from c)
+        interval   -- the delay between frames in milliseconds
+        filename   -- if not None, the animation is written in one pass into
+                      this file (e.g. an mp4 file)
+        writer     -- the matplotlib writer used for the file (e.g. "ffmpeg").
+                      Defaults to None (matplotlib default writer)
+        dpi        -- the resolution of the file. Defaults to None
+        """
+
+        import matplotlib.pyplot as plt
+        from matplotlib import animation
+
+        pivots = np.asarray(pivots, dtype=float).reshape(-1, 2)
+        if objectives is None:
+            objectives = pivots @ np.asarray(self.c, dtype=float)
+
+        self.init_picture()
+
+        (path,) = self.ax.plot([], [], color="#e45756", linewidth=3)
+        (objective,) = self.ax.plot([], [], color="#e45756", linewidth=2.0)
+        self.pivot_patch = plt.Circle(
+            (pivots[0, 0], pivots[0, 1]), self.pivot_scale * 0.1, fc="r"
+        )
+        self.ax.add_patch(self.pivot_patch)
+        artists = [path, objective, self.pivot_patch]
+
+        def init():
+            path.set_data([], [])
+            objective.set_data([], [])
+            return artists
+
+        def update(i):
+            path.set_data(pivots[: i + 1, 0], pivots[: i + 1, 1])
+            objective.set_data(*zip(*self.objective_points(objectives[i])))
+            self.pivot_patch.center = (pivots[i, 0], pivots[i, 1])
+            return artists
+
+        anim = animation.FuncAnimation(
+            self.fig,
+            update,
+            frames=len(pivots),
+            init_func=init,
+            interval=interval,
+            blit=True,
+        )
+        plt.close(self.fig)
+
+        if filename is not None:
+            anim.save(filename, writer=writer, dpi=dpi)
+
+        return anim
+
     def add_cuts(self, A_cuts, b_cuts):
         """A method to add cuts.
 
+        The current polygon is clipped by each new cut, so the cost only
+        depends on the number of new cuts and of vertices of the polygon.
+        Cuts added before the picture is drawn are only recorded.
+
         Keyword Arguments:
         A_cuts -- the A matrix for the cuts
         b_cuts -- the b matrix for the cuts
         """
 
-        if self.cuts_patch is None:
-            polygon, convex_hull = self.compute_polygon_convex_hull(
-                self.A, self.b, self.lines
-            )
+        import matplotlib.pyplot as plt
 
-            draw_polygon = np.array(polygon)
+        if self.ax is None:
+            # no picture yet: the cuts are drawn when the object is displayed
+            self.A_cuts = self.A_cuts + list(A_cuts)
+            self.b_cuts = self.b_cuts + list(b_cuts)
+            self.region.add_cuts(A_cuts, b_cuts)
+            return
+
+        if self.cuts_patch is None:
             self.initial_patch = plt.Polygon(
-                [
-                    (draw_polygon[index, 0], draw_polygon[index, 1])
-                    for index in convex_hull.vertices
-                ],
+                self.initial_polygon[self.convex_hull],
                 edgecolor="#e45756",
                 facecolor="#ff9d98",
             )
             self.ax.add_patch(self.initial_patch)
 
+        self.A_cuts = self.A_cuts + list(A_cuts)
+        self.b_cuts = self.b_cuts + list(b_cuts)
+        self.region.add_cuts(A_cuts, b_cuts)
+
+        new_lines = self.compute_lines(list(A_cuts), list(b_cuts), bounds=False)
+        self.lines_cuts = self.lines_cuts + new_lines
+
+        for line in new_lines:
+            line_patch = plt.Polygon(
+                line,
+                color="#e45756",
+                linewidth=2,
+                linestyle="dashed",
+                closed=False,
+            )
+            self.ax.add_patch(line_patch)
+            self.cuts_lines_patch.append(line_patch)
+
+        self.draw_cuts_polygon()
+
+    def undo_cuts(self, n=1):
+        """Remove the last n cuts, restoring the previous polygon without
+        recomputing it.
+
+        Keyword Arguments:
+        n -- the number of cuts to remove (defaults: 1)
+        """
+
+        n = min(n, len(self.A_cuts))
+        if n == 0:
+            return
+
+        if n == len(self.A_cuts):
+            return self.reset_cuts()
+
+        self.region.undo(n)
+        if self.ax is None:
+            # no picture yet: only the recorded cuts are removed
+            del self.A_cuts[-n:]
+            del self.b_cuts[-n:]
+            del self.lines_cuts[-n:]
+            return
+
+        for p in self.cuts_lines_patch[-n:]:
+            p.remove()
+
+        del self.A_cuts[-n:]
+        del self.b_cuts[-n:]
+        del self.lines_cuts[-n:]
+        del self.cuts_lines_patch[-n:]
+
+        self.draw_cuts_polygon()
+
+    def draw_cuts_polygon(self):
+        """Draw the current polygon after the cuts with its integer points.
+
+        Not to be used outside the class.
+        """
+
+        import matplotlib.pyplot as plt
+
         if self.cuts_patch is not None:
             self.cuts_patch.remove()
 
@@ -318,45 +1028,28 @@ class LPVisu:
 
         self.cuts_circles = []
 
-        self.A_cuts = self.A_cuts + A_cuts
-        self.b_cuts = self.b_cuts + b_cuts
-        self.lines_cuts = self.compute_lines(
-            self.A_cuts, self.b_cuts, bounds=False
-        )
-
-        polygon_cuts, convex_hull_cuts = self.compute_polygon_convex_hull(
-            self.A + self.A_cuts,
-            self.b + self.b_cuts,
-            self.lines + self.lines_cuts,
-        )
-
-        draw_polygon = np.array(polygon_cuts)
+        draw_polygon = self.region.vertices
         self.cuts_patch = plt.Polygon(
-            [
-                (draw_polygon[index, 0], draw_polygon[index, 1])
-                for index in convex_hull_cuts.vertices
-            ],
+            draw_polygon,
             edgecolor="#54a24b",
             facecolor="#88d27a",
         )
         self.ax.add_patch(self.cuts_patch)
 
-        for line in self.lines_cuts:
-            line_patch = plt.Polygon(
-                line,
-                color="#e45756",
-                linewidth=2,
-                linestyle="dashed",
-                closed=False,
-            )
-            self.ax.add_patch(line_patch)
-            self.cuts_lines_patch.append(line_patch)
-
-        self.draw_integers(draw_polygon, self.cuts_patch)
+        if len(draw_polygon):
+            self.draw_integers(draw_polygon, self.cuts_patch)
 
     def reset_cuts(self):
         """Remove all cuts."""
 
+        self.A_cuts = []
+        self.b_cuts = []
+        self.lines_cuts = []
+        self.region.reset()
+        if self.ax is None:
+            # no picture yet: only the recorded cuts are removed
+            return
+
         if self.initial_patch is not None:
             self.initial_patch.remove()
             self.initial_patch = None
@@ -367,9 +1060,11 @@ class LPVisu:
             for p in self.cuts_lines_patch:
                 p.remove()
 
-            self.A_cuts = []
-            self.b_cuts = []
-            self.lines_cuts = []
+            for c in self.cuts_circles:
+                c.remove()
+
+            self.cuts_lines_patch = []
+            self.cuts_circles = []
             self.cuts_patch = None
 
             self.draw_integers(self.initial_polygon, self.initial_path)
@@ -389,73 +1084,29 @@ class LPVisu:
         Not to be used outside the class.
         """
 
-        x1_bounds = (
+        x1_gui_bounds = (
             (-1000, 1000) if self.x1_gui_bounds is None else self.x1_gui_bounds
         )
-        x2_bounds = (
+        x2_gui_bounds = (
             (-1000, 1000) if self.x2_gui_bounds is None else self.x2_gui_bounds
         )
 
-        lines = [
-            [
-                (
-                    x1_bounds[0],
-                    (b[A.index(line)] - x1_bounds[0] * line[0]) / line[1],
-                ),
-                (
-                    x2_bounds[1],
-                    (b[A.index(line)] - x2_bounds[1] * line[0]) / line[1],
-                ),
-            ]
-            if line[1] != 0
-            else [
-                (b[A.index(line)] / line[0], x2_bounds[0]),
-                (b[A.index(line)] / line[0], x2_bounds[1]),
-            ]
-            for line in A
-        ]
-
-        if bounds:
-            lines.append(
-                [
-                    (
-                        self.x1_bounds[0]
-                        if self.x1_bounds[0] is not None
-                        else x1_bounds[0],
-                        0,
-                    ),
-                    (
-                        self.x1_bounds[1]
-                        if self.x1_bounds[1] is not None
-                        else x1_bounds[1],
-                        0,
-                    ),
-                ]
-            )
-
-            lines.append(
-                [
-                    (
-                        0,
-                        self.x2_bounds[0]
-                        if self.x2_bounds[0] is not None
-                        else x2_bounds[0],
-                    ),
-                    (
-                        0,
-                        self.x2_bounds[1]
-                        if self.x2_bounds[1] is not None
-                        else x2_bounds[1],
-                    ),
-                ]
-            )
+        lines = constraint_lines(
+            A,
+            b,
+            x1_gui_bounds,
+            x2_gui_bounds,
+            self.x1_bounds if bounds else None,
+            self.x2_bounds if bounds else None,
+        )
 
-        return lines
+        return list(lines)
 
     def compute_polygon_convex_hull(self, A, b, lines):
         """Compute the polygon of admissible solutions and the associated
-        convex hull. Returns a pair with first element being the list
-        of points of the polygon and second element the convex hull.
+        convex hull. Returns a pair with first element being the array
+        of points of the polygon and second element the indices of the
+        vertices of the convex hull.
 
         This method is parametrized to be possibly used with subclasses.
 
@@ -467,45 +1118,17 @@ class LPVisu:
         Not to be used outside the class.
         """
 
-        # compute all intersections...
-        intersections = []
-        for i in range(len(lines)):
-            for j in range(i + 1, len(lines)):
-                try:
-                    intersections.append(
-                        intersect(
-                            lines[i][0], lines[i][1], lines[j][0], lines[j][1]
-                        )
-                    )
-                except Exception:
-                    pass
-
-        # check which intersection is a vertex of the polygon
-        # and build the polygon
-        A_arr = np.array(A)
-        polygon = []
-
-        for p in intersections:
-            if self.x1_bounds[0] is not None:
-                if p[0] < self.x1_bounds[0]:
-                    continue
-            if self.x1_bounds[1] is not None:
-                if p[0] > self.x1_bounds[0]:
-                    continue
-            if self.x2_bounds[0] is not None:
-                if p[1] < self.x2_bounds[0]:
-                    continue
-            if self.x2_bounds[1] is not None:
-                if p[1] > self.x2_bounds[0]:
-                    continue
-            if False in (np.dot(A_arr, p) - b <= self.epsilon):
-                continue
-            polygon.append(p)
-
-        # compute convex hull
-        convex_hull = ConvexHull(polygon)
+        polygon = feasible_vertices(
+            lines,
+            A,
+            b,
+            x1_bounds=self.x1_bounds,
+            x2_bounds=self.x2_bounds,
+            epsilon=self.epsilon,
+            max_candidates=self.max_candidates,
+        )
 
-        return polygon, convex_hull
+        return polygon, convex_hull(polygon)
 
     def draw_equations_and_polygon(self, ax):
         """Draw equations of the linear programming problems and the
@@ -525,8 +1148,8 @@ class LPVisu:
         # draw polygon
         draw_polygon = np.array(self.polygon)
         self.ax.fill(
-            draw_polygon[self.convex_hull.vertices, 0],
-            draw_polygon[self.convex_hull.vertices, 1],
+            draw_polygon[self.convex_hull, 0],
+            draw_polygon[self.convex_hull, 1],
             facecolor="#88d27a",
             edgecolor="#54a24b",
             linewidth=4,
@@ -535,23 +1158,29 @@ class LPVisu:
     def draw_integers(self, polygon, patch):
         """Internal function to draw integer points inside polygon
 
+        All points are drawn as one single collection.
+
         Keyword Arguments:
         polygon -- the polygon into which draw integer points
         patch   -- the patch corresponding to the polygon
         """
 
-        x1_min = min([p[0] for p in polygon])
-        x1_max = max([p[0] for p in polygon])
-
-        x2_min = min([p[1] for p in polygon])
-        x2_max = max([p[1] for p in polygon])
-
-        for x in range(int(x1_min), int(x1_max) + 1):
-            for y in range(int(x2_min), int(x2_max) + 1):
-                if patch._path.contains_point((x, y), radius=self.epsilon):
-                    circle = plt.Circle((x, y), 0.075, facecolor="#4c78a8")
-                    self.cuts_circles.append(circle)
-                    self.ax.add_patch(circle)
+        # the patch holds the ordered vertices of the polygon
+        points = lattice_points(patch.get_xy()[:-1], self.epsilon)
+        if len(points) == 0:
+            return
+
+        # one collection for all points, with a radius of 0.075 (data units)
+        x1_min, x1_max = self.ax.get_xlim()
+        unit = self.ax.bbox.width / (x1_max - x1_min) * 72 / self.fig.dpi
+        circles = self.ax.scatter(
+            points[:, 0],
+            points[:, 1],
+            s=(2 * 0.075 * unit) ** 2,
+            facecolor="#4c78a8",
+            zorder=3,
+        )
+        self.cuts_circles.append(circles)
 
     def init_picture(self):
         """Initialize the picture and draw the equations lines and polygon.
@@ -559,6 +1188,8 @@ class LPVisu:
         Not to be used outside the class.
         """
 
+        import matplotlib.pyplot as plt
+
         # create figure
         self.fig = plt.figure()
 
@@ -602,3 +1233,10 @@ class LPVisu:
 
         # draw equations and polygon
         self.draw_equations_and_polygon(self.ax)
+
+        if self.initial_path is None:
+            self.initial_path = plt.Polygon(
+                self.initial_polygon[self.convex_hull],
+                edgecolor="#54a24b",
+                facecolor="#88d27a",
+            )
@@ -0,0 +1,342 @@
+"""Simulated annealing on K independent chains at once.
+
+All chains are stored as one (K, D) array and advanced together: one call
+to a batched objective function (e.g. rastrigin_batch, boulders(n).batch or
+city_placement(distances).batch from the bestiary) evaluates all candidate
+moves of an iteration.
+
+Neighbourhoods and cooling schedules are small picklable objects, so that
+new ones are easy to plug in:
+
+    sa = SimulatedAnnealing(
+        rastrigin_batch, np.random.uniform(-5, 5, (64, 10)),
+        neighbourhood=Gaussian(0.5), cooling=Geometric(0.999),
+    )
+    res = sa.run(5000)
+    res.x, res.fun, res.trace_best, res.trace_acceptance
+
+With tempering=True, the chains form a ladder of temperatures between
+T0 and T_min, and neighbouring replicas regularly try to swap their states
+(parallel tempering). The ladder stays fixed unless a cooling schedule is
+given.
+"""
+
+from typing import Callable, Optional
+
+import numpy as np
+from numpy.typing import NDArray
+from scipy.optimize import OptimizeResult
+
+from checkpoint import Stateful
+
+__all__ = [
+    "SimulatedAnnealing",
+    "Gaussian",
+    "Cauchy",
+    "Coordinate",
+    "Geometric",
+    "Logarithmic",
+    "Adaptive",
+    "Constant",
+]
+
+
+# Neighbourhoods: called with the current states (K, D), the random
+# generator and the current temperatures (K,); return new candidate states.
+
+
+class Gaussian:
+    """Move all coordinates with a normal noise of standard deviation scale,
+    optionally scaled down with the temperature (scale * sqrt(T / T0))."""
+
+    def __init__(self, scale: float = 0.1, anneal: bool = False) -> None:
+        self.scale = scale
+        self.anneal = anneal
+
+    def __call__(
+        self, X: NDArray, rng: np.random.Generator, T: NDArray, T0: float
+    ) -> NDArray:
+        scale = self.scale
+        if self.anneal:
+            scale = scale * np.sqrt(T / T0)[:, None]
+        return X + scale * rng.standard_normal(X.shape, dtype=X.dtype)
+
+
+class Cauchy:
+    """Move all coordinates with a Cauchy noise (fast annealing): long jumps
+    are more frequent than with a Gaussian noise."""
+
+    def __init__(self, scale: float = 0.1) -> None:
+        self.scale = scale
+
+    def __call__(
+        self, X: NDArray, rng: np.random.Generator, T: NDArray, T0: float
+    ) -> NDArray:
+        return X + self.scale * rng.standard_cauchy(X.shape).astype(X.dtype)
+
+
+class Coordinate:
+    """Move one random coordinate per chain, uniformly in [-scale, scale]."""
+
+    def __init__(self, scale: float = 0.5) -> None:
+        self.scale = scale
+
+    def __call__(
+        self, X: NDArray, rng: np.random.Generator, T: NDArray, T0: float
+    ) -> NDArray:
+        K, D = X.shape
+        Y = X.copy()
+        j = rng.integers(D, size=K)
+        Y[np.arange(K), j] += rng.uniform(-self.scale, self.scale, K)
+        return Y
+
+
+# Cooling schedules: called with the initial temperature, the current
+# temperatures (K,), the iteration number and the standard deviation of the
+# energy of each chain (K,); return the new temperatures.
+
+
+class Geometric:
+    """T_{k+1} = alpha T_k"""
+
+    def __init__(self, alpha: float = 0.99) -> None:
+        self.alpha = alpha
+
+    def __call__(
+        self, T0: float, T: NDArray, step: int, sigma: NDArray
+    ) -> NDArray:
+        return T * self.alpha
+
+
+class Logarithmic:
+    """T_k = T0 log(2) / log(k + 2), the classical schedule with convergence
+    guarantees (and a very slow decrease)."""
+
+    def __call__(
+        self, T0: float, T: NDArray, step: int, sigma: NDArray
+    ) -> NDArray:
+        return T * np.log(step + 1) / np.log(step + 2)
+
+
+class Adaptive:
+    """Aarts and van Laarhoven: the temperature decreases slowly where the
+    energy still fluctuates a lot (large sigma), faster elsewhere.
+    T_{k+1} = T_k / (1 + T_k log(1 + delta) / (3 sigma_k))"""
+
+    def __init__(self, delta: float = 0.1) -> None:
+        self.delta = delta
+
+    def __call__(
+        self, T0: float, T: NDArray, step: int, sigma: NDArray
+    ) -> NDArray:
+        return T / (1 + T * np.log1p(self.delta) / (3 * sigma + 1e-12))
+
+
+class Constant:
+    """T_{k+1} = T_k: no cooling (the default with parallel tempering, where
+    the ladder of temperatures stays fixed)."""
+
+    def __call__(
+        self, T0: float, T: NDArray, step: int, sigma: NDArray
+    ) -> NDArray:
+        return T
+
+
+class SimulatedAnnealing(Stateful):
+    # the state saved in checkpoints (see checkpoint.Stateful)
+    state_keys = (
+        "X",
+        "energy",
+        "T",
+        "nfev",
+        "nit",
+        "best_X",
+        "best_energy",
+        "mean",
+        "variance",
+        "accepted",
+        "rate",
+        "swaps",
+        "trace_best",
+        "trace_acceptance",
+    )
+
+    def __init__(
+        self,
+        fun: Callable[[NDArray], NDArray],
+        x0: NDArray,
+        neighbourhood: Optional[Callable] = None,
+        cooling: Optional[Callable] = None,
+        T0: float = 1.0,
+        bounds: Optional[tuple] = None,
+        tempering: bool = False,
+        T_min: float = 1e-3,
+        swap_every: int = 10,
+        memory: float = 0.99,
+        seed: Optional[int] = None,
+    ) -> None:
+        """Create a new SimulatedAnnealing object.
+
+        Keyword Arguments:
+        fun           -- a batched objective function: (K, D) -> (K,)
+        x0            -- the initial states of the K chains, shape (K, D)
+        neighbourhood -- generates candidate moves. Defaults to Gaussian()
+        cooling       -- the cooling schedule. Defaults to Geometric(), or
+                         Constant() with tempering (a fixed ladder): another
+                         schedule cools the whole ladder at once
+        T0            -- the initial temperature (the highest one of the
+                         ladder with tempering)
+        bounds        -- a pair (lower, upper) of scalars or arrays of
+                         shape (D,): moves are clipped in the box
+        tempering     -- use a geometric ladder of temperatures from T0
+                         down to T_min and swap neighbouring replicas
+        T_min         -- the lowest temperature of the ladder
+        swap_every    -- the number of iterations between swap attempts
+        memory        -- the forgetting factor of the energy statistics
+                         (acceptance rates and sigma for Adaptive cooling)
+        seed          -- the seed of the random generator
+        """
+
+        self.fun = fun
+        self.X = np.array(x0, dtype=float, ndmin=2)
+        self.neighbourhood = neighbourhood or Gaussian()
+        if cooling is None:
+            cooling = Constant() if tempering else Geometric()
+        self.cooling = cooling
+        self.T0 = T0
+        self.bounds = bounds
+        self.tempering = tempering
+        self.swap_every = swap_every
+        self.memory = memory
+        self.rng = np.random.default_rng(seed)
+
+        K = self.X.shape[0]
+        if tempering:
+            self.T = T0 * (T_min / T0) ** np.linspace(0, 1, K)
+        else:
+            self.T = np.full(K, float(T0))
+
+        self.clip(self.X)
+        self.energy = np.asarray(fun(self.X), dtype=float)
+        self.nfev = K
+        self.nit = 0
+
+        self.best_X = self.X.copy()
+        self.best_energy = self.energy.copy()
+        self.mean = self.energy.copy()
+        self.variance = np.zeros(K)
+        self.accepted = np.zeros(K, dtype=int)
+        self.rate = np.ones(K)
+        self.swaps = np.zeros(2, dtype=int)  # accepted, attempted
+
+        self.trace_best = [self.best_energy.min()]
+        self.trace_acceptance = [1.0]
+
+    @property
+    def x(self) -> NDArray:
+        return self.best_X[np.argmin(self.best_energy)]
+
+    @property
+    def fval(self) -> float:
+        return float(self.best_energy.min())
+
+    def clip(self, X: NDArray) -> NDArray:
+        if self.bounds is not None:
+            np.clip(X, self.bounds[0], self.bounds[1], out=X)
+        return X
+
+    def step(self) -> None:
+        """Propose one move per chain, accept or reject all of them with the
+        Metropolis criterion, then cool down."""
+
+        Y = self.clip(self.neighbourhood(self.X, self.rng, self.T, self.T0))
+        energy = np.asarray(self.fun(Y), dtype=float)
+        self.nfev += len(energy)
+
+        delta = energy - self.energy
+        with np.errstate(over="ignore"):
+            accept = (delta <= 0) | (
+                self.rng.random(len(delta)) < np.exp(-delta / self.T)
+            )
+        self.X[accept] = Y[accept]
+        self.energy[accept] = energy[accept]
+        self.accepted += accept
+
+        better = self.energy < self.best_energy
+        self.best_X[better] = self.X[better]
+        self.best_energy[better] = self.energy[better]
+
+        # exponential moving statistics of each chain
+        m = self.memory
+        self.rate = m * self.rate + (1 - m) * accept
+        diff = self.energy - self.mean
+        self.mean += (1 - m) * diff
+        self.variance = m * (self.variance + (1 - m) * diff ** 2)
+
+        self.nit += 1
+        if self.tempering and self.nit % self.swap_every == 0:
+            self.swap()
+
+        self.T = self.cooling(
+            self.T0, self.T, self.nit, np.sqrt(self.variance)
+        )
+
+        self.trace_best.append(self.best_energy.min())
+        self.trace_acceptance.append(accept.mean())
+
+    def swap(self) -> None:
+        """Try to swap the states of neighbouring replicas, alternating even
+        and odd pairs, with probability min(1, exp((E_i - E_j)(1/T_i -
+        1/T_j))). Temperatures stay in place, states move along the ladder.
+        """
+
+        first = np.arange((self.nit // self.swap_every) % 2, len(self.T) - 1, 2)
+        second = first + 1
+        E_i, E_j = self.energy[first], self.energy[second]
+        log_ratio = (E_i - E_j) * (1 / self.T[first] - 1 / self.T[second])
+        with np.errstate(over="ignore"):
+            accept = self.rng.random(len(first)) < np.exp(
+                np.minimum(log_ratio, 0)
+            )
+        i, j = first[accept], second[accept]
+        self.X[np.r_[i, j]] = self.X[np.r_[j, i]]
+        self.energy[np.r_[i, j]] = self.energy[np.r_[j, i]]
+        self.swaps += accept.sum(), len(accept)
+
+    def run(
+        self,
+        steps: int = 1000,
+        target: Optional[float] = None,
+        callback: Optional[Callable] = None,
+    ) -> OptimizeResult:
+        """Run the chains and return an OptimizeResult with the best state x
+        and energy fun over all chains, nit, nfev, the acceptance rate of
+        each chain, the swap acceptance rate (tempering), the final
+        temperatures and traces of the best energy so far and of the
+        acceptance rate at each iteration.
+
+        Keyword Arguments:
+        steps    -- the number of iterations
+        target   -- stop when the best energy is below target
+        callback -- a function called with this object after each iteration
+        """
+
+        for _ in range(steps):
+            self.step()
+            if callback is not None:
+                callback(self)
+            if target is not None and self.fval <= target:
+                break
+
+        return OptimizeResult(
+            x=self.x,
+            fun=self.fval,
+            nit=self.nit,
+            nfev=self.nfev,
+            acceptance=self.accepted / max(self.nit, 1),
+            recent_acceptance=self.rate.copy(),
+            swap_acceptance=self.swaps[0] / max(self.swaps[1], 1),
+            temperature=self.T.copy(),
+            trace_best=np.array(self.trace_best),
+            trace_acceptance=np.array(self.trace_acceptance),
+        )
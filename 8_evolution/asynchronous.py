@@ -0,0 +1,464 @@
+"""Asynchronous evaluation of slow objective functions.
+
+When one evaluation takes seconds (a MILP solved as a fitness function, a
+simulation), evaluating a whole population in order leaves cores idle
+while the slowest individual finishes. An Evaluator submits solutions one
+by one to a pool of processes (or threads) through asyncio, bounds the
+number of evaluations in flight and records the latency of each of them.
+
+Steady-state variants of the genetic algorithm and of CMA-ES integrate the
+results as they arrive and propose a new candidate as soon as a slot is
+free. Both are coroutines: await them in a notebook, or use asyncio.run in
+a script.
+
+    res = asyncio.run(
+        steady_state_ga(slow_rastrigin, np.random.uniform(-5, 5, (32, 10)),
+                        evaluations=2000, max_workers=4)
+    )
+    res.x, res.fun, res.metrics
+
+Candidates which become stale (sampled from a CMA-ES distribution which
+has been updated since, or proposed more than max_age insertions ago in
+the genetic algorithm) are cancelled if they have not started yet, and
+their result is discarded otherwise.
+
+The objective function takes one solution x of shape (D,) and returns a
+float; with processes, it must be picklable (defined at the top level of a
+module, or a functools.partial of such a function).
+"""
+
+import asyncio
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Union
+
+import numpy as np
+from numpy.typing import NDArray
+from scipy.optimize import OptimizeResult
+
+from cmaes import CMAES
+
+__all__ = ["Evaluator", "steady_state_ga", "steady_state_cmaes"]
+
+
+def timed(fun: Callable, x: NDArray) -> tuple:
+    """Evaluate fun(x) in a worker, with the duration of the evaluation."""
+
+    start = time.perf_counter()
+    value = float(fun(x))
+    return value, time.perf_counter() - start
+
+
+class Evaluator:
+    def __init__(
+        self,
+        fun: Callable[[NDArray], float],
+        executor: Union[str, Executor] = "process",
+        max_workers: Optional[int] = None,
+        max_in_flight: Optional[int] = None,
+    ) -> None:
+        """Create a new Evaluator object, to be used as an asynchronous
+        context manager:
+
+            async with Evaluator(fun, "process", 4) as evaluator:
+                await evaluator.submit(x, tag)
+                for x, f, tag in await evaluator.completed():
+                    ...
+
+        Keyword Arguments:
+        fun           -- the objective function: x -> float
+        executor      -- "process", "thread" or an existing Executor (which
+                         is not shut down on exit)
+        max_workers   -- the number of workers. Defaults to os.cpu_count()
+        max_in_flight -- the maximum number of evaluations submitted and not
+                         completed yet. Defaults to 2 * max_workers
+        """
+
+        if isinstance(executor, str) and executor not in ("process", "thread"):
+            raise ValueError(f"unknown executor {executor!r}")
+
+        self.fun = fun
+        self.executor = executor
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_in_flight = max_in_flight or 2 * self.max_workers
+
+        # asyncio future -> (concurrent future, x, tag, submission time)
+        self.pending = {}
+        self.stale = set()
+        self.latency = []  # from submission to completion
+        self.duration = []  # of the evaluation only
+        self.busy = 0.0  # time spent by workers, discarded results included
+        self.cancelled = 0
+        self.discarded = 0
+        self.start = self.end = None
+
+    async def __aenter__(self) -> "Evaluator":
+        self.owned = isinstance(self.executor, str)
+        if self.executor == "process":
+            self.executor = ProcessPoolExecutor(self.max_workers)
+        elif self.executor == "thread":
+            self.executor = ThreadPoolExecutor(self.max_workers)
+        self.slots = asyncio.Semaphore(self.max_in_flight)
+        self.start = time.perf_counter()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self.end = time.perf_counter()
+        self.cancel()
+        if self.owned:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = "process"
+
+    def full(self) -> bool:
+        return self.slots.locked()
+
+    @property
+    def nfev(self) -> int:
+        """The number of evaluations performed, discarded ones included."""
+
+        return len(self.latency) + self.discarded
+
+    async def submit(self, x: NDArray, tag=None) -> asyncio.Future:
+        """Submit an evaluation of x, waiting for a free slot if the maximum
+        number of evaluations is in flight. The tag is returned with the
+        result and passed to the stale predicate of cancel."""
+
+        await self.slots.acquire()
+        job = self.executor.submit(timed, self.fun, x)
+        future = asyncio.wrap_future(job)
+        future.add_done_callback(lambda _: self.slots.release())
+        self.pending[future] = (job, x, tag, time.perf_counter())
+        return future
+
+    async def completed(self) -> list:
+        """Wait for at least one evaluation to complete, and return the list
+        of completed evaluations as (x, f, tag), except discarded ones."""
+
+        if not self.pending:
+            return []
+        done, _ = await asyncio.wait(
+            self.pending, return_when=asyncio.FIRST_COMPLETED
+        )
+        now = time.perf_counter()
+        results = []
+        for future in done:
+            job, x, tag, submitted = self.pending.pop(future)
+            if future.cancelled():
+                continue
+            value, duration = future.result()
+            self.busy += duration
+            if future in self.stale:
+                self.stale.discard(future)
+                self.discarded += 1
+                continue
+            self.latency.append(now - submitted)
+            self.duration.append(duration)
+            results.append((x, value, tag))
+        return results
+
+    def cancel(self, stale: Optional[Callable] = None) -> int:
+        """Cancel the pending evaluations whose tag satisfies stale (all of
+        them if stale is None). Evaluations which have already started
+        cannot be stopped: their result will be discarded. Returns the
+        number of evaluations cancelled before they started."""
+
+        count = 0
+        for future, (job, x, tag, submitted) in list(self.pending.items()):
+            if future in self.stale or (stale is not None and not stale(tag)):
+                continue
+            if job.cancel():
+                count += 1
+                self.cancelled += 1
+                del self.pending[future]
+            else:
+                self.stale.add(future)
+        return count
+
+    def metrics(self) -> dict:
+        """Latency statistics (from submission to completion, in seconds),
+        evaluation times, time spent waiting for a worker, throughput
+        (evaluations per second) and utilisation of the workers."""
+
+        end = self.end if self.end is not None else time.perf_counter()
+        elapsed = end - self.start
+        latency = np.array(self.latency)
+        duration = np.array(self.duration)
+        if len(latency) == 0:
+            latency = duration = np.zeros(1)
+        return dict(
+            evaluations=len(self.latency),
+            cancelled=self.cancelled,
+            discarded=self.discarded,
+            elapsed=elapsed,
+            throughput=len(self.latency) / elapsed,
+            utilisation=self.busy / (elapsed * self.max_workers),
+            latency_mean=latency.mean(),
+            latency_median=np.median(latency),
+            latency_p95=np.percentile(latency, 95),
+            latency_max=latency.max(),
+            duration_mean=duration.mean(),
+            waiting_mean=(latency - duration).mean(),
+        )
+
+
+async def steady_state_ga(
+    fun: Callable[[NDArray], float],
+    x0: NDArray,
+    evaluations: int = 1000,
+    tournament_size: int = 2,
+    crossover_rate: float = 0.9,
+    mutation_rate: float = 0.1,
+    mutation_scale: float = 0.1,
+    bounds: Optional[tuple] = None,
+    max_age: Optional[int] = None,
+    target: Optional[float] = None,
+    executor: Union[str, Executor] = "process",
+    max_workers: Optional[int] = None,
+    max_in_flight: Optional[int] = None,
+    seed: Optional[int] = None,
+) -> OptimizeResult:
+    """A steady-state genetic algorithm: each child is bred from the
+    current population (tournament selection, uniform crossover, Gaussian
+    mutation) as soon as a slot is free, and replaces the worst individual
+    when it is better. Returns an OptimizeResult with x, fun, nfev (discarded
+    evaluations included), nit (the number of insertions), history
+    (evaluations, time and best value at each improvement) and metrics (see
+    Evaluator.metrics).
+
+    Keyword Arguments:
+    fun             -- the objective function to minimize: x -> float
+    x0              -- the initial population, shape (N, D)
+    evaluations     -- the evaluation budget (initial population included)
+    tournament_size -- the number of individuals in each tournament
+    crossover_rate  -- the probability for the parents to be crossed
+    mutation_rate   -- the probability for each gene to be mutated
+    mutation_scale  -- the standard deviation of the mutation noise
+    bounds          -- a pair (lower, upper): children are clipped in the box
+    max_age         -- cancel children proposed more than max_age insertions
+                       ago. Defaults to None (never)
+    target          -- stop when the best value is below target
+    executor        -- see Evaluator
+    max_workers     -- see Evaluator
+    max_in_flight   -- see Evaluator
+    seed            -- the seed of the random generator
+    """
+
+    rng = np.random.default_rng(seed)
+    population = np.array(x0, dtype=float, ndmin=2)
+    if bounds is not None:
+        np.clip(population, bounds[0], bounds[1], out=population)
+    N, D = population.shape
+    fitness = np.full(N, np.inf)
+    insertions, submitted, nfev = 0, 0, 0
+    history = []
+
+    def breed():
+        draws = rng.integers(N, size=(2, tournament_size))
+        parents = population[draws[np.arange(2), fitness[draws].argmin(1)]]
+        child = parents[0].copy()
+        if rng.random() < crossover_rate:
+            mask = rng.random(D) < 0.5
+            child[mask] = parents[1, mask]
+        mutate = rng.random(D) < mutation_rate
+        child[mutate] += mutation_scale * rng.standard_normal(mutate.sum())
+        if bounds is not None:
+            np.clip(child, bounds[0], bounds[1], out=child)
+        return child
+
+    def stale(tag):
+        return tag is not None and insertions - tag > max_age
+
+    async with Evaluator(fun, executor, max_workers, max_in_flight) as pool:
+
+        def record():
+            best = fitness.min()
+            if not history or best < history[-1][2]:
+                history.append((nfev, time.perf_counter() - pool.start, best))
+
+        # the initial population, evaluated concurrently
+        while nfev < N:
+            while submitted < N and not pool.full():
+                await pool.submit(population[submitted], submitted)
+                submitted += 1
+            results = await pool.completed()
+            nfev = pool.nfev - len(results)
+            for x, f, i in results:
+                fitness[i] = f
+                nfev += 1
+        record()
+
+        # steady state: the tag of a child is the number of insertions
+        while nfev < evaluations:
+            if target is not None and fitness.min() <= target:
+                break
+            while not pool.full() and submitted < evaluations:
+                await pool.submit(breed(), insertions)
+                submitted += 1
+            results = await pool.completed()
+            # results discarded by the pool count in the budget
+            nfev = pool.nfev - len(results)
+            for child, f, _ in results:
+                nfev += 1
+                worst = fitness.argmax()
+                if f < fitness[worst]:
+                    population[worst] = child
+                    fitness[worst] = f
+                    insertions += 1
+                    record()
+            if max_age is not None:
+                submitted -= pool.cancel(stale)
+            if not pool.pending and submitted >= evaluations:
+                break
+
+    best = fitness.argmin()
+    return OptimizeResult(
+        x=population[best].copy(),
+        fun=float(fitness[best]),
+        nfev=nfev,
+        nit=insertions,
+        history=np.array(history),
+        metrics=pool.metrics(),
+    )
+
+
+async def steady_state_cmaes(
+    fun: Callable[[NDArray], float],
+    x0: NDArray,
+    sigma0: float = 1.0,
+    evaluations: int = 1000,
+    popsize: Optional[int] = None,
+    bounds: Optional[tuple] = None,
+    max_age: int = 1,
+    target: Optional[float] = None,
+    executor: Union[str, Executor] = "process",
+    max_workers: Optional[int] = None,
+    max_in_flight: Optional[int] = None,
+    seed: Optional[int] = None,
+) -> OptimizeResult:
+    """CMA-ES with asynchronous evaluations: samples are drawn from the
+    current distribution whenever a slot is free, and the distribution is
+    updated as soon as popsize results have arrived. Samples drawn more than
+    max_age generations ago are cancelled (or discarded). Returns an
+    OptimizeResult with x, fun, nfev (discarded evaluations included), nit
+    (generations), stop (the termination criteria met), history
+    (evaluations, time and best value at each generation) and metrics (see
+    Evaluator.metrics).
+
+    Keyword Arguments:
+    fun           -- the objective function to minimize: x -> float
+    x0            -- the initial mean, shape (n,)
+    sigma0        -- the initial step size
+    evaluations   -- the evaluation budget
+    popsize       -- see CMAES
+    bounds        -- see CMAES
+    max_age       -- the number of generations after which a pending sample
+                     is stale. With 0, only results sampled from the current
+                     distribution are used
+    target        -- stop when the best value is below target
+    executor      -- see Evaluator
+    max_workers   -- see Evaluator
+    max_in_flight -- see Evaluator
+    seed          -- the seed of the random generator
+    """
+
+    es = CMAES(x0, sigma0, popsize=popsize, bounds=bounds, seed=seed)
+    samples = np.zeros((0, es.n))
+    X, f = [], []
+    submitted, nfev = 0, 0
+    history = []
+
+    def stale(tag):
+        return es.generation - tag > max_age
+
+    async with Evaluator(fun, executor, max_workers, max_in_flight) as pool:
+        while nfev < evaluations:
+            while not pool.full() and submitted < evaluations:
+                if len(samples) == 0:
+                    samples = es.ask()
+                x, samples = samples[0], samples[1:]
+                # evaluated in the box, told with the penalty (see CMAES)
+                inside, penalty = es.repair(x[None])
+                await pool.submit(inside[0], (es.generation, x, penalty[0]))
+                submitted += 1
+            results = await pool.completed()
+            # results discarded by the pool count in the budget
+            nfev = pool.nfev - len(results)
+            for _, value, (generation, x, penalty) in results:
+                nfev += 1
+                if stale(generation):
+                    continue
+                X.append(x)
+                f.append(value + penalty)
+            while len(f) >= es.popsize:
+                es.tell(np.array(X[: es.popsize]), f[: es.popsize])
+                del X[: es.popsize], f[: es.popsize]
+                samples = np.zeros((0, es.n))
+                history.append(
+                    (nfev, time.perf_counter() - pool.start, es.best_f)
+                )
+            submitted -= pool.cancel(lambda tag: stale(tag[0]))
+            if es.stop() or (target is not None and es.best_f <= target):
+                break
+            if not pool.pending and submitted >= evaluations:
+                break
+
+    return OptimizeResult(
+        x=es.best_x.copy(),
+        fun=es.best_f,
+        nfev=nfev,
+        nit=es.generation,
+        stop=es.stop(),
+        history=np.array(history),
+        metrics=pool.metrics(),
+    )
+
+
+def slow_rastrigin(x: NDArray, delay: float = 0.01) -> float:
+    """Rastrigin's function, with a random delay (exponential distribution
+    of mean delay) to emulate an expensive evaluation."""
+
+    time.sleep(np.random.default_rng().exponential(delay))
+    return float(10 + np.sum(x ** 2 - 10 * np.cos(2 * np.pi * x)))
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    for name, coroutine in [
+        (
+            "steady-state GA",
+            steady_state_ga(
+                slow_rastrigin,
+                rng.uniform(-5, 5, (32, 5)),
+                evaluations=1000,
+                mutation_scale=0.3,
+                bounds=(-5.12, 5.12),
+                max_workers=8,
+                seed=0,
+            ),
+        ),
+        (
+            "steady-state CMA-ES",
+            steady_state_cmaes(
+                slow_rastrigin,
+                rng.uniform(-5, 5, 5),
+                sigma0=2,
+                evaluations=1000,
+                bounds=(-5.12, 5.12),
+                max_workers=8,
+                seed=0,
+            ),
+        ),
+    ]:
+        res = asyncio.run(coroutine)
+        metrics = res.metrics
+        print(f"{name}: best {res.fun:.4f} after {res.nfev} evaluations")
+        print(
+            f"  {metrics['throughput']:.1f} evaluations/s, utilisation "
+            f"{metrics['utilisation']:.0%}, latency mean "
+            f"{metrics['latency_mean'] * 1e3:.1f} ms, p95 "
+            f"{metrics['latency_p95'] * 1e3:.1f} ms, "
+            f"{metrics['cancelled']} cancelled, "
+            f"{metrics['discarded']} discarded"
+        )
@@ -0,0 +1,578 @@
+"""A black-box benchmark of the optimisers of the course, in the style of
+COCO (https://github.com/numbbo/coco).
+
+Each trial runs one optimiser on one function of the bestiary, in one
+dimension, for one instance (seed), with a budget of evaluations
+proportional to the dimension. Optimisers are restarted from a new random
+point until the budget is exhausted or the most difficult target is
+reached. For each target value f_opt + precision * scale, where scale is
+the median of f - f_opt at random points of the domain (so that precisions
+are relative to the range of each function), the trial records the number
+of evaluations (and the wall time) needed to reach it. The expected
+running time (ERT) of a target is the total number of evaluations spent in
+all trials (until success, or until the end of the budget) divided by the
+number of successful trials.
+
+A value of the function and a gradient are counted as one evaluation each.
+
+    python benchmark.py run --dimensions 2 5 10 --seeds 5 -o baseline.json
+    python benchmark.py run --dimensions 2 5 10 --seeds 5 -o new.json
+    python benchmark.py compare baseline.json new.json --tolerance 1.2
+
+The comparison flags regressions: a larger ERT (beyond the tolerance
+ratio), a lower success rate, or more wall time per evaluation. The exit
+status is 1 if a regression is found, 2 if the two runs do not have the
+same targets (precisions, relative or absolute).
+"""
+
+import argparse
+import datetime
+import importlib.util
+import json
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Optional
+
+import numpy as np
+import scipy
+from numpy.typing import NDArray
+from scipy.optimize import minimize
+
+from annealing import Gaussian, Geometric, SimulatedAnnealing
+from bestiary import as_batch, boulders, himmelblau_batch
+from bestiary import himmelblau_gradient, rastrigin_batch, rastrigin_gradient
+from cmaes import fmin
+from genetic import GeneticAlgorithm
+
+__all__ = ["problem", "run_trial", "benchmark", "summarize", "compare"]
+
+# relative precisions of the targets f_opt + precision * scale
+PRECISIONS = [1e-1, 1e-2, 1e-3, 1e-4, 1e-5, 1e-7]
+
+
+class Problem:
+    def __init__(
+        self,
+        name: str,
+        dimension: int,
+        batch: Callable,
+        gradient: Callable,
+        bounds: tuple,
+        f_opt: float,
+    ) -> None:
+        self.name = name
+        self.dimension = dimension
+        self.batch = batch
+        self.gradient = gradient
+        self.bounds = bounds
+        self.f_opt = f_opt
+
+        # the typical gap to the optimum of a random starting point
+        rng = np.random.default_rng(0)
+        low, high = bounds
+        X = rng.uniform(low, high, (1000, dimension))
+        self.scale = float(np.median(batch(X)) - f_opt)
+
+
+def boulders_optimum(b: boulders, size: int = 512) -> float:
+    """The minimum of a boulders function in the unit square: the best
+    values of a grid, polished with L-BFGS-B."""
+
+    xs = np.linspace(0, 1, size)
+    z = b.grid(xs, xs)
+    best = np.argsort(z, axis=None)[:20]
+    f_opt = z.flat[best[0]]
+    for k in best:
+        i, j = np.unravel_index(k, z.shape)
+        res = minimize(
+            lambda x: b.batch(x)[0],
+            np.array([xs[j], xs[i]]),
+            jac=lambda x: b.gradient(x)[0],
+            method="L-BFGS-B",
+            bounds=[(0, 1), (0, 1)],
+        )
+        f_opt = min(f_opt, res.fun)
+    return float(f_opt)
+
+
+def problem(name: str, dimension: int, seed: int) -> Optional[Problem]:
+    """The instance of a function of the bestiary, or None if the function
+    is not defined in this dimension."""
+
+    if name == "rastrigin":
+        return Problem(
+            name,
+            dimension,
+            rastrigin_batch,
+            rastrigin_gradient,
+            (-5.12, 5.12),
+            10.0 * (1 - dimension),
+        )
+    if not defined(name, dimension):
+        return None
+    if name == "himmelblau":
+        return Problem(
+            name, 2, himmelblau_batch, himmelblau_gradient, (-5.0, 5.0), 0.0
+        )
+    if name == "boulders":
+        # boulders are drawn with the global random generator
+        state = np.random.get_state()
+        np.random.seed(seed)
+        b = boulders(64)
+        np.random.set_state(state)
+        f_opt = boulders_optimum(b)
+        return Problem(name, 2, b.batch, b.gradient, (0.0, 1.0), f_opt)
+    raise ValueError(f"unknown function {name!r}")
+
+
+def defined(name: str, dimension: int) -> bool:
+    return name == "rastrigin" or dimension == 2
+
+
+class Stop(Exception):
+    pass
+
+
+class Recorder:
+    """Count evaluations, record when each target is first reached, and
+    stop the optimiser (with a Stop exception) at the end of the budget or
+    when all targets are reached."""
+
+    def __init__(self, problem: Problem, budget: int) -> None:
+        self.problem = problem
+        self.budget = budget
+        self.targets = problem.f_opt + np.array(PRECISIONS) * problem.scale
+        self.hits = [None] * len(self.targets)
+        self.times = [None] * len(self.targets)
+        self.nfev = 0
+        self.best = np.inf
+        self.start = time.perf_counter()
+
+    def count(self, values: NDArray) -> None:
+        running = np.minimum.accumulate(np.append(self.best, values))[1:]
+        now = time.perf_counter() - self.start
+        for k, target in enumerate(self.targets):
+            if self.hits[k] is None and running[-1] <= target:
+                self.hits[k] = self.nfev + int(np.argmax(running <= target)) + 1
+                self.times[k] = now
+        self.best = running[-1]
+        self.nfev += len(values)
+        if self.nfev >= self.budget or self.hits[-1] is not None:
+            raise Stop
+
+    def batch(self, X: NDArray) -> NDArray:
+        X = as_batch(X)
+        room = max(self.budget - self.nfev, 1)
+        values = self.problem.batch(X)
+        self.count(values[:room])
+        return values
+
+    def fun(self, x: NDArray) -> float:
+        return float(self.batch(x)[0])
+
+    def gradient(self, x: NDArray) -> NDArray:
+        # one gradient counts as one evaluation, with no new value
+        self.count(np.array([self.best]))
+        return self.problem.gradient(x)[0]
+
+
+# Optimisers: called with a Recorder and a random generator, they restart
+# until a Stop exception is raised
+
+
+def uniform(rng: np.random.Generator, problem: Problem, *shape: int):
+    low, high = problem.bounds
+    return rng.uniform(low, high, (*shape, problem.dimension))
+
+
+def scipy_method(method: str) -> Callable:
+    def optimizer(recorder: Recorder, rng: np.random.Generator) -> None:
+        problem = recorder.problem
+        bounds = [problem.bounds] * problem.dimension
+        while True:
+            minimize(
+                recorder.fun,
+                uniform(rng, problem),
+                jac=recorder.gradient,
+                method=method,
+                bounds=bounds if method == "L-BFGS-B" else None,
+            )
+
+    return optimizer
+
+
+def torch_method(name: str, lr: float, steps: int = 1000) -> Callable:
+    def optimizer(recorder: Recorder, rng: np.random.Generator) -> None:
+        import torch
+
+        problem = recorder.problem
+        low, high = problem.bounds
+        while True:
+            x = torch.tensor(uniform(rng, problem), requires_grad=True)
+            optim = getattr(torch.optim, name)([x], lr=lr * (high - low))
+            for _ in range(steps):
+                point = x.detach().numpy()
+                recorder.fun(point)
+                x.grad = torch.from_numpy(recorder.gradient(point))
+                optim.step()
+                with torch.no_grad():
+                    x.clamp_(low, high)
+
+    return optimizer
+
+
+def annealing(recorder: Recorder, rng: np.random.Generator) -> None:
+    problem = recorder.problem
+    low, high = problem.bounds
+    while True:
+        SimulatedAnnealing(
+            recorder.batch,
+            uniform(rng, problem, 16),
+            Gaussian(0.05 * (high - low), anneal=True),
+            Geometric(0.995),
+            T0=10.0,
+            bounds=problem.bounds,
+            seed=rng.integers(2 ** 32),
+        ).run(2000)
+
+
+def genetic(recorder: Recorder, rng: np.random.Generator) -> None:
+    problem = recorder.problem
+    low, high = problem.bounds
+    while True:
+        GeneticAlgorithm(
+            recorder.batch,
+            uniform(rng, problem, max(20, 10 * problem.dimension)),
+            mutation_scale=0.05 * (high - low),
+            bounds=problem.bounds,
+            seed=rng.integers(2 ** 32),
+        ).run(500)
+
+
+def cmaes(recorder: Recorder, rng: np.random.Generator) -> None:
+    problem = recorder.problem
+    low, high = problem.bounds
+    while True:
+        fmin(
+            recorder.batch,
+            bounds=problem.bounds,
+            dimension=problem.dimension,
+            sigma0=0.3 * (high - low),
+            restarts=20,
+            strategy="ipop",
+            seed=rng.integers(2 ** 32),
+        )
+
+
+OPTIMIZERS = {
+    "BFGS": scipy_method("BFGS"),
+    "L-BFGS-B": scipy_method("L-BFGS-B"),
+    "SGD": torch_method("SGD", lr=1e-4),
+    "Adam": torch_method("Adam", lr=1e-2),
+    "annealing": annealing,
+    "genetic": genetic,
+    "cmaes": cmaes,
+}
+TORCH = ["SGD", "Adam"]
+FUNCTIONS = ["rastrigin", "himmelblau", "boulders"]
+
+
+def available() -> list:
+    """The optimisers which can run here (torch is optional)."""
+
+    torch = importlib.util.find_spec("torch") is not None
+    return [name for name in OPTIMIZERS if torch or name not in TORCH]
+
+
+def run_trial(trial: tuple) -> dict:
+    """Run one (optimizer, function, dimension, seed, budget) trial."""
+
+    name, function, dimension, seed, budget = trial
+    recorder = Recorder(problem(function, dimension, seed), budget)
+    start = recorder.start
+    try:
+        OPTIMIZERS[name](recorder, np.random.default_rng(seed))
+    except Stop:
+        pass
+    return dict(
+        optimizer=name,
+        function=function,
+        dimension=dimension,
+        seed=seed,
+        budget=budget,
+        evaluations=recorder.nfev,
+        scale=recorder.problem.scale,
+        precision=float(
+            (recorder.best - recorder.problem.f_opt) / recorder.problem.scale
+        ),
+        hits=recorder.hits,
+        times=recorder.times,
+        time=time.perf_counter() - start,
+    )
+
+
+def summarize(trials: list) -> list:
+    """ERT, success rate and wall time for each optimizer, function,
+    dimension and target precision."""
+
+    groups = {}
+    for trial in trials:
+        key = (trial["optimizer"], trial["function"], trial["dimension"])
+        groups.setdefault(key, []).append(trial)
+
+    summary = []
+    for (name, function, dimension), group in sorted(groups.items()):
+        seconds = sum(t["time"] for t in group)
+        evaluations = sum(t["evaluations"] for t in group)
+        for k, precision in enumerate(PRECISIONS):
+            spent = [
+                t["hits"][k] if t["hits"][k] is not None else t["evaluations"]
+                for t in group
+            ]
+            successes = sum(t["hits"][k] is not None for t in group)
+            times = [t["times"][k] for t in group if t["times"][k] is not None]
+            summary.append(
+                dict(
+                    optimizer=name,
+                    function=function,
+                    dimension=dimension,
+                    precision=precision,
+                    trials=len(group),
+                    success_rate=successes / len(group),
+                    # None stands for an infinite ERT (no success)
+                    ert=sum(spent) / successes if successes else None,
+                    time_to_target=float(np.median(times)) if times else None,
+                    time_per_evaluation=seconds / max(evaluations, 1),
+                )
+            )
+    return summary
+
+
+def benchmark(
+    optimizers: Optional[list] = None,
+    functions: Optional[list] = None,
+    dimensions: tuple = (2, 5, 10),
+    seeds: int = 5,
+    budget: int = 1000,
+    max_workers: Optional[int] = None,
+) -> dict:
+    """Run all trials in a process pool. Returns a dictionary (to be saved
+    as JSON) with metadata, the trials and their summary.
+
+    Keyword Arguments:
+    optimizers  -- names of optimizers. Defaults to all available ones
+    functions   -- names of functions. Defaults to all of them
+    dimensions  -- the dimensions (some functions only exist in 2D)
+    seeds       -- the number of instances (seeds 0 to seeds - 1)
+    budget      -- the budget of evaluations, multiplied by the dimension
+    max_workers -- the number of processes. Defaults to os.cpu_count()
+    """
+
+    optimizers = optimizers or available()
+    trials = [
+        (name, function, dimension, seed, budget * dimension)
+        for name in optimizers
+        for function in functions or FUNCTIONS
+        for dimension in dimensions
+        if defined(function, dimension)
+        for seed in range(seeds)
+    ]
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers) as executor:
+        results = list(executor.map(run_trial, trials))
+
+    return dict(
+        meta=dict(
+            date=datetime.datetime.now().isoformat(timespec="seconds"),
+            python=platform.python_version(),
+            numpy=np.__version__,
+            scipy=scipy.__version__,
+            machine=platform.machine(),
+            cpus=os.cpu_count(),
+            budget=budget,
+            precisions=PRECISIONS,
+            targets="relative",  # f_opt + precision * scale
+            time=time.perf_counter() - start,
+        ),
+        trials=results,
+        summary=summarize(results),
+    )
+
+
+def compare(
+    baseline: dict,
+    candidate: dict,
+    tolerance: float = 1.2,
+    time_tolerance: float = 1.5,
+) -> list:
+    """Compare two benchmark results, and return the regressions of the
+    candidate: a lower success rate, an ERT larger than tolerance times the
+    baseline, or a time per evaluation larger than time_tolerance times the
+    baseline (wall times are only comparable on the same machine).
+    Raises ValueError if the two runs do not have the same targets (the
+    same precisions and the same scale for each instance)."""
+
+    # results before relative targets have no "targets" entry
+    targets = [
+        (run["meta"].get("targets", "absolute"), run["meta"]["precisions"])
+        for run in (baseline, candidate)
+    ]
+    if targets[0] != targets[1]:
+        raise ValueError(
+            "the runs have different targets (baseline: {} {}, candidate: "
+            "{} {}), run the baseline again".format(*targets[0], *targets[1])
+        )
+    scales = {
+        (trial["function"], trial["dimension"], trial["seed"]): trial["scale"]
+        for trial in baseline["trials"]
+    }
+    for trial in candidate["trials"]:
+        instance = (trial["function"], trial["dimension"], trial["seed"])
+        scale = scales.get(instance)
+        if scale is not None and not np.isclose(
+            scale, trial["scale"], rtol=1e-6
+        ):
+            raise ValueError(
+                "the runs have different scales for {} in dimension {} "
+                "(seed {}), run the baseline again".format(*instance)
+            )
+    first = candidate["meta"]["precisions"][0]
+
+    def key(entry):
+        return (
+            entry["optimizer"],
+            entry["function"],
+            entry["dimension"],
+            entry["precision"],
+        )
+
+    reference = {key(entry): entry for entry in baseline["summary"]}
+    regressions = []
+    for entry in candidate["summary"]:
+        old = reference.get(key(entry))
+        if old is None:
+            continue
+        name, function, dimension, precision = key(entry)
+        context = dict(
+            optimizer=name,
+            function=function,
+            dimension=dimension,
+            precision=precision,
+        )
+        if entry["success_rate"] < old["success_rate"]:
+            regressions.append(
+                dict(
+                    context,
+                    metric="success_rate",
+                    baseline=old["success_rate"],
+                    candidate=entry["success_rate"],
+                )
+            )
+        elif old["ert"] is not None and (
+            entry["ert"] is None or entry["ert"] > tolerance * old["ert"]
+        ):
+            regressions.append(
+                dict(
+                    context,
+                    metric="ert",
+                    baseline=old["ert"],
+                    candidate=entry["ert"],
+                )
+            )
+        # the time per evaluation is the same for all precisions
+        if precision == first and (
+            entry["time_per_evaluation"]
+            > time_tolerance * old["time_per_evaluation"]
+        ):
+            regressions.append(
+                dict(
+                    context,
+                    metric="time_per_evaluation",
+                    baseline=old["time_per_evaluation"],
+                    candidate=entry["time_per_evaluation"],
+                )
+            )
+    return regressions
+
+
+def print_summary(summary: list, precision: float = 1e-1) -> None:
+    print(
+        f"{'optimizer':>10} {'function':>10} {'D':>3} {'success':>8} "
+        f"{'ERT':>10} {'time (s)':>9} {'µs/eval':>8}   (precision {precision})"
+    )
+    for entry in summary:
+        if entry["precision"] != precision:
+            continue
+        ert = f"{entry['ert']:.0f}" if entry["ert"] is not None else "inf"
+        seconds = entry["time_to_target"]
+        seconds = f"{seconds:.3f}" if seconds is not None else "-"
+        print(
+            f"{entry['optimizer']:>10} {entry['function']:>10} "
+            f"{entry['dimension']:>3} {entry['success_rate']:>8.0%} "
+            f"{ert:>10} {seconds:>9} "
+            f"{entry['time_per_evaluation'] * 1e6:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run the benchmark")
+    run.add_argument("--optimizers", nargs="+", choices=list(OPTIMIZERS))
+    run.add_argument("--functions", nargs="+", choices=FUNCTIONS)
+    run.add_argument("--dimensions", type=int, nargs="+", default=[2, 5, 10])
+    run.add_argument("--seeds", type=int, default=5)
+    run.add_argument(
+        "--budget", type=int, default=1000, help="evaluations per dimension"
+    )
+    run.add_argument("--workers", type=int, default=None)
+    run.add_argument("--precision", type=float, default=1e-1)
+    run.add_argument("-o", "--output", default="benchmark.json")
+
+    diff = commands.add_parser("compare", help="compare two runs")
+    diff.add_argument("baseline")
+    diff.add_argument("candidate")
+    diff.add_argument("--tolerance", type=float, default=1.2)
+    diff.add_argument("--time-tolerance", type=float, default=1.5)
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        results = benchmark(
+            args.optimizers,
+            args.functions,
+            args.dimensions,
+            args.seeds,
+            args.budget,
+            args.workers,
+        )
+        with open(args.output, "w") as fh:
+            json.dump(results, fh, indent=1)
+        print_summary(results["summary"], args.precision)
+        print(
+            f"{len(results['trials'])} trials "
+            f"in {results['meta']['time']:.1f}s"
+        )
+    else:
+        with open(args.baseline) as fh:
+            baseline = json.load(fh)
+        with open(args.candidate) as fh:
+            candidate = json.load(fh)
+        try:
+            regressions = compare(
+                baseline, candidate, args.tolerance, args.time_tolerance
+            )
+        except ValueError as error:
+            parser.error(str(error))
+        for r in regressions:
+            print(
+                f"{r['optimizer']} {r['function']} D={r['dimension']} "
+                f"precision={r['precision']}: {r['metric']} "
+                f"{r['baseline']} -> {r['candidate']}"
+            )
+        print(f"{len(regressions)} regression(s)")
+        sys.exit(1 if regressions else 0)
@@ -1,4 +1,4 @@
-from typing import TypeVar
+from typing import Optional, TypeVar
 
 import matplotlib.pyplot as plt
 import numpy as np
@@ -9,8 +9,13 @@ F = TypeVar("F", float, NDArray[np.float64])
 
 __all__ = [
     "himmelblau",
+    "himmelblau_batch",
+    "himmelblau_gradient",
     "rastrigin",
+    "rastrigin_batch",
+    "rastrigin_gradient",
     "boulders",
+    "city_placement",
     "animate_function",
     "contour_function",
 ]
@@ -25,23 +30,333 @@ def rastrigin(*X: F, **kwargs: np.float64) -> F:
     return A + sum([(x ** 2 - A * np.cos(2 * np.pi * x)) for x in X])
 
 
+# Batched versions: X is an (N, D) array of N points in dimension D, and each
+# function returns N values (or an (N, D) array of gradients) in one pass.
+# The computation is done in the floating dtype of X unless dtype is given,
+# and results are written to out if provided.
+
+
+def as_batch(X: NDArray, dtype: Optional[np.dtype] = None) -> NDArray:
+    """Return X as a 2D floating array of shape (N, D)."""
+    if dtype is None:
+        X = np.asarray(X)
+        dtype = X.dtype if X.dtype in (np.float32, np.float64) else np.float64
+    return np.atleast_2d(np.asarray(X, dtype=dtype))
+
+
+def himmelblau_batch(
+    X: NDArray, dtype: Optional[np.dtype] = None, out: Optional[NDArray] = None
+) -> NDArray:
+    X = as_batch(X, dtype)
+    if X.shape[1] != 2:
+        raise ValueError("Himmelblau's function is defined in dimension 2")
+    x, y = X[:, 0], X[:, 1]
+    u = x ** 2 + y - 11
+    v = x + y ** 2 - 7
+    u *= u
+    v *= v
+    return np.add(u, v, out=out)
+
+
+def himmelblau_gradient(
+    X: NDArray, dtype: Optional[np.dtype] = None, out: Optional[NDArray] = None
+) -> NDArray:
+    X = as_batch(X, dtype)
+    if X.shape[1] != 2:
+        raise ValueError("Himmelblau's function is defined in dimension 2")
+    if out is None:
+        out = np.empty_like(X)
+    x, y = X[:, 0], X[:, 1]
+    u = x ** 2 + y - 11
+    v = x + y ** 2 - 7
+    out[:, 0] = 4 * x * u + 2 * v
+    out[:, 1] = 2 * u + 4 * y * v
+    return out
+
+
+def rastrigin_batch(
+    X: NDArray,
+    A: float = 10,
+    dtype: Optional[np.dtype] = None,
+    out: Optional[NDArray] = None,
+) -> NDArray:
+    X = as_batch(X, dtype)
+    cos = np.multiply(X, 2 * np.pi)
+    np.cos(cos, out=cos)
+    result = np.einsum("ij,ij->i", X, X, out=out)
+    result -= A * cos.sum(axis=1)
+    result += A
+    return result
+
+
+def rastrigin_gradient(
+    X: NDArray,
+    A: float = 10,
+    dtype: Optional[np.dtype] = None,
+    out: Optional[NDArray] = None,
+) -> NDArray:
+    X = as_batch(X, dtype)
+    out = np.multiply(X, 2 * np.pi, out=out)
+    np.sin(out, out=out)
+    out *= 2 * np.pi * A
+    out += 2 * X
+    return out
+
+
 class boulders:
-    def __init__(self, n: int) -> None:
+    def __init__(
+        self, n: int, cell: Optional[float] = None, chunk: int = 2 ** 20
+    ) -> None:
         self.boulders = np.random.uniform(0.0, 1.0, (n, 3))
         self.boulders[:, 2] = 1 / (3 ** np.random.choice(range(2, 4), (n)))
+        # size of the cells of the spatial index (defaults to the largest
+        # radius) and maximum number of (point, boulder) pairs, or of grid
+        # values, computed at once
+        self.cell = cell
+        self.chunk = chunk
+        self.build_index()
+
+    def build_index(self) -> None:
+        # to be called again if self.boulders is modified
+        cx, cy, r = self.boulders.T
+        n = r.size
+        h = self.cell if self.cell is not None else (r.max() if n else 1.0)
+        pad = 1e-9 * h
+
+        # uniform grid hash: each cell lists the boulders overlapping it,
+        # in increasing order (hence the same summation order as a loop)
+        self.origin = (
+            np.array([(cx - r).min(), (cy - r).min()]) - pad
+            if n
+            else np.zeros(2)
+        )
+        self.h = h
+        lo_x = np.floor((cx - r - pad - self.origin[0]) / h).astype(int)
+        lo_y = np.floor((cy - r - pad - self.origin[1]) / h).astype(int)
+        hi_x = np.floor((cx + r + pad - self.origin[0]) / h).astype(int)
+        hi_y = np.floor((cy + r + pad - self.origin[1]) / h).astype(int)
+        self.shape = (hi_x.max() + 1 if n else 1, hi_y.max() + 1 if n else 1)
+
+        width = hi_x - lo_x + 1
+        count = width * (hi_y - lo_y + 1)
+        boulder = np.repeat(np.arange(n), count)
+        k = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+        cell = (lo_y[boulder] + k // width[boulder]) * self.shape[0] + (
+            lo_x[boulder] + k % width[boulder]
+        )
+        self.members = boulder[np.argsort(cell, kind="stable")]
+        self.starts = np.zeros(self.shape[0] * self.shape[1] + 1, dtype=int)
+        np.cumsum(
+            np.bincount(cell, minlength=self.starts.size - 1),
+            out=self.starts[1:],
+        )
+
+        # boulders sorted by the bottom of their disc, for regular grids
+        self.by_bottom = np.argsort(cy - r, kind="stable")
+        self.bottom = (cy - r)[self.by_bottom]
+        self.top = np.sort(cy + r)
+
+    def pairs(self, x: NDArray, y: NDArray):
+        # yield chunks of (point, boulder) pairs to be tested, with the
+        # points of each chunk being x[start:stop], y[start:stop]
+        ix = np.floor((x - self.origin[0]) / self.h)
+        iy = np.floor((y - self.origin[1]) / self.h)
+        valid = (ix >= 0) & (ix < self.shape[0]) & (iy >= 0)
+        valid &= iy < self.shape[1]
+        cell = np.where(valid, iy * self.shape[0] + ix, 0).astype(int)
+        counts = np.where(valid, self.starts[cell + 1] - self.starts[cell], 0)
+        ends = np.cumsum(counts)
+
+        start = 0
+        while start < x.size:
+            base = ends[start - 1] if start else 0
+            stop = np.searchsorted(ends, base + self.chunk, "right")
+            stop = max(stop, start + 1)
+            c = counts[start:stop]
+            point = np.repeat(np.arange(start, stop), c)
+            offset = np.arange(c.sum()) - np.repeat(np.cumsum(c) - c, c)
+            first = np.repeat(self.starts[cell[start:stop]], c)
+            yield start, stop, point, self.members[first + offset]
+            start = stop
 
     def __call__(self, x: F, y: F) -> np.ndarray:
-        shape = getattr(x, "shape", tuple())
-        z = np.zeros(shape)
-        for i in range(self.boulders.shape[0]):
-            eval_ = (
-                (x - self.boulders[i, 0]) ** 2
-                + (y - self.boulders[i, 1]) ** 2
-                - self.boulders[i, 2] ** 2
+        x, y = np.broadcast_arrays(np.asarray(x, float), np.asarray(y, float))
+        if self.is_grid(x, y):
+            return self.grid(x[0], y[:, 0])
+
+        cx, cy, r = self.boulders.T
+        xf, yf = x.ravel(), y.ravel()
+        z = np.zeros(xf.size)
+        for start, stop, p, b in self.pairs(xf, yf):
+            eval_ = (xf[p] - cx[b]) ** 2 + (yf[p] - cy[b]) ** 2 - r[b] ** 2
+            inside = eval_ < 0
+            z[start:stop] = np.bincount(
+                p[inside] - start, eval_[inside], minlength=stop - start
             )
-            z[eval_ < 0] += eval_[eval_ < 0]
+        return z.reshape(x.shape)
+
+    @staticmethod
+    def is_grid(x: NDArray, y: NDArray) -> bool:
+        # x, y = np.meshgrid(xs, ys) with increasing xs and ys
+        if x.ndim != 2 or x.shape[0] < 2 or x.shape[1] < 2:
+            return False
+        xs, ys = x[0], y[:, 0]
+        return bool(
+            (np.diff(xs) > 0).all()
+            and (np.diff(ys) > 0).all()
+            and (x == xs).all()
+            and (y == ys[:, None]).all()
+        )
+
+    def grid(self, xs: NDArray, ys: NDArray) -> NDArray:
+        # evaluate on np.meshgrid(xs, ys): each boulder covers an interval
+        # of xs on each row, so z = sum(x**2 - 2 cx x + cx**2 + dy**2 - r**2)
+        # is accumulated per row with difference arrays on the coefficients
+        cx, cy, r = self.boulders.T
+        nx, ny = xs.size, ys.size
+        z = np.zeros((ny, nx))
+
+        # number of boulders crossing each row, to bound the size of chunks
+        crossing = np.searchsorted(self.bottom, ys, "left")
+        crossing -= np.searchsorted(self.top, ys, "right")
+        ends = np.cumsum(np.maximum(crossing, 0) + nx + 1)
+
+        start = 0
+        while start < ny:
+            base = ends[start - 1] if start else 0
+            stop = np.searchsorted(ends, base + self.chunk, "right")
+            stop = max(stop, start + 1)
+
+            # boulders crossing rows start to stop
+            last = np.searchsorted(self.bottom, ys[stop - 1], "left")
+            b = self.by_bottom[:last]
+            b = b[cy[b] + r[b] > ys[start]]
+            first = np.searchsorted(ys, cy[b] - r[b], "left")
+            first = np.clip(first - 1, start, stop)
+            last = np.searchsorted(ys, cy[b] + r[b], "right")
+            last = np.clip(last + 1, start, stop)
+
+            count = last - first
+            row = np.repeat(first, count) + np.arange(count.sum())
+            row -= np.repeat(np.cumsum(count) - count, count)
+            b = np.repeat(b, count)
+            dy2 = (ys[row] - cy[b]) ** 2
+            r2 = r[b] ** 2
+            w = np.sqrt(np.maximum(r2 - dy2, 0))
+
+            def inside(j):
+                j = np.clip(j, 0, nx - 1)
+                return (xs[j] - cx[b]) ** 2 + dy2 - r2 < 0
+
+            # interval [left, right) of xs inside the disc, with the exact
+            # same test as a loop over boulders
+            left = np.searchsorted(xs, cx[b] - w, "left")
+            right = np.searchsorted(xs, cx[b] + w, "right")
+            left -= (left > 0) & inside(left - 1)
+            left += (left < right) & ~inside(left)
+            right += (right < nx) & inside(right)
+            right -= (right > left) & ~inside(right - 1)
+            keep = left < right
+            row, b, left, right = row[keep], b[keep], left[keep], right[keep]
+            dy2, r2 = dy2[keep], r2[keep]
+
+            rows = stop - start
+            index_left = (row - start) * (nx + 1) + left
+            index_right = (row - start) * (nx + 1) + right
+            coefs = []
+            for weight in (np.ones(b.size), -2 * cx[b], cx[b] ** 2 + dy2 - r2):
+                diff = np.bincount(index_left, weight, rows * (nx + 1))
+                diff -= np.bincount(index_right, weight, rows * (nx + 1))
+                coefs.append(diff.reshape(rows, nx + 1).cumsum(axis=1)[:, :nx])
+            count, linear, constant = coefs
+            z[start:stop] = np.where(
+                count > 0.5, count * xs ** 2 + linear * xs + constant, 0
+            )
+            start = stop
+
         return z
 
+    def batch(
+        self,
+        X: NDArray,
+        dtype: Optional[np.dtype] = None,
+        out: Optional[NDArray] = None,
+    ) -> NDArray:
+        X = as_batch(X, dtype)
+        z = self(X[:, 0], X[:, 1]).astype(X.dtype)
+        if out is None:
+            return z
+        out[...] = z
+        return out
+
+    def gradient(
+        self,
+        X: NDArray,
+        dtype: Optional[np.dtype] = None,
+        out: Optional[NDArray] = None,
+    ) -> NDArray:
+        X = as_batch(X, dtype)
+        if out is None:
+            out = np.empty_like(X)
+        cx, cy, r = self.boulders.T
+        x, y = X[:, 0], X[:, 1]
+        for start, stop, p, b in self.pairs(x, y):
+            dx, dy = x[p] - cx[b], y[p] - cy[b]
+            inside = dx ** 2 + dy ** 2 - r[b] ** 2 < 0
+            p = p[inside] - start
+            out[start:stop, 0] = np.bincount(p, 2 * dx[inside], stop - start)
+            out[start:stop, 1] = np.bincount(p, 2 * dy[inside], stop - start)
+        return out
+
+
+class city_placement:
+    # the map reconstruction criterion of 2_gradient/city_problem.ipynb:
+    # positions x of n cities (flattened) which best match a distance matrix
+    # sum_{i < j} (|x_i - x_j|^2 - d_ij^2)^2
+
+    def __init__(self, distances: NDArray) -> None:
+        self.distances = np.asarray(distances, dtype=float)
+        self.n = self.distances.shape[0]
+
+    def __call__(self, *args: float) -> float:
+        return float(self.batch(np.ravel(args))[0])
+
+    def deltas(self, X: NDArray) -> tuple:
+        P = X.reshape(X.shape[0], self.n, 2)
+        squares = np.einsum("kij,kij->ki", P, P)
+        D2 = squares[:, :, None] + squares[:, None, :]
+        D2 -= 2 * P @ P.transpose(0, 2, 1)
+        D2 -= (self.distances ** 2).astype(X.dtype)
+        np.einsum("kii->ki", D2)[...] = 0
+        return P, D2
+
+    def batch(
+        self,
+        X: NDArray,
+        dtype: Optional[np.dtype] = None,
+        out: Optional[NDArray] = None,
+    ) -> NDArray:
+        X = as_batch(X, dtype)
+        _, delta = self.deltas(X)
+        result = np.einsum("kij,kij->k", delta, delta, out=out)
+        result /= 2
+        return result
+
+    def gradient(
+        self,
+        X: NDArray,
+        dtype: Optional[np.dtype] = None,
+        out: Optional[NDArray] = None,
+    ) -> NDArray:
+        X = as_batch(X, dtype)
+        P, delta = self.deltas(X)
+        grad = P * delta.sum(axis=2)[:, :, None] - delta @ P
+        grad *= 4
+        if out is None:
+            return grad.reshape(X.shape)
+        out[...] = grad.reshape(X.shape)
+        return out
+
 
 def anim_to_html(anim: animation.Animation):
     plt.close(anim._fig)
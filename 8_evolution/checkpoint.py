@@ -0,0 +1,302 @@
+"""Checkpoints and trajectories for long optimisation runs.
+
+Trajectory streams the iterates of a run to a .npy file through a small
+buffer: the memory footprint stays constant however long the run, and the
+file can be opened at any time (even while the run goes on) with
+np.load(path, mmap_mode="r").
+
+Checkpoint periodically writes the state of a run to disk, atomically (a
+crash while writing leaves the previous checkpoint intact):
+
+- objects with a state_dict method: torch modules and optimizers, the
+  engines of 8_evolution (GeneticAlgorithm, SimulatedAnnealing, CMAES,
+  through the Stateful mixin), trajectories;
+- numpy arrays and torch tensors, restored in place;
+- the state of the global random generators of random, numpy and torch.
+
+A resumed run continues bit-for-bit like an uninterrupted one:
+
+    trajectory = Trajectory("run.npy", shape=(2,))
+    checkpoint = Checkpoint("run.ckpt", every=100)
+    start = checkpoint.restore(
+        params=params, optimizer=optimizer, trajectory=trajectory
+    )
+    for step in range(start, 4000):
+        ...
+        trajectory.append(params.detach().cpu())
+        checkpoint.update(
+            step + 1, params=params, optimizer=optimizer, trajectory=trajectory
+        )
+    trajectory.close()
+
+This file is identical in 3_pytorch and 8_evolution.
+"""
+
+import copy
+import os
+import pickle
+import random
+import struct
+import sys
+import time
+from typing import Any, Optional
+
+import numpy as np
+
+__all__ = ["Trajectory", "Checkpoint", "Stateful"]
+
+# size of the .npy header, fixed so that it can be rewritten in place
+HEADER = 256
+
+
+class Trajectory:
+    def __init__(
+        self,
+        path: str,
+        shape: tuple = (),
+        dtype: np.dtype = np.float64,
+        buffer: int = 1024,
+    ) -> None:
+        """Create a new Trajectory object, recording from the first row
+        (rows of an existing file are kept until restored or overwritten).
+
+        Keyword Arguments:
+        path   -- the .npy file
+        shape  -- the shape of one row (e.g. (D,) for points in dimension D)
+        dtype  -- the dtype of the file
+        buffer -- the number of rows kept in memory before writing them
+        """
+
+        self.path = path
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.buffer = np.empty((buffer, *self.shape), dtype=self.dtype)
+        self.row = self.buffer[0].nbytes
+        self.filled = 0  # rows in the buffer
+        self.length = 0  # rows in the file
+        mode = "r+b" if os.path.exists(path) else "w+b"
+        self.file = open(path, mode)
+        self.write_header()
+
+    def __len__(self) -> int:
+        return self.length + self.filled
+
+    def __enter__(self) -> "Trajectory":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def write_header(self) -> None:
+        header = repr(
+            {
+                "descr": np.lib.format.dtype_to_descr(self.dtype),
+                "fortran_order": False,
+                "shape": (self.length, *self.shape),
+            }
+        )
+        header = header.ljust(HEADER - 11) + "\n"
+        self.file.seek(0)
+        self.file.write(b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)))
+        self.file.write(header.encode("latin1"))
+
+    def append(self, x: Any) -> None:
+        """Add a row (an array, or a torch tensor on the CPU)."""
+
+        self.buffer[self.filled] = np.asarray(x)
+        self.filled += 1
+        if self.filled == len(self.buffer):
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the buffer to the file, and update the header."""
+
+        self.file.seek(HEADER + self.length * self.row)
+        self.file.write(self.buffer[: self.filled].tobytes())
+        self.file.truncate()
+        self.length += self.filled
+        self.filled = 0
+        self.write_header()
+        self.file.flush()
+
+    def array(self) -> np.memmap:
+        """The rows recorded so far, memory-mapped (read only)."""
+
+        self.flush()
+        return np.load(self.path, mmap_mode="r")
+
+    def close(self) -> None:
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def state_dict(self) -> dict:
+        self.flush()
+        os.fsync(self.file.fileno())
+        return {"length": self.length}
+
+    def load_state_dict(self, state: dict) -> None:
+        """Go back to the length recorded in the checkpoint: the rows
+        written after the checkpoint are dropped."""
+
+        self.filled = 0
+        self.length = state["length"]
+        self.file.truncate(HEADER + self.length * self.row)
+        self.write_header()
+        self.file.flush()
+
+
+class Stateful:
+    """state_dict and load_state_dict for an engine: the attributes named in
+    state_keys (missing ones are skipped) and the state of its random
+    generator self.rng, deep copied."""
+
+    state_keys: tuple = ()
+
+    def state_dict(self) -> dict:
+        """The state of the run, to be saved in a checkpoint (without the
+        objective function and the parameters)."""
+
+        state = {
+            key: copy.deepcopy(getattr(self, key))
+            for key in self.state_keys
+            if hasattr(self, key)
+        }
+        state["rng"] = copy.deepcopy(self.rng.bit_generator.state)
+        return state
+
+    def load_state_dict(self, state: dict) -> None:
+        for key, value in state.items():
+            if key == "rng":
+                self.rng.bit_generator.state = copy.deepcopy(value)
+            else:
+                setattr(self, key, copy.deepcopy(value))
+
+
+def random_state() -> dict:
+    """The state of the global random generators."""
+
+    state = {"random": random.getstate(), "numpy": np.random.get_state()}
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        state["torch"] = torch.get_rng_state()
+        if torch.cuda.is_available():
+            state["cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_random_state(state: dict) -> None:
+    random.setstate(state["random"])
+    np.random.set_state(state["numpy"])
+    torch = sys.modules.get("torch")
+    if torch is not None and "torch" in state:
+        torch.set_rng_state(state["torch"])
+        if "cuda" in state and torch.cuda.is_available():
+            torch.cuda.set_rng_state_all(state["cuda"])
+
+
+def is_tensor(obj: Any) -> bool:
+    torch = sys.modules.get("torch")
+    return torch is not None and isinstance(obj, torch.Tensor)
+
+
+def snapshot(obj: Any) -> Any:
+    if hasattr(obj, "state_dict"):
+        return obj.state_dict()
+    if is_tensor(obj):
+        return obj.detach().cpu().clone()
+    if isinstance(obj, np.ndarray):
+        return obj.copy()
+    return obj
+
+
+def load(obj: Any, value: Any) -> None:
+    if hasattr(obj, "load_state_dict"):
+        obj.load_state_dict(value)
+    elif is_tensor(obj):
+        torch = sys.modules["torch"]
+        with torch.no_grad():
+            obj.copy_(value)
+    elif isinstance(obj, np.ndarray):
+        obj[...] = value
+    elif isinstance(obj, list):
+        obj[:] = value
+    elif isinstance(obj, dict):
+        obj.clear()
+        obj.update(value)
+    else:
+        raise TypeError(
+            f"{type(obj).__name__} cannot be restored in place, "
+            "read it from Checkpoint.state instead"
+        )
+
+
+class Checkpoint:
+    def __init__(
+        self,
+        path: str,
+        every: Optional[int] = None,
+        seconds: Optional[float] = None,
+    ) -> None:
+        """Create a new Checkpoint object.
+
+        Keyword Arguments:
+        path    -- the checkpoint file
+        every   -- save in update every this number of steps
+        seconds -- save in update when this time has elapsed since the last
+                   checkpoint
+        """
+
+        self.path = path
+        self.every = every
+        self.seconds = seconds
+        self.last = time.perf_counter()
+        self.state = None
+
+    def update(self, step: int, **objects: Any) -> bool:
+        """Save the objects if a checkpoint is due after this step."""
+
+        due = (self.every is not None and step % self.every == 0) or (
+            self.seconds is not None
+            and time.perf_counter() - self.last >= self.seconds
+        )
+        if due:
+            self.save(step, **objects)
+        return due
+
+    def save(self, step: int, **objects: Any) -> None:
+        state = {
+            "step": step,
+            "random": random_state(),
+            "objects": {name: snapshot(obj) for name, obj in objects.items()},
+        }
+        temporary = self.path + ".tmp"
+        with open(temporary, "wb") as fh:
+            pickle.dump(state, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(temporary, self.path)
+        self.state = state
+        self.last = time.perf_counter()
+
+    def load(self) -> Optional[dict]:
+        """Read the checkpoint file (None if there is none)."""
+
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, "rb") as fh:
+            self.state = pickle.load(fh)
+        return self.state
+
+    def restore(self, **objects: Any) -> int:
+        """Restore the objects and the random generators from the last
+        checkpoint, and return the step to resume from (0 without
+        checkpoint). Other saved values are in self.state["objects"]."""
+
+        state = self.load()
+        if state is None:
+            return 0
+        for name, obj in objects.items():
+            load(obj, state["objects"][name])
+        set_random_state(state["random"])
+        return state["step"]
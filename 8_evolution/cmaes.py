@@ -0,0 +1,399 @@
+"""CMA-ES with rank-one and rank-mu updates of the covariance matrix, and
+IPOP/BIPOP restarts.
+
+The CMAES class follows the ask/tell interface: each population is
+evaluated in one call to a batched function of the bestiary.
+
+    es = CMAES(np.random.uniform(-5, 5, 10), sigma0=2)
+    while not es.stop():
+        X = es.ask()
+        es.tell(X, rastrigin_batch(X))
+
+The eigendecomposition of the covariance matrix, in O(n^3), is only
+refreshed every O(n / lambda) generations; the separable variant (a
+diagonal covariance matrix, the default in dimension 1000 and more) costs
+O(n) per sample. The fmin function runs restarts with an increasing
+population size (IPOP), or alternating large and small populations (BIPOP),
+which helps a lot on multimodal functions like Rastrigin's:
+
+    res = fmin(rastrigin_batch, bounds=(-5.12, 5.12), dimension=10,
+               sigma0=2, restarts=9, strategy="bipop", target=-90 + 1e-8)
+"""
+
+import math
+from typing import Callable, Optional
+
+import numpy as np
+from numpy.typing import NDArray
+from scipy.optimize import OptimizeResult
+
+from checkpoint import Stateful
+
+__all__ = ["CMAES", "fmin"]
+
+
+class CMAES(Stateful):
+    # the state saved in checkpoints (see checkpoint.Stateful)
+    state_keys = (
+        "mean",
+        "sigma",
+        "ps",
+        "pc",
+        "C",
+        "B",
+        "D",
+        "generation",
+        "nfev",
+        "eigen_generation",
+        "best_x",
+        "best_f",
+        "recent",
+        "injected",
+    )
+
+    def __init__(
+        self,
+        x0: NDArray,
+        sigma0: float = 1.0,
+        fun: Optional[Callable[[NDArray], NDArray]] = None,
+        popsize: Optional[int] = None,
+        separable: Optional[bool] = None,
+        bounds: Optional[tuple] = None,
+        tolx: float = 1e-11,
+        tolfun: float = 1e-11,
+        max_generations: Optional[int] = None,
+        seed: Optional[int] = None,
+    ) -> None:
+        """Create a new CMAES object.
+
+        Keyword Arguments:
+        x0              -- the initial mean, shape (n,)
+        sigma0          -- the initial step size
+        fun             -- the batched objective function used by step.
+                           Defaults to None (ask/tell only)
+        popsize         -- the number of samples lambda per generation.
+                           Defaults to 4 + 3 log(n)
+        separable       -- use a diagonal covariance matrix.
+                           Defaults to None (True if n >= 1000)
+        bounds          -- a pair (lower, upper): samples are repaired into
+                           the box before evaluation, and penalised by their
+                           squared distance to the box
+        tolx            -- stop when steps are smaller than tolx
+        tolfun          -- stop when values are flat within tolfun
+        max_generations -- stop after this number of generations
+        seed            -- the seed of the random generator
+        """
+
+        self.mean = np.array(x0, dtype=float).ravel()
+        self.n = n = self.mean.size
+        self.sigma = float(sigma0)
+        self.fun = fun
+        self.separable = n >= 1000 if separable is None else separable
+        self.bounds = bounds
+        self.tolx, self.tolfun = tolx, tolfun
+        self.max_generations = max_generations
+        self.rng = np.random.default_rng(seed)
+
+        # selection and recombination
+        self.popsize = lam = popsize or 4 + int(3 * math.log(n))
+        self.mu = mu = lam // 2
+        weights = math.log((lam + 1) / 2) - np.log(np.arange(1, mu + 1))
+        self.weights = weights / weights.sum()
+        self.mueff = mueff = 1 / (self.weights ** 2).sum()
+
+        # adaptation
+        self.cs = (mueff + 2) / (n + mueff + 5)
+        self.ds = 1 + 2 * max(0, math.sqrt((mueff - 1) / (n + 1)) - 1)
+        self.ds += self.cs
+        self.cc = (4 + mueff / n) / (n + 4 + 2 * mueff / n)
+        self.c1 = 2 / ((n + 1.3) ** 2 + mueff)
+        self.cmu = min(
+            1 - self.c1,
+            2 * (mueff - 2 + 1 / mueff) / ((n + 2) ** 2 + mueff),
+        )
+        if self.separable:
+            # faster learning rates for the n variances (Ros and Hansen)
+            self.c1 *= (n + 2) / 3
+            self.cmu = min(1 - self.c1, self.cmu * (n + 2) / 3)
+        self.chin = math.sqrt(n) * (1 - 1 / (4 * n) + 1 / (21 * n ** 2))
+
+        # state: evolution paths and covariance matrix C = B diag(D^2) B^T
+        self.ps = np.zeros(n)
+        self.pc = np.zeros(n)
+        self.D = np.ones(n)
+        if self.separable:
+            self.C = np.ones(n)
+        else:
+            self.C = np.eye(n)
+            self.B = np.eye(n)
+        self.generation = 0
+        self.nfev = 0
+        self.eigen_generation = 0
+        # the eigendecomposition is refreshed every O(n / lambda) generations
+        self.eigen_every = max(1, int(1 / (10 * n * (self.c1 + self.cmu))))
+
+        self.best_x = self.mean.copy()
+        self.best_f = np.inf
+        self.recent = []
+        self.injected = np.zeros((0, n))
+
+    def ask(self) -> NDArray:
+        """Sample a new population, shape (lambda, n)."""
+
+        Z = self.rng.standard_normal((self.popsize, self.n))
+        if self.separable:
+            Y = Z * self.D
+        else:
+            Y = (Z * self.D) @ self.B.T
+        X = self.mean + self.sigma * Y
+
+        # injected solutions replace the first samples, with their
+        # Mahalanobis length clipped to that of a typical sample
+        k = min(len(self.injected), self.popsize)
+        if k:
+            Y = (self.injected[:k] - self.mean) / self.sigma
+            if self.separable:
+                length = np.linalg.norm(Y / self.D, axis=1)
+            else:
+                length = np.linalg.norm((Y @ self.B) / self.D, axis=1)
+            limit = self.chin + 2 * self.n / (self.n + 2)
+            Y *= np.minimum(1, limit / np.maximum(length, 1e-300))[:, None]
+            X[:k] = self.mean + self.sigma * Y
+            self.injected = self.injected[k:]
+        return X
+
+    def inject(self, X: NDArray) -> None:
+        """Add solutions (e.g. migrants from another population) to the
+        next samples returned by ask."""
+
+        X = np.asarray(X, dtype=float).reshape(-1, self.n)
+        self.injected = np.vstack([self.injected, X])
+
+    def repair(self, X: NDArray) -> tuple:
+        """Return the samples clipped into the bounds and the penalty
+        applied to their values."""
+
+        if self.bounds is None:
+            return X, np.zeros(len(X))
+        inside = np.clip(X, self.bounds[0], self.bounds[1])
+        return inside, ((X - inside) ** 2).sum(axis=1)
+
+    def tell(self, X: NDArray, f: NDArray) -> None:
+        """Update the distribution with the samples X (as returned by ask,
+        before repair) and their values f."""
+
+        X = np.asarray(X, dtype=float)
+        f = np.asarray(f, dtype=float)
+        self.generation += 1
+        self.nfev += len(f)
+
+        best = np.argmin(f)
+        if f[best] < self.best_f:
+            self.best_f = float(f[best])
+            self.best_x = self.repair(X[best : best + 1])[0][0].copy()
+
+        order = np.argsort(f)[: self.mu]
+        self.recent.append(f[order[0]])
+        Y = (X[order] - self.mean) / self.sigma
+        y_w = self.weights @ Y
+        self.mean = self.mean + self.sigma * y_w
+
+        # C^(-1/2) y_w, with the last eigendecomposition
+        if self.separable:
+            z_w = y_w / self.D
+        else:
+            z_w = self.B @ ((self.B.T @ y_w) / self.D)
+
+        cs, cc, c1, cmu = self.cs, self.cc, self.c1, self.cmu
+        self.ps = (1 - cs) * self.ps + math.sqrt(
+            cs * (2 - cs) * self.mueff
+        ) * z_w
+        norm = np.linalg.norm(self.ps) / math.sqrt(
+            1 - (1 - cs) ** (2 * self.generation)
+        )
+        hs = norm / self.chin < 1.4 + 2 / (self.n + 1)
+        self.pc = (1 - cc) * self.pc + hs * math.sqrt(
+            cc * (2 - cc) * self.mueff
+        ) * y_w
+
+        # rank-one and rank-mu updates
+        decay = 1 - c1 - cmu + (1 - hs) * c1 * cc * (2 - cc)
+        if self.separable:
+            self.C = (
+                decay * self.C
+                + c1 * self.pc ** 2
+                + cmu * (self.weights @ Y ** 2)
+            )
+        else:
+            self.C *= decay
+            self.C += c1 * np.outer(self.pc, self.pc)
+            self.C += cmu * (Y.T * self.weights) @ Y
+
+        self.sigma *= math.exp(
+            (cs / self.ds) * (np.linalg.norm(self.ps) / self.chin - 1)
+        )
+
+        if self.separable:
+            self.D = np.sqrt(np.maximum(self.C, 1e-300))
+        elif self.generation - self.eigen_generation >= self.eigen_every:
+            self.eigendecomposition()
+
+    def eigendecomposition(self) -> None:
+        self.C = (self.C + self.C.T) / 2
+        D2, self.B = np.linalg.eigh(self.C)
+        self.D = np.sqrt(np.maximum(D2, 1e-300))
+        self.eigen_generation = self.generation
+
+    def stop(self) -> dict:
+        """Return the termination criteria which are met (empty if none)."""
+
+        reasons = {}
+        if self.max_generations and self.generation >= self.max_generations:
+            reasons["max_generations"] = self.max_generations
+        window = 10 + int(30 * self.n / self.popsize)
+        recent = self.recent[-window:]
+        if len(recent) >= window and max(recent) - min(recent) < self.tolfun:
+            reasons["tolfun"] = self.tolfun
+        if self.sigma * max(self.D.max(), np.abs(self.pc).max()) < self.tolx:
+            reasons["tolx"] = self.tolx
+        if (self.D.max() / self.D.min()) ** 2 > 1e14:
+            reasons["condition"] = 1e14
+        if not np.isfinite(self.sigma) or self.sigma > 1e16:
+            reasons["sigma"] = self.sigma
+        return reasons
+
+    def step(self, fun: Optional[Callable[[NDArray], NDArray]] = None) -> None:
+        """One generation: ask, evaluate in one batch and tell."""
+
+        fun = self.fun if fun is None else fun
+        X = self.ask()
+        inside, penalty = self.repair(X)
+        self.tell(X, np.asarray(fun(inside), dtype=float) + penalty)
+
+
+def fmin(
+    fun: Callable[[NDArray], NDArray],
+    x0: Optional[NDArray] = None,
+    sigma0: float = 1.0,
+    bounds: Optional[tuple] = None,
+    dimension: Optional[int] = None,
+    restarts: int = 0,
+    strategy: str = "ipop",
+    popsize: Optional[int] = None,
+    separable: Optional[bool] = None,
+    max_evals: float = np.inf,
+    target: Optional[float] = None,
+    seed: Optional[int] = None,
+    callback: Optional[Callable] = None,
+) -> OptimizeResult:
+    """Minimize a batched function with CMA-ES and restarts. Returns an
+    OptimizeResult with x, fun, nfev, nit (total number of generations),
+    restarts and runs (popsize, sigma0, nfev, best value and termination
+    criteria of each run).
+
+    Keyword Arguments:
+    fun       -- a batched objective function: (lambda, n) -> (lambda,)
+    x0        -- the initial mean. Defaults to None (uniform in bounds)
+    sigma0    -- the initial step size
+    bounds    -- a pair (lower, upper) of scalars or arrays: restarts start
+                 from a uniform point in the box
+    dimension -- the dimension, when x0 is not given
+    restarts  -- the maximum number of restarts
+    strategy  -- "ipop" (the population size doubles at each restart) or
+                 "bipop" (alternate large and small populations)
+    popsize   -- the default population size
+    separable -- see CMAES
+    max_evals -- the maximum number of evaluations over all runs
+    target    -- stop when a value below target is found
+    seed      -- the seed of the random generator
+    callback  -- a function called with the CMAES object after each
+                 generation
+    """
+
+    if strategy not in ("ipop", "bipop"):
+        raise ValueError(f"unknown strategy {strategy!r}")
+    if x0 is None and bounds is None:
+        raise ValueError("x0 or bounds is required")
+    if x0 is None and dimension is None:
+        raise ValueError("dimension is required when x0 is not given")
+    rng = np.random.default_rng(seed)
+    n = np.size(x0) if x0 is not None else dimension
+
+    def initial_mean(run):
+        if bounds is None or (run == 0 and x0 is not None):
+            return np.array(x0, dtype=float)
+        low = np.broadcast_to(bounds[0], (n,))
+        high = np.broadcast_to(bounds[1], (n,))
+        return rng.uniform(low, high)
+
+    default = popsize or 4 + int(3 * math.log(n))
+    budget = {"large": 0, "small": 0}
+    large = 0
+    best_x, best_f, nfev, nit, runs = None, np.inf, 0, 0, []
+
+    for run in range(restarts + 1):
+        # population size and step size of this run
+        regime, lam, sigma = "large", default, sigma0
+        if run > 0 and strategy == "ipop":
+            lam = default * 2 ** run
+        elif run > 0:
+            if budget["small"] < budget["large"]:
+                regime = "small"
+                u = rng.random()
+                lam = int(default * (0.5 * 2 ** large) ** (u ** 2))
+                sigma = sigma0 * 10 ** (-2 * rng.random())
+            else:
+                large += 1
+                lam = default * 2 ** large
+
+        es = CMAES(
+            initial_mean(run),
+            sigma,
+            fun,
+            popsize=max(lam, 2),
+            separable=separable,
+            bounds=bounds,
+            seed=rng.integers(2 ** 32),
+        )
+        # runs in the small regime should not use more than the last large
+        limit = max_evals - nfev
+        if regime == "small" and budget["large"]:
+            limit = min(limit, budget["large"] / max(large, 1))
+
+        reasons = {}
+        while not reasons:
+            es.step()
+            if callback is not None:
+                callback(es)
+            reasons = es.stop()
+            if target is not None and es.best_f <= target:
+                reasons["target"] = target
+            if es.nfev + es.popsize > limit:
+                reasons["max_evals"] = max_evals
+
+        nfev += es.nfev
+        nit += es.generation
+        budget[regime] += es.nfev
+        runs.append(
+            dict(
+                popsize=es.popsize,
+                sigma0=sigma,
+                nfev=es.nfev,
+                fun=es.best_f,
+                stop=reasons,
+            )
+        )
+        if es.best_f < best_f:
+            best_x, best_f = es.best_x, es.best_f
+        if "target" in reasons or nfev + default > max_evals:
+            break
+
+    return OptimizeResult(
+        x=best_x,
+        fun=best_f,
+        nfev=nfev,
+        nit=nit,
+        restarts=len(runs) - 1,
+        runs=runs,
+        success=target is None or best_f <= target,
+    )
@@ -0,0 +1,326 @@
+"""A genetic algorithm on a population stored as one contiguous (N, D) array.
+
+Selection, crossover, mutation and elitism are applied to the whole
+population at once, and the next generation is written into a second
+pre-allocated array (double buffer): no array of the size of the
+population is allocated after initialisation. Fitness values come from a
+batched function of the bestiary (minimised), called with out= when the
+function supports it.
+
+    ga = GeneticAlgorithm(
+        rastrigin_batch, np.random.uniform(-5.12, 5.12, (200, 10)),
+        selection="tournament", crossover="uniform", bounds=(-5.12, 5.12),
+    )
+    res = ga.run(500)
+    res.x, res.fun, res.generations_per_second, res.evaluations_per_second
+"""
+
+import inspect
+import time
+from typing import Callable, Optional
+
+import numpy as np
+from numpy.typing import NDArray
+from scipy.optimize import OptimizeResult
+
+from checkpoint import Stateful
+
+__all__ = ["GeneticAlgorithm"]
+
+
+class GeneticAlgorithm(Stateful):
+    # the state saved in checkpoints (see checkpoint.Stateful)
+    state_keys = (
+        "buffers",
+        "fitness_buffers",
+        "current",
+        "nfev",
+        "nit",
+        "time_evaluation",
+        "time_operators",
+        "elapsed",
+        "best_x",
+        "best_fitness",
+        "history",
+    )
+
+    def __init__(
+        self,
+        fun: Callable[[NDArray], NDArray],
+        x0: NDArray,
+        selection: str = "tournament",
+        crossover: str = "uniform",
+        tournament_size: int = 2,
+        crossover_rate: float = 0.9,
+        mutation_rate: float = 0.1,
+        mutation_scale: float = 0.1,
+        elitism: int = 2,
+        bounds: Optional[tuple] = None,
+        dtype: np.dtype = np.float64,
+        seed: Optional[int] = None,
+    ) -> None:
+        """Create a new GeneticAlgorithm object.
+
+        Keyword Arguments:
+        fun             -- a batched objective function to minimize:
+                           (N, D) -> (N,)
+        x0              -- the initial population, shape (N, D)
+        selection       -- "tournament" or "roulette"
+        crossover       -- "one-point" or "uniform"
+        tournament_size -- the number of individuals in each tournament
+        crossover_rate  -- the probability for a pair of parents to be
+                           crossed (otherwise they are copied)
+        mutation_rate   -- the probability for each gene to be mutated
+        mutation_scale  -- the standard deviation of the mutation noise
+        elitism         -- the number of best individuals copied unchanged
+                           to the next generation
+        bounds          -- a pair (lower, upper) of scalars or arrays of
+                           shape (D,): individuals are clipped in the box
+        dtype           -- np.float32 or np.float64
+        seed            -- the seed of the random generator
+        """
+
+        if selection not in ("tournament", "roulette"):
+            raise ValueError(f"unknown selection {selection!r}")
+        if crossover not in ("one-point", "uniform"):
+            raise ValueError(f"unknown crossover {crossover!r}")
+
+        self.fun = fun
+        self.selection = selection
+        self.crossover = crossover
+        self.tournament_size = tournament_size
+        self.crossover_rate = crossover_rate
+        self.mutation_rate = mutation_rate
+        self.mutation_scale = mutation_scale
+        self.bounds = bounds
+        self.rng = np.random.default_rng(seed)
+        try:
+            self.inplace = "out" in inspect.signature(fun).parameters
+        except (TypeError, ValueError):
+            self.inplace = False
+
+        x0 = np.asarray(x0, dtype=dtype)
+        N, D = x0.shape
+        self.N, self.D = N, D
+        self.elitism = elitism = min(elitism, N)
+        self.children = N - elitism
+        self.pairs = h = self.children // 2
+
+        # double buffer for the population and its fitness
+        self.buffers = np.empty((2, N, D), dtype=dtype)
+        self.fitness_buffers = np.empty((2, N), dtype=dtype)
+        self.current = 0
+        self.buffers[0] = x0
+
+        # scratch arrays for the operators
+        self.uniform = np.empty((N, D))
+        self.noise = np.empty((N, D), dtype=dtype)
+        self.mask = np.empty((N, D), dtype=bool)
+        self.scratch = np.empty((h, D), dtype=dtype)
+        self.draws = np.empty(2 * N * tournament_size)
+        self.candidates = np.empty(2 * N * tournament_size, dtype=np.intp)
+        self.candidate_fitness = np.empty(2 * N * tournament_size, dtype=dtype)
+        self.winners = np.empty(2 * N, dtype=np.intp)
+        self.parents = np.empty(2 * N, dtype=np.intp)
+        self.offsets = np.arange(2 * N, dtype=np.intp) * tournament_size
+        self.genes = np.arange(D)
+        self.cuts = np.empty(h, dtype=np.intp)
+        self.cut_draws = np.empty(h)
+        self.cumulative = np.empty(N)
+
+        self.clip(self.population)
+        self.evaluate(self.population, self.fitness)
+        self.nfev = N
+        self.nit = 0
+        self.time_evaluation = 0.0
+        self.time_operators = 0.0
+        self.elapsed = 0.0
+
+        best = np.argmin(self.fitness)
+        self.best_x = self.population[best].copy()
+        self.best_fitness = float(self.fitness[best])
+        self.history = [(self.best_fitness, float(self.fitness.mean()))]
+
+    @property
+    def population(self) -> NDArray:
+        return self.buffers[self.current]
+
+    @property
+    def fitness(self) -> NDArray:
+        return self.fitness_buffers[self.current]
+
+    def clip(self, X: NDArray) -> NDArray:
+        if self.bounds is not None:
+            np.clip(X, self.bounds[0], self.bounds[1], out=X)
+        return X
+
+    def evaluate(self, X: NDArray, out: NDArray) -> NDArray:
+        if self.inplace:
+            return self.fun(X, out=out)
+        out[:] = self.fun(X)
+        return out
+
+    def select(self, n: int) -> NDArray:
+        """Select n parents (indices in the population), in a pre-allocated
+        array."""
+
+        fitness, N = self.fitness, self.N
+        parents = self.parents[:n]
+        if n == 0:
+            # only elites (population size <= elitism)
+            return parents
+
+        if self.selection == "tournament":
+            # the best of tournament_size individuals drawn at random
+            k = n * self.tournament_size
+            draws, candidates = self.draws[:k], self.candidates[:k]
+            self.rng.random(out=draws)
+            draws *= N
+            np.copyto(candidates, draws, casting="unsafe")
+            np.take(
+                fitness, candidates, out=self.candidate_fitness[:k], mode="clip"
+            )
+            scores = self.candidate_fitness[:k].reshape(n, -1)
+            np.argmin(scores, axis=1, out=self.winners[:n])
+            self.winners[:n] += self.offsets[:n]
+            np.take(candidates, self.winners[:n], out=parents, mode="clip")
+        else:
+            # roulette wheel, with weights max(f) - f (minimisation)
+            cumulative = self.cumulative
+            np.subtract(fitness.max(), fitness, out=cumulative)
+            cumulative += 1e-12 * (1 + np.abs(cumulative).max())
+            np.cumsum(cumulative, out=cumulative)
+            draws = self.draws[:n]
+            self.rng.random(out=draws)
+            draws *= cumulative[-1]
+            parents[:] = np.searchsorted(cumulative, draws)
+            np.minimum(parents, N - 1, out=parents)
+
+        return parents
+
+    def step(self) -> None:
+        """Compute the next generation in the other buffer."""
+
+        start = time.perf_counter()
+        population = self.population
+        following = self.buffers[1 - self.current]
+        fitness = self.fitness_buffers[1 - self.current]
+        h, D, rng = self.pairs, self.D, self.rng
+
+        # selection: parents of pairs in the first 2h rows, and one more
+        # parent copied as is if the number of children is odd
+        parents = self.select(self.children)
+        # (mode="clip" avoids a temporary copy, all indices are valid)
+        np.take(
+            population,
+            parents,
+            axis=0,
+            out=following[: self.children],
+            mode="clip",
+        )
+
+        # crossover: swap genes between the two halves where mask is False
+        if h > 0:
+            first, second = following[:h], following[h : 2 * h]
+            mask = self.mask[:h]
+            if self.crossover == "uniform":
+                rng.random(out=self.uniform[:h])
+                np.less(self.uniform[:h], 0.5, out=mask)
+            else:
+                rng.random(out=self.cut_draws)
+                self.cut_draws *= D - 1
+                np.copyto(self.cuts, self.cut_draws, casting="unsafe")
+                self.cuts += 1
+                np.less(self.genes, self.cuts[:, None], out=mask)
+            # pairs which are not crossed keep all their genes
+            rng.random(out=self.cut_draws)
+            mask |= (self.cut_draws >= self.crossover_rate)[:, None]
+            np.logical_not(mask, out=mask)
+            np.copyto(self.scratch, first)
+            np.copyto(first, second, where=mask)
+            np.copyto(second, self.scratch, where=mask)
+
+        # mutation: normal noise on each gene with probability mutation_rate
+        children = following[: self.children]
+        uniform = self.uniform[: self.children]
+        mask = self.mask[: self.children]
+        noise = self.noise[: self.children]
+        rng.random(out=uniform)
+        np.less(uniform, self.mutation_rate, out=mask)
+        rng.standard_normal(out=noise, dtype=noise.dtype)
+        noise *= self.mutation_scale
+        np.add(children, noise, out=children, where=mask)
+        self.clip(children)
+
+        # elitism: the best individuals are copied with their fitness
+        if self.elitism:
+            elite = np.argpartition(self.fitness, self.elitism - 1)
+            elite = elite[: self.elitism]
+            np.take(
+                population,
+                elite,
+                axis=0,
+                out=following[self.children :],
+                mode="clip",
+            )
+            np.take(
+                self.fitness, elite, out=fitness[self.children :], mode="clip"
+            )
+
+        middle = time.perf_counter()
+        self.evaluate(children, fitness[: self.children])
+        end = time.perf_counter()
+
+        self.current = 1 - self.current
+        self.nfev += self.children
+        self.nit += 1
+        self.time_operators += middle - start
+        self.time_evaluation += end - middle
+
+        best = np.argmin(self.fitness)
+        if self.fitness[best] < self.best_fitness:
+            self.best_fitness = float(self.fitness[best])
+            self.best_x[:] = self.population[best]
+        self.history.append((self.best_fitness, float(self.fitness.mean())))
+
+    def run(
+        self,
+        generations: int = 100,
+        target: Optional[float] = None,
+        callback: Optional[Callable] = None,
+    ) -> OptimizeResult:
+        """Run the algorithm and return an OptimizeResult with the best
+        individual x and its fitness fun, nit (generations), nfev, history
+        (best and mean fitness at each generation) and the throughput in
+        generations and evaluations per second, with the share of time spent
+        in evaluations.
+
+        Keyword Arguments:
+        generations -- the number of generations
+        target      -- stop when the best fitness is below target
+        callback    -- a function called with this object after each
+                       generation
+        """
+
+        start = time.perf_counter()
+        nit, nfev = self.nit, self.nfev
+        for _ in range(generations):
+            self.step()
+            if callback is not None:
+                callback(self)
+            if target is not None and self.best_fitness <= target:
+                break
+        elapsed = time.perf_counter() - start
+        self.elapsed += elapsed
+
+        return OptimizeResult(
+            x=self.best_x.copy(),
+            fun=self.best_fitness,
+            nit=self.nit,
+            nfev=self.nfev,
+            history=np.array(self.history),
+            generations_per_second=(self.nit - nit) / elapsed,
+            evaluations_per_second=(self.nfev - nfev) / elapsed,
+            evaluation_share=self.time_evaluation
+            / max(self.time_evaluation + self.time_operators, 1e-12),
+        )
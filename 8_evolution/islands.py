@@ -0,0 +1,405 @@
+"""An island model: several populations evolve in separate processes and
+regularly exchange their best individuals.
+
+Each island runs one engine (GeneticAlgorithm, SimulatedAnnealing or CMAES
+with a fun) built by a factory function. Every `every` generations, all
+islands write their best individuals into a block of shared memory, wait
+for each other, read the migrants of their neighbours (ring or fully
+connected topology) and integrate them: migrants replace the worst
+individuals (or chains) of a population, or are injected into the next
+CMA-ES samples. Only small messages with the results go through pickling.
+
+The factory must be picklable (a function defined at the top level of a
+module, or a functools.partial of it), and is called with the index of the
+island and a seed:
+
+    def factory(island, seed):
+        rng = np.random.default_rng(seed)
+        return GeneticAlgorithm(
+            rastrigin_batch, rng.uniform(-5.12, 5.12, (200, 30)), seed=seed
+        )
+
+    res = Islands(factory, 30, n_islands=4, topology="ring").run(50)
+
+Run this file to get a scaling report on Rastrigin's function:
+
+    python islands.py --islands 1 2 4 8
+"""
+
+import argparse
+import multiprocessing
+import queue as queues
+import threading
+import time
+from multiprocessing import shared_memory
+from typing import Callable, Optional, Union
+
+import numpy as np
+from numpy.typing import NDArray
+from scipy.optimize import OptimizeResult
+
+from annealing import SimulatedAnnealing
+from cmaes import CMAES
+from genetic import GeneticAlgorithm
+
+__all__ = ["Islands", "scaling"]
+
+
+# How each engine gives and receives migrants
+
+
+def best(engine) -> tuple:
+    if isinstance(engine, GeneticAlgorithm):
+        return engine.best_x, engine.best_fitness
+    if isinstance(engine, SimulatedAnnealing):
+        return engine.x, engine.fval
+    return engine.best_x, engine.best_f
+
+
+def emigrants(engine, k: int) -> tuple:
+    """The k best individuals of a population and their values (CMA-ES
+    only sends its best solution, other rows have an infinite value)."""
+
+    if isinstance(engine, GeneticAlgorithm):
+        X, f = engine.population, engine.fitness
+    elif isinstance(engine, SimulatedAnnealing):
+        X, f = engine.X, engine.energy
+    else:
+        X = np.zeros((k, engine.n))
+        f = np.full(k, np.inf)
+        X[0], f[0] = engine.best_x, engine.best_f
+        return X, f
+    k = min(k, len(f))
+    order = np.argpartition(f, k - 1)[:k]
+    return X[order], f[order]
+
+
+def immigrate(engine, X: NDArray, f: NDArray) -> None:
+    """Integrate migrants into a population."""
+
+    valid = np.isfinite(f)
+    X, f = X[valid], f[valid]
+    if len(f) == 0:
+        return
+    if isinstance(engine, CMAES):
+        engine.inject(X)
+        return
+
+    if isinstance(engine, GeneticAlgorithm):
+        population, fitness = engine.population, engine.fitness
+    else:
+        population, fitness = engine.X, engine.energy
+    k = min(len(f), len(fitness))
+    worst = np.argpartition(-fitness, k - 1)[:k]
+    population[worst] = X[:k]
+    fitness[worst] = f[:k]
+
+    i = np.argmin(f)
+    if isinstance(engine, GeneticAlgorithm):
+        if f[i] < engine.best_fitness:
+            engine.best_fitness = float(f[i])
+            engine.best_x[:] = X[i]
+    else:
+        better = engine.energy[worst] < engine.best_energy[worst]
+        engine.best_X[worst[better]] = engine.X[worst[better]]
+        engine.best_energy[worst[better]] = engine.energy[worst[better]]
+
+
+def neighbours(topology: Union[str, list], n: int) -> list:
+    if topology == "ring":
+        return [[(i - 1) % n] if n > 1 else [] for i in range(n)]
+    if topology == "full":
+        return [[j for j in range(n) if j != i] for i in range(n)]
+    if isinstance(topology, str):
+        raise ValueError(f"unknown topology {topology!r}")
+    return [list(sources) for sources in topology]
+
+
+def evolve(
+    factory: Callable,
+    islands: list,
+    seeds: list,
+    shared: NDArray,
+    wait: Callable,
+    sources: list,
+    every: int,
+    epochs: int,
+) -> list:
+    """Run some islands in the current process: advance each engine for
+    `every` generations, then exchange migrants through the shared array
+    of shape (n_islands, migrants, D + 1)."""
+
+    engines = [factory(i, seed) for i, seed in zip(islands, seeds)]
+    D = shared.shape[2] - 1
+    history = [[] for _ in islands]
+    start = time.perf_counter()
+
+    for _ in range(epochs):
+        for engine, i, trace in zip(engines, islands, history):
+            for _ in range(every):
+                engine.step()
+            X, f = emigrants(engine, shared.shape[1])
+            shared[i, : len(f), :D] = X
+            shared[i, : len(f), D] = f
+            shared[i, len(f) :, D] = np.inf
+            trace.append(best(engine)[1])
+        wait()
+        incoming = [
+            shared[sources[i]].reshape(-1, D + 1).copy() for i in islands
+        ]
+        wait()
+        for engine, migrants in zip(engines, incoming):
+            immigrate(engine, migrants[:, :D], migrants[:, D])
+
+    elapsed = time.perf_counter() - start
+    results = []
+    for engine, i, trace in zip(engines, islands, history):
+        x, fval = best(engine)
+        results.append(
+            dict(
+                island=i,
+                x=np.array(x),
+                fun=float(fval),
+                nfev=engine.nfev,
+                history=trace,
+                time=elapsed,
+            )
+        )
+    return results
+
+
+def worker(
+    factory, island, seed, name, shape, barrier, sources, every, epochs, queue
+):
+    memory = shared_memory.SharedMemory(name=name)
+    shared = np.ndarray(shape, dtype=np.float64, buffer=memory.buf)
+    try:
+        results = evolve(
+            factory,
+            [island],
+            [seed],
+            shared,
+            barrier.wait,
+            sources,
+            every,
+            epochs,
+        )
+        queue.put(results[0])
+    except Exception as error:
+        # the other islands would wait for this one at the next migration
+        barrier.abort()
+        queue.put(error)
+    finally:
+        del shared
+        memory.close()
+
+
+def collect(workers: list, queue, barrier) -> list:
+    """The results of all workers, or the first exception raised in one of
+    them (a worker which dies without a result breaks the barrier, so that
+    the others stop as well)."""
+
+    results, errors = [], []
+    while len(results) + len(errors) < len(workers):
+        try:
+            item = queue.get(timeout=1.0)
+        except queues.Empty:
+            if any(p.exitcode not in (None, 0) for p in workers):
+                barrier.abort()
+            if not any(p.is_alive() for p in workers) and queue.empty():
+                errors.append(RuntimeError("an island process died"))
+                break
+            continue
+        if isinstance(item, BaseException):
+            errors.append(item)
+        else:
+            results.append(item)
+    if errors:
+        # the cause rather than the broken barrier in the other islands
+        errors.sort(key=lambda e: isinstance(e, threading.BrokenBarrierError))
+        raise errors[0]
+    return results
+
+
+class Islands:
+    def __init__(
+        self,
+        factory: Callable,
+        dimension: int,
+        n_islands: int = 4,
+        topology: Union[str, list] = "ring",
+        every: int = 10,
+        migrants: int = 2,
+        seed: Optional[int] = None,
+    ) -> None:
+        """Create a new Islands object.
+
+        Keyword Arguments:
+        factory   -- a picklable function (island, seed) -> engine
+        dimension -- the dimension of the problem
+        n_islands -- the number of islands
+        topology  -- "ring" (island i receives from island i - 1), "full"
+                     (from all other islands), or a list with the sources
+                     of each island
+        every     -- the number of generations between migrations
+        migrants  -- the number of individuals sent by each island
+        seed      -- the seed used to draw the seeds of the islands
+        """
+
+        self.factory = factory
+        self.dimension = dimension
+        self.n_islands = n_islands
+        self.sources = neighbours(topology, n_islands)
+        self.every = every
+        self.migrants = migrants
+        seeds = np.random.default_rng(seed).integers(2 ** 32, size=n_islands)
+        self.seeds = [int(s) for s in seeds]
+
+    def run(self, epochs: int = 10, processes: bool = True) -> OptimizeResult:
+        """Run all islands for epochs * every generations. Returns an
+        OptimizeResult with the best x and fun over all islands, nfev, the
+        wall time and the results of each island (best value, history of
+        the best value at each migration, number of evaluations).
+
+        Keyword Arguments:
+        epochs    -- the number of migrations
+        processes -- run each island in its own process. Otherwise, all
+                     islands run in turn in the current process.
+        """
+
+        n, D = self.n_islands, self.dimension
+        shape = (n, self.migrants, D + 1)
+        memory = shared_memory.SharedMemory(
+            create=True, size=int(np.prod(shape)) * 8
+        )
+        start = time.perf_counter()
+        try:
+            if processes:
+                context = multiprocessing.get_context()
+                barrier = context.Barrier(n)
+                queue = context.Queue()
+                workers = [
+                    context.Process(
+                        target=worker,
+                        args=(
+                            self.factory,
+                            i,
+                            self.seeds[i],
+                            memory.name,
+                            shape,
+                            barrier,
+                            self.sources,
+                            self.every,
+                            epochs,
+                            queue,
+                        ),
+                    )
+                    for i in range(n)
+                ]
+                for process in workers:
+                    process.start()
+                try:
+                    results = collect(workers, queue, barrier)
+                finally:
+                    for process in workers:
+                        process.join()
+            else:
+                shared = np.ndarray(shape, dtype=np.float64, buffer=memory.buf)
+                results = evolve(
+                    self.factory,
+                    list(range(n)),
+                    self.seeds,
+                    shared,
+                    lambda: None,
+                    self.sources,
+                    self.every,
+                    epochs,
+                )
+                del shared
+        finally:
+            memory.close()
+            memory.unlink()
+        elapsed = time.perf_counter() - start
+
+        results.sort(key=lambda result: result["island"])
+        winner = min(results, key=lambda result: result["fun"])
+        return OptimizeResult(
+            x=winner["x"],
+            fun=winner["fun"],
+            nfev=sum(result["nfev"] for result in results),
+            time=elapsed,
+            islands=results,
+        )
+
+
+def scaling(
+    factory: Callable,
+    dimension: int,
+    counts: tuple = (1, 2, 4, 8),
+    epochs: int = 20,
+    every: int = 10,
+    topology: str = "ring",
+    seed: Optional[int] = None,
+) -> list:
+    """Compare the wall time of n islands in n processes with the time of
+    the same islands run in turn in one process. Returns one dictionary per
+    number of islands, with the wall times, the speedup, the parallel
+    efficiency (speedup / islands) and the best value found."""
+
+    report = []
+    for n in counts:
+        islands = Islands(factory, dimension, n, topology, every, seed=seed)
+        parallel = islands.run(epochs, processes=True)
+        sequential = islands.run(epochs, processes=False)
+        speedup = sequential.time / parallel.time
+        report.append(
+            dict(
+                islands=n,
+                parallel=parallel.time,
+                sequential=sequential.time,
+                speedup=speedup,
+                efficiency=speedup / n,
+                fun=parallel.fun,
+            )
+        )
+    return report
+
+
+def rastrigin_ga(island: int, seed: int, dimension: int = 30):
+    from bestiary import rastrigin_batch
+
+    rng = np.random.default_rng(seed)
+    return GeneticAlgorithm(
+        rastrigin_batch,
+        rng.uniform(-5.12, 5.12, (500, dimension)),
+        mutation_scale=0.3,
+        bounds=(-5.12, 5.12),
+        seed=seed,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--islands", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--every", type=int, default=10)
+    parser.add_argument("--topology", default="ring")
+    args = parser.parse_args()
+
+    print(
+        f"{'islands':>7} {'parallel (s)':>12} {'sequential (s)':>14} "
+        f"{'speedup':>8} {'efficiency':>10} {'best':>10}"
+    )
+    for line in scaling(
+        rastrigin_ga,
+        30,
+        args.islands,
+        args.epochs,
+        args.every,
+        args.topology,
+    ):
+        print(
+            f"{line['islands']:>7} {line['parallel']:>12.3f} "
+            f"{line['sequential']:>14.3f} {line['speedup']:>8.2f} "
+            f"{line['efficiency']:>10.2f} {line['fun']:>10.4f}"
+        )